@@ -3,17 +3,21 @@ Apply the model to the PVs in the database and note the results.
 """
 
 import asyncio
+import contextlib
 import datetime as dt
 import importlib.metadata
 import logging
 import os
 import pathlib
+from collections.abc import Iterator
+from typing import Any
 from uuid import UUID
 
 import click
 import dotenv
-import numpy as np
 import sentry_sdk
+import sqlalchemy as sa
+from ocf import dp
 from psp.models.base import PvSiteModel
 from psp.typings import PvId, Timestamp, X
 from pvsite_datamodel.connection import DatabaseConnection
@@ -21,15 +25,26 @@ from pvsite_datamodel.sqlmodels import ForecastSQL, ForecastValueSQL
 
 from forecast_inference.data.nwp_data_sources import (
     download_and_add_osgb_to_nwp_data_source,
+    load_nwp_data,
+    nwp_conversion_options,
+    nwp_load_options,
 )
 from forecast_inference.data.pv_data_sources import DbPvDataSource
 from forecast_inference.data_platform import (
     DataPlatformClient,
     LocationSummary,
+    Outbox,
+    create_missing_locations,
+    enqueue_forecast,
     fetch_dp_location_map,
     get_dataplatform_client,
+    get_forecaster,
+    report_outbox_metrics,
     save_forecast_to_dataplatform,
 )
+from forecast_inference.forecast_batch import ForecastBatch
+from forecast_inference.models.psp import precompute_site_nwp, precomputed_solar_geometry
+from forecast_inference.utils.concurrency import BoundedTaskGroup, fork_map
 from forecast_inference.utils.config import load_config
 from forecast_inference.utils.imports import import_from_module
 from forecast_inference.utils.profiling import profile
@@ -55,102 +70,142 @@ sentry_sdk.init(
 sentry_sdk.set_tag("app_name", "pv-site-production_forecast_inferance")
 sentry_sdk.set_tag("version", version)
 
+# Model tag under which our forecasts are saved in the Data Platform.
+dp_model_tag = "pv-site-production"
 
 
+def _write_forecasts_to_db(database_connection: DatabaseConnection, batch: ForecastBatch) -> None:
+    """Write a forecast per site of the batch, and their values, in one transaction.
 
-async def _run_model_and_save_for_one_pv(
-    database_connection: DatabaseConnection,
-    model: PvSiteModel,
-    pv_id: PvId,
-    timestamp: Timestamp,
-    write_to_db: bool,
-    print_to_stdout: bool,
-    save_to_data_platform: bool = False,
-    site_meta: dict | None = None,
-    client: DataPlatformClient | None = None,
-    dp_location_map: dict[str, LocationSummary] | None = None,
-) -> bool:
+    The app writes each site as soon as it is predicted, so its batches have a single site.
     """
-    Run model and save to database for one PV.
+    with database_connection.get_session() as session:
+        forecasts = [
+            ForecastSQL(
+                location_uuid=UUID(pv_id),  # type: ignore
+                forecast_version="0.0.0",  # TODO get version
+                timestamp_utc=batch.timestamp,
+            )
+            for pv_id in batch.pv_ids
+        ]
+        session.add_all(forecasts)
+        # Flush to get the Forecasts' primary keys.
+        session.flush()
+
+        # Insert the forecast values with a single Core executemany rather than through ORM
+        # objects. It still takes one parameter dict per value.
+        forecast_uuids = [forecast.forecast_uuid for forecast in forecasts]
+        start_utc = batch.start_utc.tolist()
+        end_utc = batch.end_utc.tolist()
+        horizon_minutes = batch.horizon_start_minutes.tolist()
+        session.execute(
+            sa.insert(ForecastValueSQL),
+            [
+                {
+                    "forecast_uuid": forecast_uuid,
+                    "start_utc": start,
+                    "end_utc": end,
+                    "horizon_minutes": horizon,
+                    "forecast_power_kw": power,
+                }
+                for forecast_uuid, powers in zip(forecast_uuids, batch.powers_kw.tolist())
+                for start, end, horizon, power in zip(start_utc, end_utc, horizon_minutes, powers)
+            ],
+        )
+        session.commit()
+
+
+def _print_forecasts(batch: ForecastBatch) -> None:
+    """Write the forecasts to stdout."""
+    start_utc = batch.start_utc.tolist()
+    end_utc = batch.end_utc.tolist()
+    for pv_id, powers in zip(batch.pv_ids, batch.powers_kw.tolist()):
+        print(f'PV Site = "{pv_id}"')
+        for start, end, power in zip(start_utc, end_utc, powers):
+            print(f" | {start}" f" | {end}" f" | {power}")
 
-    When save_to_data_platform is True, also pushes the forecast to the Data Platform
-    after a successful DB write. site_meta must contain client_location_name, capacity_kw,
-    latitude, and longitude for the given pv_id.
+
+def _predict_for_one_pv(
+    model: PvSiteModel, pv_id: PvId, timestamp: Timestamp
+) -> ForecastBatch | None:
+    """
+    Run model for one PV.
 
     Return:
     ------
-        True on success and False if there was an error.
+        The forecast on success and None if there was an error.
     """
     with profile(f'Applying model on pv "{pv_id}"'):
         try:
             pred = model.predict(X(pv_id=pv_id, ts=timestamp))
+            # Also in the `try`, so that an invalid prediction doesn't stop the other sites.
+            return ForecastBatch.from_predictions(
+                timestamp, model.config.horizons, pv_ids=[pv_id], powers=[pred.powers]
+            )
         except Exception:
             log.exception(
                 'There was an exception calling `model.predict` for pv_id="{pv_id}". Skipping.',
             )
-            return False
-
-    site_uuid = UUID(pv_id)
-
-    # Assemble the data in ForecastValuesSQL rows for the database.
-    rows = [
-        {
-            "start_utc": timestamp + dt.timedelta(minutes=start),
-            "end_utc": timestamp + dt.timedelta(minutes=end),
-            "forecast_power_kw": np.round(value, 3),
-            "horizon_minutes": start,
-        }
-        for (start, end), value in zip(model.config.horizons, pred.powers)
-    ]
+            return None
+
+
+def _save_next_forecast(
+    database_connection: DatabaseConnection,
+    forecasts: Iterator[ForecastBatch | None],
+    pv_id: PvId,
+    write_to_db: bool,
+    print_to_stdout: bool,
+) -> ForecastBatch | None:
+    """
+    Take the forecast of one PV from `forecasts` and save it to the database.
+
+    Return:
+    ------
+        The forecast on success and None if there was an error.
+    """
+    batch = next(forecasts)
+    if batch is None:
+        return None
 
     if write_to_db:
-        with (
-            profile(f'Writing {len(rows)} forecast values to db for pv "{pv_id}"'),
-            database_connection.get_session() as session,
-        ):
-            forecast = ForecastSQL(
-                location_uuid=site_uuid,  # type: ignore
-                forecast_version="0.0.0",  # TODO get version
-                timestamp_utc=timestamp,
-            )
-            session.add(forecast)
-            # Flush to get the Forecast's primary key.
-            session.flush()
-
-            # Insert all the forecast value objects in one efficient call.
-            session.bulk_save_objects(
-                [
-                    ForecastValueSQL(
-                        **row,
-                        forecast_uuid=forecast.forecast_uuid,
-                    )
-                    for row in rows
-                ]
-            )
-            session.commit()
+        with profile(f'Writing {len(batch)} forecast values to db for pv "{pv_id}"'):
+            _write_forecasts_to_db(database_connection, batch)
     elif print_to_stdout:
         # Write to stdout when we don't want to write in the database.
-        print(f'PV Site = "{pv_id}"')
-        for row in rows:
-            print(f" | {row['start_utc']}" f" | {row['end_utc']}" f" | {row['forecast_power_kw']}")
-
-    # Optionally push to the Data Platform
-    if save_to_data_platform and site_meta is not None and client is not None:
-        log.info(f"Saving to Data Platform for pv_id={pv_id}...")
-        await save_forecast_to_dataplatform(
-            rows=rows,
-            client_location_name=site_meta["client_location_name"],
-            model_tag="pv-site-production",
-            init_time_utc=timestamp,
-            client=client,
-            capacity_kw=site_meta["capacity_kw"],
-            latitude=site_meta["latitude"],
-            longitude=site_meta["longitude"],
-            location_map=dp_location_map,
-        )
-        log.info(f"Saving to Data Platform completed for pv_id={pv_id}")
+        _print_forecasts(batch)
 
-    return True
+    return batch
+
+
+async def _save_to_data_platform_for_one_pv(
+    pv_id: PvId,
+    forecast: ForecastBatch,
+    timestamp: Timestamp,
+    site_meta: dict,
+    client: DataPlatformClient,
+    dp_location_map: dict[str, LocationSummary],
+    dp_forecaster: dp.Forecaster,
+) -> None:
+    """
+    Push the forecast of one PV to the Data Platform.
+
+    site_meta must contain client_location_name, capacity_kw, latitude, and longitude for the
+    given pv_id.
+    """
+    log.info(f"Saving to Data Platform for pv_id={pv_id}...")
+    await save_forecast_to_dataplatform(
+        rows=forecast,
+        client_location_name=site_meta["client_location_name"],
+        model_tag=dp_model_tag,
+        init_time_utc=timestamp,
+        client=client,
+        capacity_kw=site_meta["capacity_kw"],
+        latitude=site_meta["latitude"],
+        longitude=site_meta["longitude"],
+        location_map=dp_location_map,
+        forecaster=dp_forecaster,
+    )
+    log.info(f"Saving to Data Platform completed for pv_id={pv_id}")
 
 
 @click.command()
@@ -205,6 +260,15 @@ async def _run_model_and_save_for_one_pv(
     help="Set the python logging log level",
     show_default=True,
 )
+@click.option(
+    "--workers",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Number of processes making the predictions. With more than one, the worker processes"
+    " are forked after the model is loaded, and share its data. The forecasts are saved by the"
+    " main process.",
+)
 @click.option(
     "--raise-on-failure",
     is_flag=True,
@@ -220,6 +284,7 @@ def main(
     no_print_to_stdout: bool,
     raise_on_failure: bool,
     log_level: str,
+    workers: int,
 ):
     """Main function"""
     logging.basicConfig(
@@ -258,19 +323,60 @@ def main(
 
     database_connection = DatabaseConnection(url, echo=False)
 
-    # download and add osbg to nwp datasource
-    nwp_zarr_path = os.getenv("NWP_ZARR_PATH")
-    if nwp_zarr_path is not None:
-        download_and_add_osgb_to_nwp_data_source(
-            nwp_zarr_path, "nwp.zarr", variables_to_keep=config["nwp"]["kwargs"]["variables"]
-        )
-
     # Wrap into a PV data source for the models.
     log.info("Creating PV data source")
     pv_data_source = DbPvDataSource(database_connection)
 
+    # Pre-fetch site metadata (single DB query via pv_data_source — avoids per-PV round-trips)
+    site_metadata = pv_data_source.get_site_metadata()
+    log.info(f"Pre-fetched metadata for {len(site_metadata)} sites")
+
+    # download and add osbg to nwp datasource
+    nwp_zarr_path = os.getenv("NWP_ZARR_PATH")
+    get_model_kwargs: dict[str, Any] = {}
+    if "nwp_preload_max_size" in config:
+        get_model_kwargs["now"] = timestamp
+    if nwp_zarr_path is not None:
+        # Optional settings of the conversion, see `download_and_add_osgb_to_nwp_data_source`.
+        conversion_config = dict(config.get("nwp_conversion", {}))
+        in_memory = conversion_config.pop("in_memory", False)
+        # Where we write the local store, which the `nwp` data source of the model should read.
+        local_path = conversion_config.pop("local_path", "nwp.zarr")
+        crop_to_sites = conversion_config.pop("crop_to_sites", False)
+        nwp_conversion = nwp_conversion_options(conversion_config)
+        if crop_to_sites:
+            nwp_conversion["crop_to_coordinates"] = [
+                (meta["latitude"], meta["longitude"])
+                for meta in site_metadata.values()
+                if meta["latitude"] is not None and meta["longitude"] is not None
+            ]
+        if "init_time_lookback" in nwp_conversion:
+            nwp_conversion["timestamp"] = timestamp
+        if in_memory:
+            # We don't write the local store.
+            with profile("Loading NWP data in memory"):
+                get_model_kwargs["nwp_data"] = load_nwp_data(
+                    nwp_zarr_path,
+                    variables_to_keep=config["nwp"]["kwargs"]["variables"],
+                    **nwp_load_options(nwp_conversion),
+                )
+        else:
+            nwp_stats = download_and_add_osgb_to_nwp_data_source(
+                nwp_zarr_path,
+                local_path,
+                variables_to_keep=config["nwp"]["kwargs"]["variables"],
+                **nwp_conversion,
+            )
+            log.info(
+                f"NWP conversion | cache_hit={nwp_stats.cache_hit}"
+                f" bytes_saved={nwp_stats.bytes_saved}"
+                f" chunks_written={nwp_stats.chunks_written}"
+                f" write_seconds={nwp_stats.write_seconds:.2f}"
+                f" peak_memory_bytes={nwp_stats.peak_memory_bytes}"
+            )
+
     with profile("Loading model"):
-        model: PvSiteModel = get_model(config, pv_data_source)
+        model: PvSiteModel = get_model(config, pv_data_source, **get_model_kwargs)
 
     pv_ids = pv_data_source.list_pv_ids()
     log.info(f"Found {len(pv_ids)} sites")
@@ -279,51 +385,163 @@ def main(
         pv_ids = pv_ids[:max_pvs]
         log.info(f"Keeping only {len(pv_ids)} sites")
 
+    site_coordinates = [
+        (site_metadata[pv_id]["latitude"], site_metadata[pv_id]["longitude"])
+        for pv_id in pv_ids
+        if pv_id in site_metadata
+        and site_metadata[pv_id]["latitude"] is not None
+        and site_metadata[pv_id]["longitude"] is not None
+    ]
+
+    if config.get("precompute_site_nwp", False):
+        precompute_site_nwp(model, site_coordinates, timestamp)
+
+    solar_geometry: contextlib.AbstractContextManager = contextlib.nullcontext()
+    if config.get("precompute_solar_geometry", False):
+        solar_geometry = precomputed_solar_geometry(
+            model,
+            site_coordinates,
+            timestamp,
+            decimals=config.get("solar_geometry_decimals", 2),
+        )
+
     # Read Data Platform flag
     save_to_dp = os.getenv("SAVE_TO_DATA_PLATFORM", "false").lower() == "true"
+    dp_max_concurrent_saves = int(os.getenv("DATA_PLATFORM_MAX_CONCURRENT_SAVES", "10"))
+    # When set, forecasts are appended to this outbox and sent later by `drain_dp_outbox`.
+    dp_outbox_dir = os.getenv("DATA_PLATFORM_OUTBOX_DIR")
+
+    # The forecasts of `pv_ids`, in order, made as we iterate.
+    forecasts: contextlib.AbstractContextManager[Iterator[ForecastBatch | None]]
+    if workers > 1:
+        log.info(f"Making the predictions in {workers} processes")
+        forecasts = fork_map(
+            lambda pv_id: _predict_for_one_pv(model, pv_id, timestamp),
+            pv_ids,
+            num_workers=workers,
+            # The connections of the pool can't be shared with the parent process.
+            initializer=lambda: database_connection.engine.dispose(close=False),
+        )
+    else:
+        forecasts = contextlib.nullcontext(
+            _predict_for_one_pv(model, pv_id, timestamp) for pv_id in pv_ids
+        )
 
-    # Pre-fetch site metadata (single DB query via pv_data_source — avoids per-PV round-trips)
-    site_metadata = pv_data_source.get_site_metadata()
-    log.info(f"Pre-fetched metadata for {len(site_metadata)} sites")
-
-    async def _run_app():
+    async def _run_app(forecasts: Iterator[ForecastBatch | None], dp_outbox: Outbox | None):
         num_successes = 0
-        if save_to_dp:
+        if save_to_dp and not dp_outbox_dir:
             async with get_dataplatform_client() as client:
                 dp_location_map = await fetch_dp_location_map(client)
                 log.info(f"Pre-fetched {len(dp_location_map)} DP site locations.")
+
+                # Create all the missing locations up front, rather than one at a time while
+                # saving. Sites whose creation failed are retried inline when saving.
+                with profile("Creating missing DP locations"):
+                    location_errors = await create_missing_locations(
+                        client,
+                        sites=[
+                            site_metadata[pv_id]
+                            for pv_id in pv_ids
+                            if site_metadata.get(pv_id, {}).get("client_location_name")
+                        ],
+                        location_map=dp_location_map,
+                        init_time_utc=timestamp,
+                        max_concurrency=dp_max_concurrent_saves,
+                    )
+                for name, error in location_errors.items():
+                    log.warning(f"Could not create DP location {name!r}: {error}")
+
+                dp_forecaster = await get_forecaster(client, dp_model_tag)
+                log.info(
+                    f"Using DP forecaster {dp_forecaster.forecaster_name!r}"
+                    f" v{dp_forecaster.forecaster_version}"
+                )
+
+                # The Data Platform saves run in the background while we predict the next sites.
+                dp_saves: BoundedTaskGroup[PvId] = BoundedTaskGroup(dp_max_concurrent_saves)
                 for pv_id in pv_ids:
-                    success = await _run_model_and_save_for_one_pv(
+                    # Run the model in a thread so that the event loop keeps the pending Data
+                    # Platform saves going in the meantime.
+                    forecast = await asyncio.to_thread(
+                        _save_next_forecast,
                         database_connection=database_connection,
-                        model=model,
+                        forecasts=forecasts,
                         pv_id=pv_id,
-                        timestamp=timestamp,
                         write_to_db=write_to_db,
                         print_to_stdout=not write_to_db and not no_print_to_stdout,
-                        save_to_data_platform=True,
-                        site_meta=site_metadata.get(pv_id),
-                        client=client,
-                        dp_location_map=dp_location_map,
                     )
-                    if success:
+                    if forecast is None:
+                        continue
+
+                    site_meta = site_metadata.get(pv_id)
+                    if site_meta is None:
                         num_successes += 1
+                        continue
+
+                    await dp_saves.submit(
+                        pv_id,
+                        _save_to_data_platform_for_one_pv(
+                            pv_id=pv_id,
+                            forecast=forecast,
+                            timestamp=timestamp,
+                            site_meta=site_meta,
+                            client=client,
+                            dp_location_map=dp_location_map,
+                            dp_forecaster=dp_forecaster,
+                        ),
+                    )
+
+                with profile(f"Waiting for {len(dp_saves)} Data Platform saves"):
+                    dp_results = await dp_saves.wait()
+
+            # Results are in the order of `pv_ids`, so the logs are deterministic.
+            for pv_id, result in dp_results.items():
+                if isinstance(result, BaseException):
+                    log.error(
+                        f"Saving to Data Platform failed for pv_id={pv_id}", exc_info=result
+                    )
+                else:
+                    num_successes += 1
         else:
             for pv_id in pv_ids:
-                success = await _run_model_and_save_for_one_pv(
+                forecast = _save_next_forecast(
                     database_connection=database_connection,
-                    model=model,
+                    forecasts=forecasts,
                     pv_id=pv_id,
-                    timestamp=timestamp,
                     write_to_db=write_to_db,
                     print_to_stdout=not write_to_db and not no_print_to_stdout,
-                    save_to_data_platform=False,
-                    site_meta=site_metadata.get(pv_id),
                 )
-                if success:
-                    num_successes += 1
+                if forecast is None:
+                    continue
+
+                site_meta = site_metadata.get(pv_id)
+                if dp_outbox is not None and site_meta is not None:
+                    try:
+                        enqueue_forecast(
+                            dp_outbox,
+                            rows=forecast,
+                            client_location_name=site_meta["client_location_name"],
+                            model_tag=dp_model_tag,
+                            init_time_utc=timestamp,
+                            capacity_kw=site_meta["capacity_kw"],
+                            latitude=site_meta["latitude"],
+                            longitude=site_meta["longitude"],
+                        )
+                    except Exception:
+                        log.exception(f"Adding to the DP outbox failed for pv_id={pv_id}")
+                        continue
+                num_successes += 1
         return num_successes
 
-    num_successes = asyncio.run(_run_app())
+    dp_outbox = Outbox(dp_outbox_dir) if save_to_dp and dp_outbox_dir else None
+    try:
+        # The solar geometry is computed before forking the workers, to share it with them.
+        with solar_geometry, forecasts as forecasts_iter:
+            num_successes = asyncio.run(_run_app(forecasts_iter, dp_outbox))
+    finally:
+        if dp_outbox is not None:
+            dp_outbox.close()
+            report_outbox_metrics(dp_outbox)
 
     num_errors = len(pv_ids) - num_successes
 
@@ -0,0 +1,138 @@
+"""
+NWP data shared by the sites that fall in the same pixel.
+"""
+import collections
+import threading
+from collections.abc import Hashable
+from typing import Any
+
+import xarray as xr
+from psp.data_sources.utils import _TIME
+from psp.typings import Timestamp
+
+from forecast_inference.data.psp_internals import NwpSource, nwp_data
+from forecast_inference.data.site_nwp_data_source import (
+    NwpGetArguments,
+    init_time_index,
+    nearest_pixel_indices,
+)
+
+
+class CachedNwpDataSource:
+    """NWP data source remembering the data of the most recently requested pixels.
+
+    The NWP data of a site only depends on its nearest pixel, the init_time used at `now` and the
+    timestamps of the horizons. Many sites share a pixel, so we keep the data returned for each
+    (pixel, init_time, timestamps) and give it to all the sites of that pixel, instead of slicing
+    the NWP data again. The least recently used entries are evicted past `max_entries`.
+
+    Requests for a box of pixels, or for lazy data, are passed on to the wrapped data source.
+
+    Arguments:
+    ---------
+    source: The wrapped NWP data source.
+    max_entries: Maximum number of (pixel, init_time, timestamps) kept.
+
+    Attributes:
+    ----------
+    hits: Number of requests served from the cache.
+    misses: Number of requests passed on to the wrapped data source.
+    """
+
+    def __init__(self, source: NwpSource, max_entries: int = 10_000):
+        self._source = source
+        self._max_entries = max_entries
+        self._entries: collections.OrderedDict[Hashable, xr.DataArray] = (
+            collections.OrderedDict()
+        )
+        self._pixel_of_coordinates: dict[tuple[float, float], tuple[int, int]] = {}
+        # The init_time of the last (now, tolerance), which is the same for all the sites.
+        self._last_init_time: tuple[tuple[Timestamp, str | None], Any] | None = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _init_time(self, now: Timestamp, tolerance: str | None) -> Any:
+        """The init_time used at `now`, the same way as `NwpDataSource.get`, or `None` if there is
+        none within the tolerance."""
+        last_init_time = self._last_init_time
+        if last_init_time is not None and last_init_time[0] == (now, tolerance):
+            return last_init_time[1]
+
+        index = init_time_index(self._source, now, tolerance)
+        init_time = None if index is None else nwp_data(self._source).indexes[_TIME][index]
+        self._last_init_time = ((now, tolerance), init_time)
+        return init_time
+
+    def _pixel(self, lat: float, lon: float) -> tuple[int, int]:
+        pixel = self._pixel_of_coordinates.get((lat, lon))
+        if pixel is None:
+            x_indices, y_indices = nearest_pixel_indices(self._source, [(lat, lon)])
+            pixel = (int(x_indices[0]), int(y_indices[0]))
+            self._pixel_of_coordinates[(lat, lon)] = pixel
+        return pixel
+
+    def get(
+        self,
+        *,
+        now: Timestamp,
+        timestamps: list[Timestamp] | Timestamp,
+        min_lat: float | None = None,
+        max_lat: float | None = None,
+        min_lon: float | None = None,
+        max_lon: float | None = None,
+        nearest_lat: float | None = None,
+        nearest_lon: float | None = None,
+        tolerance: str | None = None,
+        load: bool = True,
+    ) -> xr.DataArray | None:
+        """Same as `NwpDataSource.get`."""
+        kwargs: NwpGetArguments = dict(
+            now=now,
+            timestamps=timestamps,
+            min_lat=min_lat,
+            max_lat=max_lat,
+            min_lon=min_lon,
+            max_lon=max_lon,
+            nearest_lat=nearest_lat,
+            nearest_lon=nearest_lon,
+            tolerance=tolerance,
+            load=load,
+        )
+        if min_lat is not None or nearest_lat is None or nearest_lon is None or not load:
+            return self._source.get(**kwargs)
+
+        init_time = self._init_time(now, tolerance)
+        if init_time is None:
+            return self._source.get(**kwargs)
+
+        if isinstance(timestamps, Timestamp):
+            timestamps = [timestamps]
+        for t in timestamps:
+            if t < now:
+                raise ValueError(f'Timestamp "{t}" should be after now={now}')
+        key = (self._pixel(nearest_lat, nearest_lon), init_time, tuple(timestamps))
+
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+
+        data = self._source.get(**kwargs)
+        if data is None:
+            return None
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = data
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return data
+
+    def __getattr__(self, name: str) -> Any:
+        # Everything else, e.g. `list_variables` or `_tolerance`, comes from the wrapped source.
+        if name == "_source":
+            raise AttributeError(name)
+        return getattr(self._source, name)
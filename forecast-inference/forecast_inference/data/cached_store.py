@@ -0,0 +1,244 @@
+"""
+Read-through disk cache for remote zarr stores.
+"""
+import collections
+import collections.abc
+import concurrent.futures
+import dataclasses
+import hashlib
+import logging
+import os
+import pathlib
+import threading
+import time
+from typing import Any, Iterable, Iterator
+
+import fsspec
+from dask.utils import parse_bytes
+
+_log = logging.getLogger(__name__)
+
+
+def _is_metadata(key: str) -> bool:
+    return key.rsplit("/", 1)[-1].startswith(".z")
+
+
+def file_version(info: dict[str, Any]) -> str:
+    """Version of a file, from its fsspec `info`, that changes when the file is rewritten."""
+    version = info.get("ETag") or info.get("mtime") or info.get("LastModified")
+    return f"{version}-{info.get('size')}"
+
+
+@dataclasses.dataclass
+class CacheStats:
+    """What the cache did.
+
+    Attributes:
+    ----------
+    hits: Number of chunks that were already in the cache when we first needed them.
+    misses: Number of chunks fetched from the remote store.
+    bytes_fetched: Bytes fetched from the remote store, metadata included.
+    bytes_from_cache: Bytes read from the cache.
+    evicted: Number of chunks removed from the cache to stay under its size.
+    """
+
+    hits: int = 0
+    misses: int = 0
+    bytes_fetched: int = 0
+    bytes_from_cache: int = 0
+    evicted: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        """Share of the chunks that were read from the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class CachedStore(collections.abc.MutableMapping):
+    """Read-only zarr store that keeps the chunks of a remote store in a local directory.
+
+    Chunks are cached by key *and* version (ETag, or modification time and size), so that a
+    chunk rewritten in the remote store is fetched again. The versions come from listing the
+    directories of the remote store, each one only once and when we first need one of its keys,
+    so that the arrays that we don't read aren't listed. Metadata keys (".zarray", ".zmetadata",
+    etc.) are never cached.
+
+    The least recently used chunks are removed from the cache when it gets bigger than
+    `max_size`. Their order is kept in memory, and in the modification times of the cached files
+    for the next runs.
+
+    Arguments:
+    ---------
+    url: Path or URL of the remote store, e.g. "s3://bucket/nwp.zarr".
+    cache_dir: Directory of the cache. It can be shared between runs.
+    max_size: Maximum size of the cache, in bytes or as a string like "10GB".
+    storage_options: Passed to fsspec.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        cache_dir: str | pathlib.Path,
+        max_size: int | str = "10GB",
+        storage_options: dict[str, Any] | None = None,
+    ):
+        self._fs, self._root = fsspec.core.url_to_fs(url, **(storage_options or {}))
+        self._root = self._root.rstrip("/")
+        self._cache_dir = pathlib.Path(cache_dir)
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        self._max_size = parse_bytes(max_size) if isinstance(max_size, str) else max_size
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        # The chunks we already counted as hits or misses.
+        self._seen: set[str] = set()
+        # Versions of the keys of the remote store, by directory.
+        self._listings: dict[str, dict[str, str]] = {}
+
+        # The cached chunks and their size, from the least to the most recently used.
+        cached = []
+        for f in self._cache_dir.iterdir():
+            if f.suffix == ".chunk":
+                stat = f.stat()
+                cached.append((stat.st_mtime_ns, f, stat.st_size))
+        cached.sort()
+        self._lru: collections.OrderedDict[pathlib.Path, int] = collections.OrderedDict(
+            (f, size) for _, f, size in cached
+        )
+        self._cache_size = sum(self._lru.values())
+        self._last_used_ns = cached[-1][0] if cached else 0
+
+    def _key(self, path: str) -> str:
+        return path[len(self._root) :].lstrip("/")
+
+    def _version(self, key: str) -> str | None:
+        """Version of a key of the remote store, or `None` if there is no such key."""
+        directory = key.rsplit("/", 1)[0] if "/" in key else ""
+        listing = self._listings.get(directory)
+        if listing is None:
+            try:
+                infos = self._fs.ls(f"{self._root}/{directory}".rstrip("/"), detail=True)
+            except FileNotFoundError:
+                infos = []
+            listing = {
+                self._key(info["name"]): file_version(info)
+                for info in infos
+                if info["type"] == "file"
+            }
+            self._listings[directory] = listing
+        return listing.get(key)
+
+    def _cache_path(self, key: str, version: str) -> pathlib.Path:
+        digest = hashlib.sha256(f"{self._root}/{key}:{version}".encode()).hexdigest()
+        return self._cache_dir / f"{digest}.chunk"
+
+    def _touch(self, path: pathlib.Path) -> None:
+        """Mark a cached chunk as used now."""
+        # Strictly increasing, so that the order is right even within the resolution of the clock.
+        with self._lock:
+            self._last_used_ns = max(time.time_ns(), self._last_used_ns + 1)
+            ns = self._last_used_ns
+        os.utime(path, ns=(ns, ns))
+
+    def _used(self, path: pathlib.Path, size: int) -> None:
+        """Mark a cached chunk as the most recently used, with the lock held."""
+        if path in self._lru:
+            self._lru.move_to_end(path)
+        else:
+            self._lru[path] = size
+            self._cache_size += size
+
+    def _fetch(self, key: str) -> bytes:
+        try:
+            value = self._fs.cat_file(f"{self._root}/{key}")
+        except FileNotFoundError:
+            raise KeyError(key) from None
+        with self._lock:
+            self.stats.bytes_fetched += len(value)
+        return value
+
+    def is_cached(self, key: str) -> bool:
+        """Is that chunk in the cache."""
+        version = self._version(key)
+        return version is not None and self._cache_path(key, version).exists()
+
+    def __getitem__(self, key: str) -> bytes:
+        if _is_metadata(key):
+            return self._fetch(key)
+        version = self._version(key)
+        if version is None:
+            raise KeyError(key)
+
+        path = self._cache_path(key, version)
+        try:
+            value = path.read_bytes()
+        except FileNotFoundError:
+            pass
+        else:
+            # The modification time is what the next runs use to find the least recently used
+            # chunks.
+            self._touch(path)
+            with self._lock:
+                if key not in self._seen:
+                    self.stats.hits += 1
+                self._seen.add(key)
+                self.stats.bytes_from_cache += len(value)
+                self._used(path, len(value))
+            return value
+
+        value = self._fetch(key)
+        # Write then rename, so that we never read a partial chunk.
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(value)
+        tmp_path.replace(path)
+        self._touch(path)
+        with self._lock:
+            self.stats.misses += 1
+            self._seen.add(key)
+            self._used(path, len(value))
+            self._evict()
+        return value
+
+    def _evict(self) -> None:
+        """Remove the least recently used chunks until the cache fits, with the lock held."""
+        while self._cache_size > self._max_size and self._lru:
+            path, size = self._lru.popitem(last=False)
+            path.unlink(missing_ok=True)
+            self._cache_size -= size
+            self.stats.evicted += 1
+
+    def prefetch(self, keys: Iterable[str], max_workers: int = 16) -> int:
+        """Fetch the chunks that aren't cached yet, concurrently.
+
+        Return:
+        ------
+        The number of chunks fetched.
+        """
+        keys = [
+            key
+            for key in keys
+            if not _is_metadata(key) and self._version(key) is not None and not self.is_cached(key)
+        ]
+        if not keys:
+            return 0
+        _log.info(f"Prefetching {len(keys)} chunks from {self._root}")
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            for _ in executor.map(self.__getitem__, keys):
+                pass
+        return len(keys)
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self._version(key) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        # This lists the whole remote store, which zarr doesn't need to read it.
+        return (self._key(path) for path in self._fs.find(self._root))
+
+    def __len__(self) -> int:
+        return len(self._fs.find(self._root))
+
+    def __setitem__(self, key: str, value: bytes) -> None:
+        raise PermissionError("The store is read-only")
+
+    def __delitem__(self, key: str) -> None:
+        raise PermissionError("The store is read-only")
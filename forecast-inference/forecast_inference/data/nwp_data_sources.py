@@ -1,11 +1,33 @@
 """
 NWP Data Source
 """
+import collections
+import dataclasses
+import datetime as dt
+import hashlib
+import itertools
+import json
 import logging
+import os
+import pathlib
+import resource
+import time
+from typing import Any, Literal, TypedDict, cast
 
-import ocf_blosc2  # noqa
+import dask
+import fsspec
+import numpy as np
+import pandas as pd
 import pyproj
 import xarray as xr
+import zarr
+from dask.callbacks import Callback
+from dask.delayed import Delayed
+from dask.utils import key_split, parse_bytes
+from numcodecs.abc import Codec
+from ocf_blosc2 import Blosc2
+
+from forecast_inference.data.cached_store import CacheStats, CachedStore
 
 # OSGB is also called "OSGB 1936 / British National Grid -- United
 # Kingdom Ordnance Survey".  OSGB is used in many UK electricity
@@ -29,19 +51,248 @@ laea = pyproj.Proj(**lambert_aea2)  # type: ignore[arg-type]
 osgb = pyproj.Proj(f"EPSG:{OSGB36}")
 
 laea_to_osgb = pyproj.Transformer.from_proj(laea, osgb).transform
+lat_lon_to_osgb = pyproj.Transformer.from_crs(4326, OSGB36).transform
 
 logger = logging.getLogger(__name__)
 
+# Options of `download_and_add_osgb_to_nwp_data_source` that only apply to the local store, and
+# that `load_nwp_data` doesn't take since it doesn't write one.
+LOCAL_STORE_OPTIONS = ("incremental", "skip_unchanged", "store_profile")
 
-def download_and_add_osgb_to_nwp_data_source(
-    from_nwp_path: str, to_nwp_path: str, variables_to_keep: None | list = None
-) -> None:
+
+class NwpLoadOptions(TypedDict, total=False):
+    """Optional arguments of `load_nwp_data`."""
+
+    retention: str | None
+    crop_to_coordinates: list[tuple[float, float]] | None
+    crop_margin_pixels: int
+    crop_tiles: bool
+    timestamp: dt.datetime | None
+    init_time_lookback: str
+    scheduler: Literal["threads", "processes", "synchronous"]
+    num_workers: int | None
+    memory_limit: str | None
+    source_cache_dir: str | None
+    source_cache_size: str
+    prefetch_workers: int
+
+
+class NwpConversionOptions(NwpLoadOptions, total=False):
+    """Optional arguments of `download_and_add_osgb_to_nwp_data_source`, which are those of
+    `load_nwp_data` and the `LOCAL_STORE_OPTIONS`."""
+
+    incremental: bool
+    skip_unchanged: bool
+    store_profile: str
+
+
+def nwp_conversion_options(options: dict[str, Any]) -> NwpConversionOptions:
+    """Check options of the conversion, e.g. from a config.
+
+    Raise:
+    -----
+    ValueError: For unknown options.
     """
-    Download and add OSBG to the NWP data source.
+    unknown = options.keys() - NwpConversionOptions.__optional_keys__
+    if unknown:
+        raise ValueError(f"Unknown NWP conversion options: {sorted(unknown)}")
+    return cast(NwpConversionOptions, options)
+
+
+def nwp_load_options(options: NwpConversionOptions) -> NwpLoadOptions:
+    """The options of the conversion that `load_nwp_data` takes, without the
+    `LOCAL_STORE_OPTIONS`."""
+    return cast(
+        NwpLoadOptions,
+        {key: value for key, value in options.items() if key not in LOCAL_STORE_OPTIONS},
+    )
+
+
+# Layout of the local NWP store.
+_DIMS = ("variable", "init_time", "step", "y", "x")
+_CHUNKS = {"variable": 1, "init_time": 1, "step": 43, "y": 100, "x": 100}
+# A site needs all the variables and steps of one pixel.
+_SITE_READ_CHUNKS = {"variable": -1, "init_time": 1, "step": -1, "y": 16, "x": 16}
+
+
+@dataclasses.dataclass(frozen=True)
+class NwpStoreProfile:
+    """How we chunk and compress our local NWP store.
+
+    Attributes:
+    ----------
+    chunks: Chunk size for each dimension, -1 meaning the whole dimension.
+    compressor: The zarr compressor, `None` for no compression, or "source" to use the one of
+        the source store.
+    dtype: Cast the data to this type, e.g. "float16". By default we keep the source's type.
+    """
+
+    chunks: dict[str, int]
+    compressor: Codec | None | Literal["source"] = "source"
+    dtype: str | None = None
+
+
+STORE_PROFILES = {
+    "default": NwpStoreProfile(_CHUNKS),
+    # Small spatial chunks, for reading the pixels of a few sites.
+    "site_read": NwpStoreProfile(_SITE_READ_CHUNKS),
+    "site_read_zstd1": NwpStoreProfile(_SITE_READ_CHUNKS, Blosc2(cname="zstd", clevel=1)),
+    "zstd1": NwpStoreProfile(_CHUNKS, Blosc2(cname="zstd", clevel=1)),
+    "zstd9": NwpStoreProfile(_CHUNKS, Blosc2(cname="zstd", clevel=9)),
+    "blosclz": NwpStoreProfile(_CHUNKS, Blosc2(cname="blosc2", clevel=5)),
+    "uncompressed": NwpStoreProfile(_CHUNKS, None),
+    "float32": NwpStoreProfile(_CHUNKS, dtype="float32"),
+    # Values above 65504 (e.g. some visibilities) become infinite.
+    "float16": NwpStoreProfile(_CHUNKS, dtype="float16"),
+}
+
+# Present in the local store while it is being updated in place. If we find it, the previous
+# update didn't finish and we rewrite the store from scratch.
+_UPDATE_IN_PROGRESS = ".update_in_progress"
+
+# Written in the local store after each conversion, to know what it was converted from.
+_MANIFEST = ".conversion_manifest.json"
+
+
+def _select_init_times_for_timestamp(
+    nwp: xr.Dataset, timestamp: dt.datetime, lookback: str
+) -> xr.Dataset:
+    """Keep the latest init_time available at `timestamp`, and those up to `lookback` before it."""
+    ts = pd.Timestamp(timestamp)
+    if ts.tz is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+
+    init_times = nwp.init_time.values
+    available = init_times[init_times <= ts.to_datetime64()]
+    if len(available) == 0:
+        logger.warning(f"No NWP init_time before {ts}, keeping them all")
+        return nwp
+
+    latest = available.max()
+    keep = (init_times <= latest) & (init_times >= latest - pd.Timedelta(lookback).to_timedelta64())
+    logger.info(f"Keeping {keep.sum()} of {len(init_times)} NWP init_times for {ts}")
+    return nwp.isel(init_time=np.flatnonzero(keep))
+
+
+# OSGB coordinates of the LAEA grids we have seen, by hash of their LAEA coordinates.
+_osgb_grids: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+
+
+def _grid_hash(x_laea: np.ndarray, y_laea: np.ndarray) -> str:
+    h = hashlib.sha256(repr(sorted(lambert_aea2.items())).encode())
+    for values in (x_laea, y_laea):
+        values = np.ascontiguousarray(values)
+        h.update(f"{values.dtype.str}{values.shape}".encode())
+        h.update(values.tobytes())
+    return h.hexdigest()[:16]
+
+
+def _laea_grid_to_osgb(
+    x_laea: np.ndarray, y_laea: np.ndarray, grids_dir: pathlib.Path | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """1-D OSGB coordinates of a LAEA grid.
+
+    Like the data, we use the first row of the grid for x and its first column for y, so we only
+    need to transform those. The result is kept in memory and, if `grids_dir` is given, in a
+    file there, so that we only compute it once per grid.
+
+    Arguments:
+    ---------
+    x_laea: The x coordinates of the grid in LAEA.
+    y_laea: The y coordinates of the grid in LAEA.
+    grids_dir: Directory where we save the OSGB coordinates of the grids.
+
+    Return:
+    ------
+    The x and y coordinates of the grid in OSGB.
     """
+    key = _grid_hash(x_laea, y_laea)
+    if key in _osgb_grids:
+        return _osgb_grids[key]
+
+    path = None if grids_dir is None else grids_dir / f"{key}.npz"
+    if path is not None and path.exists():
+        logger.debug(f"Loading the OSGB coordinates of grid {key} from {path}")
+        with np.load(path) as grid:
+            x_osgb, y_osgb = grid["x"], grid["y"]
+    else:
+        logger.info(f"Computing the OSGB coordinates of grid {key}")
+        x_osgb, _ = laea_to_osgb(xx=x_laea, yy=np.full_like(x_laea, y_laea[0]))
+        _, y_osgb = laea_to_osgb(xx=np.full_like(y_laea, x_laea[0]), yy=y_laea)
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write then rename, so that we never read a partial file.
+            tmp_path = path.with_suffix(".tmp.npz")
+            np.savez(tmp_path, x=x_osgb, y=y_osgb)
+            tmp_path.replace(path)
+
+    _osgb_grids[key] = (x_osgb, y_osgb)
+    return x_osgb, y_osgb
+
+
+def _track_source_positions(nwp: xr.Dataset) -> xr.Dataset:
+    """Remember where the data comes from in the source store, see `_source_chunk_keys`."""
+    nwp = nwp.assign_coords(
+        {f"_source_{dim}": (dim, np.arange(size)) for dim, size in nwp.sizes.items()}
+    )
+    for name, var in nwp.data_vars.items():
+        var.attrs["_source_name"] = name
+    return nwp
+
+
+def _source_chunk_keys(nwp: xr.Dataset, store: CachedStore) -> list[str]:
+    """Keys of the chunks of the source store that `nwp` needs."""
+    keys = []
+    for var in nwp.data_vars.values():
+        name = var.attrs["_source_name"]
+        meta = json.loads(store[f"{name}/.zarray"])
+        dims = json.loads(store[f"{name}/.zattrs"])["_ARRAY_DIMENSIONS"]
+        chunk_indices = [
+            np.unique(nwp[f"_source_{dim}"].values // size)
+            for dim, size in zip(dims, meta["chunks"])
+        ]
+        separator = meta.get("dimension_separator") or "."
+        keys += [
+            f"{name}/{separator.join(str(i) for i in index)}"
+            for index in itertools.product(*chunk_indices)
+        ]
+    return keys
+
+
+def _forget_source_positions(nwp: xr.Dataset) -> xr.Dataset:
+    nwp = nwp.drop_vars([name for name in nwp.coords if str(name).startswith("_source_")])
+    for var in nwp.data_vars.values():
+        var.attrs.pop("_source_name", None)
+    return nwp
+
 
+def _open_and_prepare_nwp(
+    from_nwp_path: str,
+    variables_to_keep: None | list = None,
+    timestamp: dt.datetime | None = None,
+    init_time_lookback: str = "0h",
+    crop_to_coordinates: list[tuple[float, float]] | None = None,
+    crop_margin_pixels: int = 2,
+    crop_tiles: bool = False,
+    retention: str | None = None,
+    grids_dir: pathlib.Path | None = None,
+    source_store: CachedStore | None = None,
+) -> xr.Dataset:
+    """Lazily open the source NWP data and put it in the layout of our local store.
+
+    When given, the source is read through `source_store`, and the result keeps track of where
+    its data is in the source, for `_prefetch_source`. See
+    `download_and_add_osgb_to_nwp_data_source` for the other arguments.
+    """
     logger.debug(f"Loading NWP data from {from_nwp_path}")
-    nwp = xr.open_zarr(from_nwp_path)
+    if source_store is None:
+        nwp = xr.open_zarr(from_nwp_path)
+    else:
+        nwp = _track_source_positions(xr.open_zarr(source_store))
+
+    # Select the init_times first, so that we don't process the others at all.
+    if timestamp is not None:
+        nwp = _select_init_times_for_timestamp(nwp, timestamp, init_time_lookback)
 
     # if um-ukv is in the datavars, then this comes from the new new-consumer > 1.0.0
     # We need to rename the data variables, and
@@ -86,20 +337,8 @@ def download_and_add_osgb_to_nwp_data_source(
         nwp = nwp.assign_coords(x_laea=nwp.x)
         nwp = nwp.assign_coords(y_laea=nwp.y)
 
-        # calculate latitude and longitude from x_laea and y_laea
-        # x is an array of 455, and y is an array of 639
-        # we need to change x to a 2d array of shape (455, 639)
-        # and y to a 2d array of shape (455, 639)
-        x, y = nwp.x_laea.values, nwp.y_laea.values
-        x = x.reshape(1, -1).repeat(len(nwp.y_laea.values), axis=0)
-        y = y.reshape(-1, 1).repeat(len(nwp.x_laea.values), axis=1)
-
-        # calculate latitude and longitude from x and y
-        x_osgb, y_osgb = laea_to_osgb(xx=x, yy=y)
-
-        # we just take 1-d versions of x_osgb and y_osgb, and reassign
-        nwp = nwp.assign_coords(x=x_osgb[0])
-        nwp = nwp.assign_coords(y=y_osgb[:, 0])
+        x_osgb, y_osgb = _laea_grid_to_osgb(nwp.x_laea.values, nwp.y_laea.values, grids_dir)
+        nwp = nwp.assign_coords(x=x_osgb, y=y_osgb)
 
     # keep only the variables we need
     if variables_to_keep is not None:
@@ -108,17 +347,575 @@ def download_and_add_osgb_to_nwp_data_source(
     # trim to x>0, gets rid of ireland and the sea
     nwp = nwp.sel(x=slice(0, nwp.x.max()))
 
-    # save to zarr
-    logger.debug(f"Saving NWP data from {to_nwp_path}")
+    if crop_to_coordinates:
+        nwp = _crop_to_coordinates(nwp, crop_to_coordinates, crop_margin_pixels, crop_tiles)
+
     for v in list(nwp.coords.keys()):
         if nwp.coords[v].dtype == object:
             nwp.coords[v] = nwp.coords[v].astype("unicode")
 
+    if retention is not None:
+        cutoff = nwp.init_time.values.max() - pd.Timedelta(retention).to_timedelta64()
+        nwp = nwp.sel(init_time=nwp.init_time >= cutoff)
+
     # re order to (variable, init_time, step, y, x)
-    nwp = nwp.transpose("variable", "init_time", "step", "y", "x")
+    return nwp.transpose(*_DIMS)
+
+
+def _prefetch_source(
+    nwp: xr.Dataset, source_store: CachedStore | None, prefetch_workers: int
+) -> xr.Dataset:
+    """Fetch the chunks of the source that `nwp` needs in the cache of `source_store`."""
+    if source_store is None:
+        return nwp
+    source_store.prefetch(_source_chunk_keys(nwp, source_store), prefetch_workers)
+    return _forget_source_positions(nwp)
+
+
+def _crop_to_coordinates(
+    nwp: xr.Dataset,
+    coordinates: list[tuple[float, float]],
+    margin_pixels: int,
+    tiles: bool = False,
+) -> xr.Dataset:
+    """Keep only the part of the grid around some (latitude, longitude) coordinates.
+
+    Arguments:
+    ---------
+    nwp: NWP data on the OSGB grid.
+    coordinates: (latitude, longitude) of the points we need.
+    margin_pixels: Number of pixels to keep around the points.
+    tiles: Instead of the bounding box of all the points, only keep the rows and columns that
+        are within `margin_pixels` of a point. This is smaller when the points are in separate
+        clusters.
+    """
+    lats, lons = np.array(coordinates, dtype=float).reshape(-1, 2).T
+    xs, ys = lat_lon_to_osgb(lats, lons)
+
+    def _indices(grid: np.ndarray, values: np.ndarray) -> np.ndarray:
+        # Nearest pixel of each point.
+        nearest = np.abs(grid[:, None] - values[None, :]).argmin(axis=0)
+        if tiles:
+            windows = nearest[:, None] + np.arange(-margin_pixels, margin_pixels + 1)[None, :]
+            keep = np.unique(windows)
+        else:
+            keep = np.arange(nearest.min() - margin_pixels, nearest.max() + margin_pixels + 1)
+        return keep[(keep >= 0) & (keep < len(grid))]
+
+    x_indices = _indices(nwp.x.values, xs)
+    y_indices = _indices(nwp.y.values, ys)
+    logger.info(
+        f"Cropping the NWP grid from {nwp.sizes['x']}x{nwp.sizes['y']}"
+        f" to {len(x_indices)}x{len(y_indices)} pixels around {len(lats)} sites"
+    )
+    return nwp.isel(x=x_indices, y=y_indices)
+
+
+@dataclasses.dataclass
+class NwpConversionStats:
+    """What the conversion of the NWP data did.
+
+    Attributes:
+    ----------
+    cache_hit: The source hadn't changed since the last conversion, so we skipped it.
+    bytes_saved: Size of the local store that we didn't have to write again, which is 0 when
+        updating it incrementally.
+    chunks_written: Number of chunks written to the local store.
+    write_seconds: Time spent computing and writing those chunks.
+    peak_memory_bytes: Peak resident memory of the process, at the end of the conversion.
+    source_cache: What the cache of the source store did, if we used one.
+    """
+
+    cache_hit: bool = False
+    bytes_saved: int = 0
+    chunks_written: int = 0
+    write_seconds: float = 0.0
+    peak_memory_bytes: int = 0
+    source_cache: CacheStats | None = None
+
+
+@dataclasses.dataclass(frozen=True)
+class DaskOptions:
+    """How dask computes the chunks of the NWP data, to write our local store or to load them.
+
+    Attributes:
+    ----------
+    scheduler: One of dask's local schedulers: "threads", "processes" or "synchronous".
+    num_workers: Number of chunks processed at the same time. Defaults to the number of cores.
+    memory_limit: Approximate memory that the conversion can use, e.g. "4GB". We process fewer
+        chunks at the same time if needed to stay under it.
+    """
+
+    scheduler: Literal["threads", "processes", "synchronous"] = "threads"
+    num_workers: int | None = None
+    memory_limit: str | None = None
+
+
+class _TaskTimer(Callback):
+    """Times the dask tasks, by name."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._starts: dict[Any, float] = {}
+        self.durations: dict[str, list[float]] = collections.defaultdict(list)
 
-    # adjust chunk size to (1,1,43,639,455)
-    nwp = nwp.chunk({"variable": 1, "init_time": 1, "step": 43, "y": 100, "x": 100})
+    def _pretask(self, key, dsk, state):
+        self._starts[key] = time.perf_counter()
 
-    # save to zarr
-    nwp.to_zarr(to_nwp_path, mode="w", safe_chunks=False)
+    def _posttask(self, key, result, dsk, state, id):
+        self.durations[key_split(key)].append(time.perf_counter() - self._starts.pop(key))
+
+
+def _max_chunk_nbytes(nwp: xr.Dataset) -> int:
+    return max(
+        (
+            var.dtype.itemsize * int(np.prod([max(c) for c in var.chunks]))
+            for var in nwp.data_vars.values()
+            if var.chunks
+        ),
+        default=0,
+    )
+
+
+def _peak_memory_bytes() -> int:
+    """Peak resident memory of this process and of its (finished) children."""
+    who = [resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN]
+    # In kilobytes on Linux.
+    return sum(resource.getrusage(w).ru_maxrss for w in who) * 1024
+
+
+def _num_workers(options: DaskOptions, chunk_nbytes: int) -> int:
+    """Number of chunks processed at the same time, within the memory limit."""
+    num_workers = options.num_workers or os.cpu_count() or 1
+    if options.memory_limit is not None and chunk_nbytes > 0:
+        # Roughly the chunk as read and as written.
+        max_workers = max(1, parse_bytes(options.memory_limit) // (2 * chunk_nbytes))
+        if max_workers < num_workers:
+            logger.info(f"Using {max_workers} workers to stay under {options.memory_limit}")
+            num_workers = max_workers
+    return num_workers
+
+
+def _compute(
+    delayed: Delayed, chunk_nbytes: int, options: DaskOptions, stats: NwpConversionStats
+) -> None:
+    """Compute the writing of our local store, and report how it went."""
+    num_workers = _num_workers(options, chunk_nbytes)
+
+    timer = _TaskTimer()
+    t0 = time.perf_counter()
+    with timer:
+        dask.compute(delayed, scheduler=options.scheduler, num_workers=num_workers)
+    seconds = time.perf_counter() - t0
+
+    # There is one of those tasks per chunk that we write.
+    chunk_seconds = np.array(timer.durations.get("store-map", [0.0]))
+    for name, durations in sorted(timer.durations.items()):
+        logger.debug(f"{name}: {len(durations)} task(s) in {sum(durations):.3f}s")
+
+    stats.chunks_written += len(timer.durations.get("store-map", []))
+    stats.write_seconds += seconds
+    stats.peak_memory_bytes = _peak_memory_bytes()
+    logger.info(
+        f"Wrote {len(timer.durations.get('store-map', []))} NWP chunks in {seconds:.2f}s"
+        f" ({options.scheduler}, {num_workers} workers)"
+        f" | per chunk: mean={chunk_seconds.mean() * 1000:.1f}ms"
+        f" max={chunk_seconds.max() * 1000:.1f}ms"
+        f" | peak memory={stats.peak_memory_bytes / 1e6:.0f}MB"
+    )
+
+
+def _write_nwp(
+    nwp: xr.Dataset,
+    to_nwp_path: str,
+    append: bool = False,
+    store_profile: str = "default",
+    dask_options: DaskOptions = DaskOptions(),
+    stats: NwpConversionStats | None = None,
+) -> None:
+    """Write (or append along `init_time`) NWP data to our local store.
+
+    Each chunk (by default of one variable and init_time) is read, converted and written in
+    parallel, according to `dask_options`. What happened is added to `stats`.
+    """
+    profile = STORE_PROFILES[store_profile]
+    # The chunks of the source.
+    source_chunk_nbytes = _max_chunk_nbytes(nwp)
+    if profile.compressor == "source":
+        compressors = {
+            name: var.encoding["compressor"]
+            for name, var in nwp.data_vars.items()
+            if "compressor" in var.encoding
+        }
+    else:
+        compressors = {name: profile.compressor for name in nwp.data_vars}
+    if profile.dtype is not None:
+        # This loses the encoding of the source.
+        nwp = nwp.astype({name: profile.dtype for name in nwp.data_vars})
+    nwp = nwp.chunk(profile.chunks)
+    nwp.attrs["store_profile"] = store_profile
+    # Otherwise the chunks of the source store take precedence over ours.
+    for var in nwp.variables.values():
+        var.encoding.pop("chunks", None)
+        var.encoding.pop("preferred_chunks", None)
+    for name, data_var in nwp.data_vars.items():
+        data_var.encoding.pop("dtype", None)
+        if name in compressors:
+            data_var.encoding["compressor"] = compressors[name]
+
+    logger.debug(f"Saving NWP data to {to_nwp_path}")
+    if append:
+        delayed = nwp.to_zarr(
+            to_nwp_path, append_dim="init_time", safe_chunks=False, compute=False
+        )
+    else:
+        delayed = nwp.to_zarr(to_nwp_path, mode="w", safe_chunks=False, compute=False)
+
+    chunk_nbytes = max(source_chunk_nbytes, _max_chunk_nbytes(nwp))
+    _compute(delayed, chunk_nbytes, dask_options, stats or NwpConversionStats())
+
+
+def _drop_first_init_times(to_nwp_path: str, num_init_times: int) -> None:
+    """Remove the `num_init_times` oldest init_times of our local store, in place.
+
+    Our data is chunked by init_time, so instead of rewriting it we shift the chunks' keys.
+    """
+    group = zarr.open_group(to_nwp_path, mode="r+")
+    for name, array in list(group.arrays()):
+        dims = array.attrs.get("_ARRAY_DIMENSIONS", [])
+        if "init_time" not in dims:
+            continue
+        axis = dims.index("init_time")
+        new_shape = list(array.shape)
+        new_shape[axis] -= num_init_times
+
+        if array.ndim == 1:
+            # Coordinate: small enough to rewrite.
+            values = array[num_init_times:]
+            array.resize(new_shape)
+            array[:] = values
+            continue
+
+        if array.chunks[axis] != 1:
+            raise RuntimeError(f"Array {name!r} is not chunked by init_time")
+
+        store = group.store
+        prefix = f"{array.path}/"
+        chunk_keys = []
+        for key in store.keys():
+            rest = key[len(prefix) :] if key.startswith(prefix) else None
+            if rest is None or rest.startswith("."):
+                continue
+            separator = "/" if "/" in rest else "."
+            indices = [int(i) for i in rest.split(separator)]
+            chunk_keys.append((indices, separator))
+
+        chunk_keys.sort(key=lambda k: k[0][axis])
+        for indices, separator in chunk_keys:
+            src = prefix + separator.join(map(str, indices))
+            if indices[axis] < num_init_times:
+                del store[src]
+                continue
+            indices[axis] -= num_init_times
+            zarr.storage.rename(store, src, prefix + separator.join(map(str, indices)))
+
+        array.resize(new_shape)
+
+    zarr.consolidate_metadata(to_nwp_path)
+
+
+def _update_nwp_incrementally(
+    nwp: xr.Dataset,
+    to_nwp_path: str,
+    dask_options: DaskOptions = DaskOptions(),
+    stats: NwpConversionStats | None = None,
+) -> bool:
+    """Bring our local store up to date with `nwp`, touching only what changed.
+
+    New init_times are appended and the init_times that are no longer in `nwp` are dropped.
+    See `_write_nwp` for `dask_options` and `stats`.
+
+    Return:
+    ------
+        False if the local store can't be updated incrementally and should be rewritten.
+    """
+    path = pathlib.Path(to_nwp_path)
+    if not path.exists():
+        return False
+
+    if (path / _UPDATE_IN_PROGRESS).exists():
+        logger.warning(f"Previous update of {to_nwp_path} was interrupted")
+        return False
+
+    try:
+        local = xr.open_zarr(to_nwp_path)
+    except Exception:
+        logger.warning(f"Could not open {to_nwp_path}", exc_info=True)
+        return False
+
+    if local.attrs.get("store_profile", "default") != nwp.attrs["store_profile"]:
+        logger.info("The store profile changed")
+        return False
+
+    for coord in ["variable", "step", "y", "x"]:
+        if coord not in local.coords or not np.array_equal(local[coord].values, nwp[coord].values):
+            logger.info(f"Coordinate {coord!r} changed")
+            return False
+
+    local_times = local.init_time.values
+    source_times = nwp.init_time.values
+    if len(local_times) == 0:
+        return False
+
+    # Appending only works at the end, and pruning only at the start.
+    new_times = source_times[source_times > local_times[-1]]
+    num_stale = int(np.sum(local_times < source_times[0])) if len(source_times) else 0
+    kept_times = local_times[num_stale:]
+    if not np.array_equal(kept_times, source_times[: len(kept_times)]):
+        logger.info("The local init_times don't match the source's")
+        return False
+
+    if num_stale == len(local_times):
+        # Nothing left to keep, we might as well rewrite everything.
+        return False
+
+    logger.info(
+        f"Appending {len(new_times)} init_time(s) to {to_nwp_path}"
+        f" and dropping {num_stale} old one(s)"
+    )
+    (path / _UPDATE_IN_PROGRESS).touch()
+    if num_stale > 0:
+        _drop_first_init_times(to_nwp_path, num_stale)
+    if len(new_times) > 0:
+        _write_nwp(
+            nwp.sel(init_time=new_times),
+            to_nwp_path,
+            append=True,
+            store_profile=nwp.attrs["store_profile"],
+            dask_options=dask_options,
+            stats=stats,
+        )
+    (path / _UPDATE_IN_PROGRESS).unlink()
+
+    return True
+
+
+def _fingerprint(from_nwp_path: str, nwp: xr.Dataset) -> str | None:
+    """Fingerprint of the source store and of what we would write from it.
+
+    This only reads the metadata and coordinates of the source, so that we can skip an unchanged
+    source before fetching its data. Returns `None` when the source doesn't have consolidated
+    metadata.
+    """
+    try:
+        metadata = fsspec.get_mapper(from_nwp_path)[".zmetadata"]
+    except KeyError:
+        return None
+
+    h = hashlib.sha256(metadata)
+    h.update(str(nwp.init_time.values.max()).encode())
+    # This includes our store profile.
+    h.update(json.dumps(nwp.attrs, sort_keys=True, default=str).encode())
+    for name, values in sorted(nwp.coords.items()):
+        if str(name).startswith("_source_"):
+            continue
+        h.update(f"{name}{values.dtype.str}{values.shape}".encode())
+        h.update(np.ascontiguousarray(values.values).tobytes())
+    for name, var in sorted(nwp.data_vars.items()):
+        h.update(f"{name}{var.dtype.str}{var.dims}".encode())
+    return h.hexdigest()
+
+
+def _read_manifest(to_nwp_path: str) -> dict | None:
+    try:
+        with open(pathlib.Path(to_nwp_path) / _MANIFEST) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(to_nwp_path: str, from_nwp_path: str, fingerprint: str) -> None:
+    path = pathlib.Path(to_nwp_path)
+    nbytes = sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+    manifest = {"source": from_nwp_path, "fingerprint": fingerprint, "nbytes": nbytes}
+    tmp_path = path / f"{_MANIFEST}.tmp"
+    tmp_path.write_text(json.dumps(manifest))
+    tmp_path.replace(path / _MANIFEST)
+
+
+def _report_source_cache(store: CachedStore) -> CacheStats:
+    stats = store.stats
+    logger.info(
+        f"NWP source cache | hit_ratio={stats.hit_ratio:.2f} hits={stats.hits}"
+        f" misses={stats.misses} bytes_fetched={stats.bytes_fetched}"
+        f" bytes_from_cache={stats.bytes_from_cache} evicted={stats.evicted}"
+    )
+    return stats
+
+
+def download_and_add_osgb_to_nwp_data_source(
+    from_nwp_path: str,
+    to_nwp_path: str,
+    variables_to_keep: None | list = None,
+    incremental: bool = False,
+    retention: str | None = None,
+    crop_to_coordinates: list[tuple[float, float]] | None = None,
+    crop_margin_pixels: int = 2,
+    crop_tiles: bool = False,
+    timestamp: dt.datetime | None = None,
+    init_time_lookback: str = "0h",
+    skip_unchanged: bool = False,
+    store_profile: str = "default",
+    scheduler: Literal["threads", "processes", "synchronous"] = "threads",
+    num_workers: int | None = None,
+    memory_limit: str | None = None,
+    source_cache_dir: str | None = None,
+    source_cache_size: str = "10GB",
+    prefetch_workers: int = 16,
+) -> NwpConversionStats:
+    """
+    Download and add OSBG to the NWP data source.
+
+    Arguments:
+    ---------
+    from_nwp_path: Path to the source NWP zarr.
+    to_nwp_path: Path to our local NWP zarr.
+    variables_to_keep: Only keep those NWP variables.
+    incremental: Instead of rewriting the local store, only append the new init_times and drop
+        the ones that we don't keep anymore. Falls back to a full rewrite when the local store
+        doesn't match the source, for instance if the grid or variables changed.
+    retention: Only keep the init_times this recent, relative to the latest one, as a pandas
+        timedelta string, e.g. "2D". By default we keep all the init_times of the source.
+    crop_to_coordinates: Only keep the part of the grid around those (latitude, longitude)
+        points, typically our sites.
+    crop_margin_pixels: Number of pixels to keep around the points when cropping.
+    crop_tiles: Keep only the pixels near the points instead of their whole bounding box.
+    timestamp: Time of the forecast. When given, we only keep the latest init_time available at
+        that time, and the ones up to `init_time_lookback` before it.
+    init_time_lookback: How far back to keep init_times before the latest one, as a pandas
+        timedelta string. It should cover the `lag_minutes` of the model's NWP data source.
+    skip_unchanged: Skip the conversion when neither the source nor what we would keep from it
+        changed since the last conversion, according to the manifest of the local store. This is
+        checked before fetching the data of the source.
+    store_profile: How to chunk and compress the local store, one of `STORE_PROFILES`. Use
+        `scripts/benchmark_nwp_store_profiles.py` to compare them.
+    scheduler: The dask scheduler that converts and writes the chunks in parallel.
+    num_workers: Number of chunks converted at the same time. Defaults to the number of cores.
+    memory_limit: Approximate memory that the conversion can use, e.g. "4GB".
+    source_cache_dir: Keep the chunks of the source in this directory, and only fetch the ones
+        that changed since the previous runs.
+    source_cache_size: Maximum size of the cache. The least recently used chunks are removed.
+    prefetch_workers: Number of chunks fetched at the same time when filling the cache.
+
+    Return:
+    ------
+    What the conversion did.
+    """
+    source_store = (
+        None
+        if source_cache_dir is None
+        else CachedStore(from_nwp_path, source_cache_dir, source_cache_size)
+    )
+    nwp = _open_and_prepare_nwp(
+        from_nwp_path,
+        variables_to_keep,
+        timestamp=timestamp,
+        init_time_lookback=init_time_lookback,
+        crop_to_coordinates=crop_to_coordinates,
+        crop_margin_pixels=crop_margin_pixels,
+        crop_tiles=crop_tiles,
+        retention=retention,
+        grids_dir=pathlib.Path(f"{to_nwp_path}.grids"),
+        source_store=source_store,
+    )
+    if store_profile not in STORE_PROFILES:
+        raise ValueError(f"Unknown NWP store profile: {store_profile}")
+    nwp.attrs["store_profile"] = store_profile
+
+    fingerprint = _fingerprint(from_nwp_path, nwp) if skip_unchanged else None
+    if fingerprint is not None:
+        manifest = _read_manifest(to_nwp_path)
+        if manifest is not None and manifest["fingerprint"] == fingerprint:
+            logger.info(f"{from_nwp_path} didn't change, skipping its conversion")
+            return NwpConversionStats(
+                cache_hit=True,
+                # An incremental update wouldn't have written anything for the same source.
+                bytes_saved=0 if incremental else manifest["nbytes"],
+                source_cache=(
+                    None if source_store is None else _report_source_cache(source_store)
+                ),
+            )
+
+    # The manifest is only valid once the conversion is done.
+    (pathlib.Path(to_nwp_path) / _MANIFEST).unlink(missing_ok=True)
+
+    nwp = _prefetch_source(nwp, source_store, prefetch_workers)
+
+    dask_options = DaskOptions(scheduler, num_workers, memory_limit)
+    stats = NwpConversionStats()
+    if not (incremental and _update_nwp_incrementally(nwp, to_nwp_path, dask_options, stats)):
+        _write_nwp(
+            nwp, to_nwp_path, store_profile=store_profile, dask_options=dask_options, stats=stats
+        )
+
+    if fingerprint is not None:
+        _write_manifest(to_nwp_path, from_nwp_path, fingerprint)
+
+    if source_store is not None:
+        stats.source_cache = _report_source_cache(source_store)
+
+    return stats
+
+
+def load_nwp_data(
+    from_nwp_path: str,
+    variables_to_keep: None | list = None,
+    retention: str | None = None,
+    crop_to_coordinates: list[tuple[float, float]] | None = None,
+    crop_margin_pixels: int = 2,
+    crop_tiles: bool = False,
+    timestamp: dt.datetime | None = None,
+    init_time_lookback: str = "0h",
+    scheduler: Literal["threads", "processes", "synchronous"] = "threads",
+    num_workers: int | None = None,
+    memory_limit: str | None = None,
+    source_cache_dir: str | None = None,
+    source_cache_size: str = "10GB",
+    prefetch_workers: int = 16,
+) -> xr.Dataset:
+    """Load the NWP data in memory, as it would be in our local store.
+
+    This skips writing the local store and reading it back, which is faster when we have the
+    memory for it. See `download_and_add_osgb_to_nwp_data_source` for the arguments, except for
+    the `LOCAL_STORE_OPTIONS` which don't apply here. The dask options are used to read the chunks
+    in parallel.
+
+    Return:
+    ------
+    The NWP data, loaded in memory.
+    """
+    source_store = (
+        None
+        if source_cache_dir is None
+        else CachedStore(from_nwp_path, source_cache_dir, source_cache_size)
+    )
+    nwp = _open_and_prepare_nwp(
+        from_nwp_path,
+        variables_to_keep,
+        timestamp=timestamp,
+        init_time_lookback=init_time_lookback,
+        crop_to_coordinates=crop_to_coordinates,
+        crop_margin_pixels=crop_margin_pixels,
+        crop_tiles=crop_tiles,
+        retention=retention,
+        source_store=source_store,
+    )
+    nwp = _prefetch_source(nwp, source_store, prefetch_workers)
+    dask_options = DaskOptions(scheduler, num_workers, memory_limit)
+    num_workers = _num_workers(dask_options, _max_chunk_nbytes(nwp))
+    nwp = nwp.load(scheduler=scheduler, num_workers=num_workers)
+    logger.info(
+        f"Loaded {nwp.nbytes / 1e6:.1f} MB of NWP data in memory"
+        f" ({scheduler}, {num_workers} workers)"
+    )
+    return nwp
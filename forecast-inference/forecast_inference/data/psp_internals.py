@@ -0,0 +1,98 @@
+"""
+The private attributes of `psp` that we use.
+
+`psp` doesn't expose the data of its NWP data sources, nor the NWP data sources of its models, which
+we need to preload, extract or share that data. All the reads and writes of those attributes are
+here, so that they are in one place when `pv-site-prediction` is updated: its version is pinned in
+`pyproject.toml`, and `tests/unit/data/test_psp_internals.py` checks this module against it.
+"""
+import datetime as dt
+from typing import Protocol
+
+import numpy as np
+import xarray as xr
+from psp.gis import CoordinateTransformer
+from psp.models.base import PvSiteModel
+from psp.typings import Timestamp
+
+
+class NwpSource(Protocol):
+    """An `NwpDataSource`, or one of our wrappers of it, which pass on the attributes they don't
+    have to the wrapped data source."""
+
+    _data: xr.Dataset
+
+    @property
+    def _lag_minutes(self) -> float:
+        ...
+
+    @property
+    def _tolerance(self) -> str | None:
+        ...
+
+    @property
+    def _filter_on_step(self) -> bool | None:
+        ...
+
+    @property
+    def _coordinate_transformer(self) -> CoordinateTransformer:
+        ...
+
+    def get(
+        self,
+        *,
+        now: Timestamp,
+        timestamps: list[Timestamp] | Timestamp,
+        min_lat: float | None = None,
+        max_lat: float | None = None,
+        min_lon: float | None = None,
+        max_lon: float | None = None,
+        nearest_lat: float | None = None,
+        nearest_lon: float | None = None,
+        tolerance: str | None = None,
+        load: bool = True,
+    ) -> xr.DataArray | None:
+        ...
+
+
+def nwp_data(source: NwpSource) -> xr.Dataset:
+    """The data of the source, lazy or in memory."""
+    return source._data
+
+
+def set_nwp_data(source: NwpSource, data: xr.Dataset) -> None:
+    """Replace the data of the source, e.g. by the same data in memory."""
+    source._data = data
+
+
+def nwp_lag(source: NwpSource) -> dt.timedelta:
+    """Delay before an init_time is available."""
+    return dt.timedelta(minutes=source._lag_minutes)
+
+
+def nwp_tolerance(source: NwpSource) -> str | None:
+    """Default `tolerance` of `NwpDataSource.get`."""
+    return None if source._tolerance is None else str(source._tolerance)
+
+
+def nwp_filters_on_step(source: NwpSource) -> bool:
+    """Whether `NwpDataSource.get` only returns the steps nearest to the timestamps."""
+    return bool(source._filter_on_step)
+
+
+def nwp_xy(
+    source: NwpSource, coordinates: list[tuple[float, float]]
+) -> tuple[np.ndarray, np.ndarray]:
+    """The x and y, in the coordinate system of the data, of (latitude, longitude) coordinates."""
+    xs, ys = np.array(source._coordinate_transformer(coordinates)).reshape(-1, 2).T
+    return xs, ys
+
+
+def model_nwp_data_sources(model: PvSiteModel) -> dict[str, NwpSource]:
+    """The NWP data sources of a model, by name, empty when it doesn't use any."""
+    return getattr(model, "_nwp_data_sources", None) or {}
+
+
+def set_model_nwp_data_sources(model: PvSiteModel, sources: dict[str, NwpSource]) -> None:
+    """Replace the NWP data sources of a model, e.g. by wrappers of them."""
+    model._nwp_data_sources = sources  # type: ignore[attr-defined]
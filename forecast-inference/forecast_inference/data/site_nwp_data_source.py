@@ -0,0 +1,215 @@
+"""
+NWP data of the sites, extracted once per run.
+"""
+import logging
+from typing import Any, TypedDict
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+from psp.data_sources.utils import _STEP, _TIME, _VALUE, _X, _Y
+from psp.typings import Timestamp
+from psp.utils.dates import to_pydatetime
+
+from forecast_inference.data.psp_internals import (
+    NwpSource,
+    nwp_data,
+    nwp_filters_on_step,
+    nwp_lag,
+    nwp_tolerance,
+    nwp_xy,
+)
+
+_log = logging.getLogger(__name__)
+
+
+class NwpGetArguments(TypedDict):
+    """The arguments of `NwpDataSource.get`, passed on to the wrapped data source."""
+
+    now: Timestamp
+    timestamps: list[Timestamp] | Timestamp
+    min_lat: float | None
+    max_lat: float | None
+    min_lon: float | None
+    max_lon: float | None
+    nearest_lat: float | None
+    nearest_lon: float | None
+    tolerance: str | None
+    load: bool
+
+
+def init_time_index(source: NwpSource, now: Timestamp, tolerance: str | None) -> int | None:
+    """Index of the init_time used at `now`, the same way as `NwpDataSource.get`, or `None` if there
+    is none within the tolerance."""
+    [index] = (
+        nwp_data(source)
+        .indexes[_TIME]
+        .get_indexer(
+            pd.DatetimeIndex([now - nwp_lag(source)]),
+            method="ffill",
+            tolerance=None if tolerance is None else pd.Timedelta(tolerance),
+        )
+    )
+    return None if index == -1 else int(index)
+
+
+def nearest_pixel_indices(
+    source: NwpSource, coordinates: list[tuple[float, float]]
+) -> tuple[np.ndarray, np.ndarray]:
+    """Indices of the nearest pixels of (latitude, longitude) coordinates, the same way as
+    `NwpDataSource.get`.
+
+    Return:
+    ------
+    The indices along x and along y.
+    """
+    if len(coordinates) == 0:
+        return np.array([], dtype=int), np.array([], dtype=int)
+    xs, ys = nwp_xy(source, coordinates)
+    data = nwp_data(source)
+    x_indices = data.indexes[_X].get_indexer(pd.Index(xs), method="nearest")
+    y_indices = data.indexes[_Y].get_indexer(pd.Index(ys), method="nearest")
+    return x_indices, y_indices
+
+
+class SiteNwpDataSource:
+    """NWP data source serving the nearest pixel of known sites from memory.
+
+    The model asks the NWP data source for the nearest pixel of each site, always at the same
+    `now` during a run. We extract those pixels for all the sites at once, for all the variables
+    and steps, in a single `(pixel, variable, step)` array. Requests for those pixels at `now`
+    are then served by indexing that array, and any other request is passed on to the wrapped
+    data source. Sites sharing a pixel share its data.
+
+    Arguments:
+    ---------
+    source: The wrapped NWP data source.
+    coordinates: (latitude, longitude) of the sites.
+    now: Time at which the predictions are made.
+    """
+
+    def __init__(
+        self,
+        source: NwpSource,
+        coordinates: list[tuple[float, float]],
+        now: Timestamp,
+    ):
+        self._source = source
+        self._now = now
+        self._values: np.ndarray | None = None
+
+        index = init_time_index(source, now, nwp_tolerance(source))
+        if index is None:
+            # No NWP data within the tolerance: the source would return `None` for all the sites.
+            return
+
+        data = nwp_data(source).isel({_TIME: index})
+        self._init_time = to_pydatetime(data[_TIME].values.item())
+
+        x_indices, y_indices = nearest_pixel_indices(self._source, coordinates)
+        pixels = np.unique(np.stack([x_indices, y_indices], axis=1), axis=0)
+        self._pixels = {(int(x), int(y)): i for i, (x, y) in enumerate(pixels)}
+        # Most requests are for exactly those coordinates.
+        self._pixel_of_coordinates = {
+            (lat, lon): self._pixels[(int(x), int(y))]
+            for (lat, lon), x, y in zip(coordinates, x_indices, y_indices)
+        }
+
+        values = (
+            data[_VALUE]
+            .isel(
+                {
+                    _X: xr.DataArray(pixels[:, 0], dims="pixel"),
+                    _Y: xr.DataArray(pixels[:, 1], dims="pixel"),
+                }
+            )
+            .transpose("pixel", ..., _STEP)
+            .load()
+        )
+        self._values = values.values
+        self._dims = values.dims[1:]
+        self._coords = {dim: values[dim].values for dim in self._dims}
+        self._steps = values.indexes[_STEP]
+        # The indices of the steps of the last `timestamps`, which are the same for all the sites.
+        self._last_steps: tuple[tuple[Timestamp, ...], np.ndarray] | None = None
+
+        _log.info(
+            f"Extracted {len(pixels)} NWP pixels for {len(coordinates)} sites"
+            f" ({self._values.nbytes / 1e6:.1f} MB)"
+        )
+
+    def get(
+        self,
+        *,
+        now: Timestamp,
+        timestamps: list[Timestamp] | Timestamp,
+        min_lat: float | None = None,
+        max_lat: float | None = None,
+        min_lon: float | None = None,
+        max_lon: float | None = None,
+        nearest_lat: float | None = None,
+        nearest_lon: float | None = None,
+        tolerance: str | None = None,
+        load: bool = True,
+    ) -> xr.DataArray | None:
+        """Same as `NwpDataSource.get`."""
+        kwargs: NwpGetArguments = dict(
+            now=now,
+            timestamps=timestamps,
+            min_lat=min_lat,
+            max_lat=max_lat,
+            min_lon=min_lon,
+            max_lon=max_lon,
+            nearest_lat=nearest_lat,
+            nearest_lon=nearest_lon,
+            tolerance=tolerance,
+            load=load,
+        )
+        if (
+            now != self._now
+            or tolerance != nwp_tolerance(self._source)
+            or min_lat is not None
+            or nearest_lat is None
+            or nearest_lon is None
+        ):
+            return self._source.get(**kwargs)
+
+        if isinstance(timestamps, Timestamp):
+            timestamps = [timestamps]
+        for t in timestamps:
+            if t < now:
+                raise ValueError(f'Timestamp "{t}" should be after now={now}')
+
+        if self._values is None:
+            return None
+
+        pixel = self._pixel_of_coordinates.get((nearest_lat, nearest_lon))
+        if pixel is None:
+            x_indices, y_indices = nearest_pixel_indices(self._source, [(nearest_lat, nearest_lon)])
+            pixel = self._pixels.get((int(x_indices[0]), int(y_indices[0])))
+            if pixel is None:
+                return self._source.get(**kwargs)
+
+        values = self._values[pixel]
+        coords = dict(self._coords)
+        if nwp_filters_on_step(self._source):
+            steps = self._step_indices(tuple(timestamps))
+            values = values[..., steps]
+            coords[_STEP] = coords[_STEP][steps]
+        return xr.DataArray(values, dims=self._dims, coords=coords, name=_VALUE)
+
+    def _step_indices(self, timestamps: tuple[Timestamp, ...]) -> np.ndarray:
+        """Indices of the nearest steps to `timestamps`."""
+        # Predictions can run in threads, so we only read `self._last_steps` once.
+        last_steps = self._last_steps
+        if last_steps is None or last_steps[0] != timestamps:
+            deltas = pd.to_timedelta([t - self._init_time for t in timestamps])
+            last_steps = (timestamps, self._steps.get_indexer(deltas, method="nearest"))
+            self._last_steps = last_steps
+        return last_steps[1]
+
+    def __getattr__(self, name: str) -> Any:
+        # Everything else, e.g. `list_variables` or `_tolerance`, comes from the wrapped source.
+        if name == "_source":
+            raise AttributeError(name)
+        return getattr(self._source, name)
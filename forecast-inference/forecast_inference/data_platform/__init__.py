@@ -3,6 +3,7 @@
 - `data_platform.client` — shared gRPC client + location listing.
 - `data_platform.load` — reading generation/location data from the Data Platform.
 - `data_platform.save` — saving forecasts to the Data Platform.
+- `data_platform.outbox` — durable on-disk outbox of forecasts to save to the Data Platform.
 """
 
 from forecast_inference.data_platform.client import (
@@ -11,12 +12,32 @@ from forecast_inference.data_platform.client import (
     fetch_dp_location_map,
     get_dataplatform_client,
 )
-from forecast_inference.data_platform.save import save_forecast_to_dataplatform
+from forecast_inference.data_platform.outbox import (
+    Outbox,
+    OutboxDrainStats,
+    OutboxMetrics,
+    drain_outbox,
+    enqueue_forecast,
+    report_outbox_metrics,
+)
+from forecast_inference.data_platform.save import (
+    create_missing_locations,
+    get_forecaster,
+    save_forecast_to_dataplatform,
+)
 
 __all__ = [
     "DataPlatformClient",
     "LocationSummary",
+    "Outbox",
+    "OutboxDrainStats",
+    "OutboxMetrics",
+    "create_missing_locations",
+    "drain_outbox",
+    "enqueue_forecast",
     "fetch_dp_location_map",
     "get_dataplatform_client",
+    "get_forecaster",
+    "report_outbox_metrics",
     "save_forecast_to_dataplatform",
 ]
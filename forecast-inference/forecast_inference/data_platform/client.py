@@ -6,12 +6,19 @@ Used by both `data_platform.load` (reading generation/location data) and
 
 from __future__ import annotations
 
+import asyncio
 import contextlib
+import itertools
+import logging
 import os
 import re
+import time
 from collections.abc import AsyncIterator
+from typing import Any, cast
 
 from grpclib.client import Channel
+from grpclib.const import Status
+from grpclib.exceptions import GRPCError, ProtocolError, StreamTerminatedError
 from ocf import dp
 
 # Type alias for the Data Platform client stub
@@ -20,23 +27,206 @@ DataPlatformClient = dp.DataPlatformDataServiceStub
 # Type returned per location from list_locations — includes uuid and capacity.
 LocationSummary = dp.ListLocationsResponseLocationSummary
 
+log = logging.getLogger(__name__)
+
+# Strategies for picking which pooled channel serves the next RPC.
+ROUND_ROBIN = "round_robin"
+LEAST_LOADED = "least_loaded"
+
+# Errors after which we consider the underlying HTTP/2 connection broken.
+_TRANSPORT_ERRORS = (ConnectionError, OSError, StreamTerminatedError, ProtocolError)
+
 
 def _sanitize(name: str) -> str:
     """Sanitize location name to contain only DP-supported characters."""
     return re.sub(r"[^a-z0-9_|]", "_", name.lower())
 
 
+class _PooledChannel:
+    """One channel of a `DataPlatformClientPool`, with its stub and load/health state."""
+
+    def __init__(self, host: str, port: int):
+        self._host = host
+        self._port = port
+        self.in_flight = 0
+        # Unhealthy channels are skipped until this (monotonic) time.
+        self.unhealthy_until = 0.0
+        # Whether the channel must connect before it is given RPCs again, after a failure.
+        self.needs_probe = False
+        self._open()
+
+    def _open(self) -> None:
+        # grpclib connects lazily, so this is cheap: the connection is made on the first RPC.
+        self.channel = Channel(host=self._host, port=self._port)
+        self.stub = dp.DataPlatformDataServiceStub(self.channel)
+
+    @property
+    def healthy(self) -> bool:
+        """Whether the channel can be picked for new RPCs."""
+        return time.monotonic() >= self.unhealthy_until
+
+    def reconnect(self, failed_channel: Channel, backoff_seconds: float) -> bool:
+        """Replace `failed_channel` with a fresh channel, unless that was already done.
+
+        The RPCs in flight on a channel share its connection, and fail together when it breaks,
+        so only the first of them reconnects it. Returns whether it did.
+        """
+        if self.channel is not failed_channel:
+            return False
+        self.channel.close()
+        self._open()
+        self.unhealthy_until = time.monotonic() + backoff_seconds
+        self.needs_probe = True
+        return True
+
+    def close(self) -> None:
+        """Close the underlying channel."""
+        self.channel.close()
+
+
+class DataPlatformClientPool:
+    """Spread Data Platform RPCs over several gRPC channels.
+
+    A single grpclib `Channel` is one HTTP/2 connection, so its max-concurrent-streams limit
+    caps throughput once saves and reads run concurrently. The pool exposes the same (unary)
+    RPC methods as `DataPlatformDataServiceStub` and dispatches each call to one of its
+    channels, picked either round-robin or as the one with the fewest in-flight RPCs.
+
+    A channel whose RPC fails with a transport-level error is reconnected and skipped for
+    `reconnect_backoff_seconds`. After that, it must connect within `probe_timeout_seconds`
+    before it is given RPCs again, otherwise it is reconnected and skipped again.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        num_channels: int,
+        selection: str = LEAST_LOADED,
+        reconnect_backoff_seconds: float = 5.0,
+        probe_timeout_seconds: float = 5.0,
+    ):
+        """Constructor"""
+        if num_channels < 1:
+            raise ValueError(f"num_channels must be at least 1, got {num_channels}")
+        if selection not in (ROUND_ROBIN, LEAST_LOADED):
+            raise ValueError(f"Unknown channel selection strategy {selection!r}")
+
+        self._selection = selection
+        self._reconnect_backoff_seconds = reconnect_backoff_seconds
+        self._probe_timeout_seconds = probe_timeout_seconds
+        self._channels = [_PooledChannel(host, port) for _ in range(num_channels)]
+        self._round_robin = itertools.cycle(range(num_channels))
+
+    def __len__(self) -> int:
+        """Number of channels in the pool."""
+        return len(self._channels)
+
+    def _select(self) -> _PooledChannel:
+        """Pick the channel for the next RPC, preferring healthy ones."""
+        candidates = [c for c in self._channels if c.healthy]
+        # When every channel is marked unhealthy we try them anyway rather than failing here.
+        if not candidates:
+            candidates = self._channels
+
+        if self._selection == LEAST_LOADED:
+            return min(candidates, key=lambda c: c.in_flight)
+
+        for _ in range(len(self._channels)):
+            channel = self._channels[next(self._round_robin)]
+            if channel in candidates:
+                return channel
+        return candidates[0]
+
+    async def _probe(self, pooled: _PooledChannel) -> bool:
+        """Connect a reconnected channel, reconnecting it again if that fails.
+
+        Returns whether it is connected.
+        """
+        channel = pooled.channel
+        try:
+            await asyncio.wait_for(channel.__connect__(), self._probe_timeout_seconds)
+        except (asyncio.TimeoutError, *_TRANSPORT_ERRORS) as e:
+            self._mark_unhealthy(pooled, channel, e)
+            return False
+        if pooled.channel is channel:
+            pooled.needs_probe = False
+        return True
+
+    async def _acquire(self) -> _PooledChannel:
+        """Pick the channel for the next RPC, probing it first if it failed before."""
+        for _ in range(len(self._channels)):
+            pooled = self._select()
+            if not pooled.needs_probe or await self._probe(pooled):
+                return pooled
+        # Every channel we tried failed its probe: let the RPC fail on its own.
+        return self._select()
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_") or not callable(
+            getattr(dp.DataPlatformDataServiceStub, name, None)
+        ):
+            raise AttributeError(name)
+
+        async def _call(*args, **kwargs):
+            pooled = await self._acquire()
+            # The channel may be replaced while we wait for the RPC.
+            channel, stub = pooled.channel, pooled.stub
+            pooled.in_flight += 1
+            try:
+                return await getattr(stub, name)(*args, **kwargs)
+            except GRPCError as e:
+                if e.status == Status.UNAVAILABLE:
+                    self._mark_unhealthy(pooled, channel, e)
+                raise
+            except _TRANSPORT_ERRORS as e:
+                self._mark_unhealthy(pooled, channel, e)
+                raise
+            finally:
+                pooled.in_flight -= 1
+
+        return _call
+
+    def _mark_unhealthy(self, pooled: _PooledChannel, channel: Channel, error: Exception) -> None:
+        if pooled.reconnect(channel, self._reconnect_backoff_seconds):
+            log.warning(f"Data Platform channel failed ({error!r}), reconnected it")
+
+    def close(self) -> None:
+        """Close all the channels of the pool."""
+        for pooled in self._channels:
+            pooled.close()
+
+
 @contextlib.asynccontextmanager
 async def get_dataplatform_client() -> AsyncIterator[DataPlatformClient]:
-    """Async context manager that opens a gRPC channel and yields a ready-to-use client.
+    """Async context manager that opens gRPC channel(s) and yields a ready-to-use client.
 
     Host and port are read from DATA_PLATFORM_HOST / DATA_PLATFORM_PORT env vars
     (defaulting to localhost:50051).
+
+    When DATA_PLATFORM_NUM_CHANNELS is greater than 1, the client is a
+    `DataPlatformClientPool` spreading RPCs over that many channels, picked according to
+    DATA_PLATFORM_CHANNEL_SELECTION ("least_loaded" or "round_robin"). It has the same
+    interface as the plain stub.
     """
-    channel = Channel(
-        host=os.getenv("DATA_PLATFORM_HOST", "localhost"),
-        port=int(os.getenv("DATA_PLATFORM_PORT", "50051")),
-    )
+    host = os.getenv("DATA_PLATFORM_HOST", "localhost")
+    port = int(os.getenv("DATA_PLATFORM_PORT", "50051"))
+    num_channels = int(os.getenv("DATA_PLATFORM_NUM_CHANNELS", "1"))
+
+    if num_channels > 1:
+        pool = DataPlatformClientPool(
+            host=host,
+            port=port,
+            num_channels=num_channels,
+            selection=os.getenv("DATA_PLATFORM_CHANNEL_SELECTION", LEAST_LOADED),
+        )
+        try:
+            yield cast(DataPlatformClient, pool)
+        finally:
+            pool.close()
+        return
+
+    channel = Channel(host=host, port=port)
     try:
         yield dp.DataPlatformDataServiceStub(channel)
     finally:
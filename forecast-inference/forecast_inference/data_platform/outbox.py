@@ -0,0 +1,605 @@
+"""Durable on-disk outbox for the forecasts saved to the Data Platform.
+
+Instead of sending its forecasts, the app can append them to an outbox as
+`CreateForecastRequest`s, which takes no RPC at all. `drain_outbox` sends them later, in
+batches, concurrently and with retries, so a slow or unavailable Data Platform doesn't slow
+down the forecast run nor lose its forecasts.
+
+Layout of the outbox directory:
+
+- `<seq>.open`: segment being written. Its writer holds an exclusive `flock` on it.
+- `<seq>.seg`: sealed segment, ready to be drained. Segments are append-only and are deleted
+  once drained.
+- `cursor.json`: how far the segment being drained has been sent.
+- `dead_letter/`: another outbox, with the requests that the Data Platform rejected.
+
+A segment is a sequence of frames: a big-endian (length, crc32) header followed by the
+serialized request. A writer that dies leaves its `.open` segment behind, possibly ending with a
+torn frame: the next drain seals it and ignores the torn frame.
+
+The requests are stored before knowing anything about the Data Platform: their location is
+given by the site's name and capacity in their metadata, and their fractions are relative to
+that capacity and not clipped. The drain resolves (or creates) the location and rescales the
+fractions to its capacity before sending.
+
+Delivery is at least once: when a drain is interrupted, its last batch is sent again.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import dataclasses
+import fcntl
+import itertools
+import json
+import logging
+import os
+import pathlib
+import struct
+import time
+import zlib
+from collections.abc import Iterator
+from datetime import datetime
+from typing import BinaryIO
+
+import numpy as np
+import sentry_sdk
+import sentry_sdk.metrics
+from betterproto.lib.google.protobuf import Struct, Value
+from grpclib.const import Status
+from grpclib.exceptions import GRPCError
+from ocf import dp
+
+from forecast_inference.data_platform.client import (
+    _TRANSPORT_ERRORS,
+    DataPlatformClient,
+    LocationSummary,
+    _sanitize,
+    fetch_dp_location_map,
+)
+from forecast_inference.data_platform.save import (
+    _to_utc,
+    compute_forecast_arrays,
+    create_missing_locations,
+    dp_forecaster_version,
+    get_forecaster,
+    get_forecaster_name,
+)
+from forecast_inference.forecast_batch import ForecastBatch
+from forecast_inference.utils.concurrency import BoundedTaskGroup
+
+log = logging.getLogger(__name__)
+
+_OPEN = ".open"
+_SEALED = ".seg"
+_CURSOR = "cursor.json"
+_DIRECTORY_LOCK = "outbox.lock"
+_DRAIN_LOCK = "drain.lock"
+_DEAD_LETTER = "dead_letter"
+
+# (payload length, payload crc32)
+_HEADER = struct.Struct(">II")
+
+# Errors worth retrying: the request might go through later.
+_RETRYABLE_STATUSES = {
+    Status.UNAVAILABLE,
+    Status.DEADLINE_EXCEEDED,
+    Status.RESOURCE_EXHAUSTED,
+    Status.ABORTED,
+    Status.INTERNAL,
+    Status.UNKNOWN,
+}
+
+# Units of the metrics that aren't counts.
+_METRIC_UNITS = {"pending_bytes": "byte", "seconds": "second"}
+
+# Metadata keys describing the site of a stored request, removed before sending it.
+_SITE_NAME = "client_location_name"
+_SITE_CAPACITY_WATTS = "capacity_watts"
+_SITE_LATITUDE = "latitude"
+_SITE_LONGITUDE = "longitude"
+
+
+@dataclasses.dataclass
+class OutboxMetrics:
+    """Depth of an outbox."""
+
+    pending_requests: int
+    pending_bytes: int
+    pending_segments: int
+
+
+@dataclasses.dataclass
+class OutboxDrainStats:
+    """What a call to `drain_outbox` did."""
+
+    sent: int = 0
+    requeued: int = 0
+    dead_lettered: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+
+    @property
+    def drain_rate(self) -> float:
+        """Requests sent per second."""
+        return self.sent / self.seconds if self.seconds > 0 else 0.0
+
+
+def _iter_frames(f: BinaryIO) -> Iterator[tuple[bytes, int]]:
+    """Yield the (payload, offset after the frame) of the frames of a segment.
+
+    Stops at the first torn or corrupted frame.
+    """
+    while True:
+        header = f.read(_HEADER.size)
+        if not header:
+            return
+        if len(header) == _HEADER.size:
+            length, crc = _HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) == length and zlib.crc32(payload) == crc:
+                yield payload, f.tell()
+                continue
+        log.warning(f"Ignoring torn or corrupted frame at the end of {f.name}")
+        return
+
+
+class Outbox:
+    """Append-only, on-disk queue of `CreateForecastRequest`s.
+
+    Each `Outbox` instance writes to its own segment, so different processes can append to the
+    same outbox at the same time.
+    """
+
+    def __init__(
+        self,
+        directory: str | pathlib.Path,
+        max_segment_bytes: int = 64 * 1024**2,
+        fsync: bool = True,
+    ):
+        """Constructor.
+
+        Arguments:
+        ---------
+        directory: Directory of the outbox, created if needed.
+        max_segment_bytes: Size after which we start a new segment.
+        fsync: Sync the segment to disk when sealing it, and in `sync`.
+        """
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._max_segment_bytes = max_segment_bytes
+        self._fsync = fsync
+
+        self._segment: BinaryIO | None = None
+        self._segment_path: pathlib.Path | None = None
+        self._segment_size = 0
+
+    def __enter__(self) -> Outbox:
+        """Enter the context, closing the outbox when leaving it."""
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Close the outbox."""
+        self.close()
+
+    @contextlib.contextmanager
+    def _lock(self, name: str, blocking: bool = True) -> Iterator[bool]:
+        """Hold the `flock` on one of the outbox's lock files, yield whether we got it."""
+        with (self.directory / name).open("a") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _open_segment(self) -> None:
+        # Under the directory lock so that concurrent writers get different sequence numbers,
+        # and so that a drain never sees a segment that is not locked by its writer yet.
+        with self._lock(_DIRECTORY_LOCK):
+            seqs = [int(p.stem) for p in self.directory.iterdir() if p.suffix in (_OPEN, _SEALED)]
+            path = self.directory / f"{max(seqs, default=0) + 1:012d}{_OPEN}"
+            segment = path.open("xb")
+            fcntl.flock(segment, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+        self._segment = segment
+        self._segment_path = path
+        self._segment_size = 0
+
+    def _seal(self) -> None:
+        if self._segment is None:
+            return
+        assert self._segment_path is not None
+        self.sync()
+        # Rename while still holding the lock, so the segment is never seen as abandoned.
+        self._segment_path.rename(self._segment_path.with_suffix(_SEALED))
+        self._segment.close()
+        self._segment = None
+        self._segment_path = None
+
+    def append(self, requests: list[dp.CreateForecastRequest]) -> None:
+        """Append requests to the outbox.
+
+        They survive the process dying right away, but only a power loss once synced: syncing
+        each append would cost a disk flush per forecast, so we sync once per segment instead,
+        or when calling `sync`.
+        """
+        self._append_payloads([bytes(request) for request in requests])
+
+    def sync(self) -> None:
+        """Sync what was appended so far to disk."""
+        if self._segment is not None and self._fsync:
+            os.fsync(self._segment.fileno())
+
+    def _append_payloads(self, payloads: list[bytes]) -> None:
+        if not payloads:
+            return
+
+        if self._segment is not None and self._segment_size >= self._max_segment_bytes:
+            self._seal()
+        if self._segment is None:
+            self._open_segment()
+        assert self._segment is not None
+
+        data = bytearray()
+        for payload in payloads:
+            data += _HEADER.pack(len(payload), zlib.crc32(payload))
+            data += payload
+
+        self._segment.write(data)
+        self._segment.flush()
+        self._segment_size += len(data)
+
+    def close(self) -> None:
+        """Seal our segment, making its requests available to `drain_outbox`."""
+        self._seal()
+
+    def recover_abandoned_segments(self) -> int:
+        """Seal the segments whose writer died without closing them.
+
+        Return:
+        ------
+            The number of recovered segments.
+        """
+        num_recovered = 0
+        with self._lock(_DIRECTORY_LOCK):
+            for path in sorted(self.directory.glob(f"*{_OPEN}")):
+                with path.open("rb") as f:
+                    try:
+                        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        # Still being written.
+                        continue
+                    log.warning(f"Recovering abandoned outbox segment {path}")
+                    path.rename(path.with_suffix(_SEALED))
+                    num_recovered += 1
+        return num_recovered
+
+    def sealed_segments(self) -> list[pathlib.Path]:
+        """Sealed segments, oldest first."""
+        return sorted(self.directory.glob(f"*{_SEALED}"))
+
+    def _read_cursor(self) -> tuple[int, int] | None:
+        try:
+            cursor = json.loads((self.directory / _CURSOR).read_text())
+        except FileNotFoundError:
+            return None
+        return cursor["segment"], cursor["offset"]
+
+    def _write_cursor(self, segment: int, offset: int) -> None:
+        tmp_path = self.directory / f"{_CURSOR}.tmp"
+        tmp_path.write_text(json.dumps({"segment": segment, "offset": offset}))
+        os.replace(tmp_path, self.directory / _CURSOR)
+
+    def _clear_cursor(self) -> None:
+        (self.directory / _CURSOR).unlink(missing_ok=True)
+
+    def metrics(self) -> OutboxMetrics:
+        """Count the requests that are waiting in the outbox."""
+        cursor = self._read_cursor()
+        paths = sorted(
+            p for p in self.directory.iterdir() if p.suffix in (_OPEN, _SEALED) and p.is_file()
+        )
+        num_requests = 0
+        num_bytes = 0
+        for path in paths:
+            with path.open("rb") as f:
+                if cursor is not None and cursor[0] == int(path.stem):
+                    f.seek(cursor[1])
+                start = f.tell()
+                end = start
+                for _, end in _iter_frames(f):
+                    num_requests += 1
+                num_bytes += end - start
+        return OutboxMetrics(
+            pending_requests=num_requests,
+            pending_bytes=num_bytes,
+            pending_segments=len(paths),
+        )
+
+
+def enqueue_forecast(
+    outbox: Outbox,
+    rows: list[dict] | ForecastBatch,
+    client_location_name: str,
+    model_tag: str,
+    init_time_utc: datetime,
+    capacity_kw: float,
+    latitude: float,
+    longitude: float,
+) -> None:
+    """Append a forecast to the outbox, see `save_forecast_to_dataplatform` for the arguments.
+
+    This doesn't talk to the Data Platform: the location is resolved when draining.
+    """
+    if not rows:
+        log.warning("forecast rows list is empty")
+        return
+
+    if not client_location_name:
+        raise ValueError("client_location_name is required to save to the Data Platform")
+
+    capacity_watts = int(capacity_kw * 1000)
+    if capacity_watts == 0:
+        log.error(f"location {client_location_name!r} has 0 W capacity, skipping save")
+        return
+
+    init_time_utc = _to_utc(init_time_utc, floor="15min")
+    horizons, p50_fractions = compute_forecast_arrays(
+        rows, init_time_utc, capacity_watts, clip=False
+    )
+
+    request = dp.CreateForecastRequest(
+        forecaster=dp.Forecaster(
+            forecaster_name=get_forecaster_name(model_tag),
+            forecaster_version=dp_forecaster_version,
+        ),
+        energy_source=dp.EnergySource.SOLAR,
+        init_time_utc=init_time_utc,
+        values=[
+            dp.CreateForecastRequestForecastValue(horizon_mins=horizon, p50_fraction=fraction)
+            for horizon, fraction in zip(horizons.tolist(), p50_fractions.tolist())
+        ],
+        metadata=Struct(
+            fields={
+                "app_version": Value(string_value=dp_forecaster_version),
+                _SITE_NAME: Value(string_value=client_location_name),
+                _SITE_CAPACITY_WATTS: Value(number_value=capacity_watts),
+                _SITE_LATITUDE: Value(number_value=latitude),
+                _SITE_LONGITUDE: Value(number_value=longitude),
+            }
+        ),
+    )
+    outbox.append([request])
+
+
+def _is_retryable(error: BaseException) -> bool:
+    if isinstance(error, GRPCError):
+        return error.status in _RETRYABLE_STATUSES
+    return isinstance(error, (*_TRANSPORT_ERRORS, asyncio.TimeoutError))
+
+
+def _site_of(request: dp.CreateForecastRequest) -> dict:
+    fields = request.metadata.fields
+    return {
+        "client_location_name": fields[_SITE_NAME].string_value,
+        "capacity_kw": fields[_SITE_CAPACITY_WATTS].number_value / 1000,
+        "latitude": fields[_SITE_LATITUDE].number_value,
+        "longitude": fields[_SITE_LONGITUDE].number_value,
+    }
+
+
+def _finalize_request(request: dp.CreateForecastRequest, summary: LocationSummary) -> None:
+    """Point a stored request at its Data Platform location, in place."""
+    site_capacity_watts = request.metadata.fields[_SITE_CAPACITY_WATTS].number_value
+    fractions = np.array([v.p50_fraction for v in request.values]) * site_capacity_watts
+    fractions = np.clip(fractions / summary.effective_capacity_watts, 0.0, 1.0)
+
+    request.location_uuid = summary.location_uuid
+    request.values = [
+        dp.CreateForecastRequestForecastValue(horizon_mins=v.horizon_mins, p50_fraction=fraction)
+        for v, fraction in zip(request.values, fractions.tolist())
+    ]
+    request.metadata = Struct(
+        fields={"app_version": request.metadata.fields["app_version"]},
+    )
+
+
+async def _send_with_retries(
+    client: DataPlatformClient,
+    request: dp.CreateForecastRequest,
+    max_attempts: int,
+    backoff_seconds: float,
+    stats: OutboxDrainStats,
+) -> None:
+    for attempt in range(max_attempts):
+        try:
+            request.forecaster = await get_forecaster(
+                client, request.forecaster.forecaster_name
+            )
+            await client.create_forecast(request)
+            return
+        except Exception as e:
+            if not _is_retryable(e) or attempt + 1 == max_attempts:
+                raise
+            stats.retries += 1
+            await asyncio.sleep(backoff_seconds * 2**attempt)
+
+
+async def _drain_batch(
+    client: DataPlatformClient,
+    payloads: list[bytes],
+    location_map: dict[str, LocationSummary],
+    requeue: Outbox,
+    dead_letter: Outbox,
+    stats: OutboxDrainStats,
+    max_concurrency: int,
+    max_attempts: int,
+    backoff_seconds: float,
+) -> int:
+    """Send one batch of stored requests.
+
+    Return:
+    ------
+        The number of requests that were sent.
+    """
+    requests = [dp.CreateForecastRequest().parse(payload) for payload in payloads]
+    sites = [_site_of(request) for request in requests]
+    location_errors = await create_missing_locations(
+        client,
+        sites,
+        location_map,
+        init_time_utc=min(request.init_time_utc for request in requests),
+        max_concurrency=max_concurrency,
+    )
+
+    to_requeue: list[bytes] = []
+    to_dead_letter: list[bytes] = []
+
+    sends: BoundedTaskGroup[int] = BoundedTaskGroup(max_concurrency)
+    for i, (payload, request, site) in enumerate(zip(payloads, requests, sites)):
+        name = _sanitize(site["client_location_name"])
+        if name in location_errors:
+            to_requeue.append(payload)
+            continue
+
+        summary = location_map[name]
+        if summary.effective_capacity_watts == 0:
+            log.error(f"DP location {name!r} has 0 W capacity, dead-lettering its forecast")
+            to_dead_letter.append(payload)
+            continue
+
+        _finalize_request(request, summary)
+        await sends.submit(
+            i, _send_with_retries(client, request, max_attempts, backoff_seconds, stats)
+        )
+
+    num_sent = 0
+    for i, result in (await sends.wait()).items():
+        if not isinstance(result, BaseException):
+            num_sent += 1
+        elif _is_retryable(result):
+            log.warning(f"Could not send forecast, requeuing it: {result}")
+            to_requeue.append(payloads[i])
+        else:
+            log.error("Data Platform rejected forecast, dead-lettering it", exc_info=result)
+            to_dead_letter.append(payloads[i])
+
+    # Persist what we keep before the caller moves the cursor past this batch.
+    requeue._append_payloads(to_requeue)
+    dead_letter._append_payloads(to_dead_letter)
+    requeue.sync()
+    dead_letter.sync()
+
+    stats.sent += num_sent
+    stats.requeued += len(to_requeue)
+    stats.dead_lettered += len(to_dead_letter)
+    return num_sent
+
+
+async def drain_outbox(
+    outbox: Outbox,
+    client: DataPlatformClient,
+    batch_size: int = 100,
+    max_concurrency: int = 10,
+    max_attempts: int = 5,
+    backoff_seconds: float = 1.0,
+) -> OutboxDrainStats:
+    """Send the requests of the sealed segments of an outbox to the Data Platform.
+
+    Requests that still fail with a transient error after `max_attempts` are appended to a new
+    segment, for the next drain. Requests rejected by the Data Platform go to the dead-letter
+    outbox. We stop early when none of the requests of a batch could be sent, as the Data
+    Platform is then most likely unavailable.
+
+    Only one drain runs at a time per outbox: concurrent calls return without doing anything.
+
+    Arguments:
+    ---------
+    outbox: The outbox to drain.
+    client: Data Platform client.
+    batch_size: Number of requests read at a time. The cursor is saved after each batch.
+    max_concurrency: Maximum number of requests being sent at the same time.
+    max_attempts: Number of attempts for each request.
+    backoff_seconds: Wait before the first retry, doubled for each subsequent retry.
+    """
+    stats = OutboxDrainStats()
+    t0 = time.perf_counter()
+
+    with outbox._lock(_DRAIN_LOCK, blocking=False) as locked:
+        if not locked:
+            log.warning(f"Outbox {outbox.directory} is already being drained")
+            return stats
+
+        outbox.recover_abandoned_segments()
+        segments = outbox.sealed_segments()
+        if not segments:
+            return stats
+
+        # Finish the segment that an interrupted drain left off first. It's not necessarily the
+        # oldest one, as segments are sealed when their writer is done with them.
+        cursor = outbox._read_cursor()
+        if cursor is not None:
+            cursor_segment = cursor[0]
+            segments.sort(key=lambda path: int(path.stem) != cursor_segment)
+
+        location_map = await fetch_dp_location_map(client)
+
+        with (
+            Outbox(outbox.directory) as requeue,
+            Outbox(outbox.directory / _DEAD_LETTER) as dead_letter,
+        ):
+            for path in segments:
+                seq = int(path.stem)
+                with path.open("rb") as f:
+                    if cursor is not None and cursor[0] == seq:
+                        f.seek(cursor[1])
+                    frames = _iter_frames(f)
+                    while batch := list(itertools.islice(frames, batch_size)):
+                        num_requeued = stats.requeued
+                        num_sent = await _drain_batch(
+                            client,
+                            [payload for payload, _ in batch],
+                            location_map,
+                            requeue=requeue,
+                            dead_letter=dead_letter,
+                            stats=stats,
+                            max_concurrency=max_concurrency,
+                            max_attempts=max_attempts,
+                            backoff_seconds=backoff_seconds,
+                        )
+                        outbox._write_cursor(seq, batch[-1][1])
+                        if num_sent == 0 and stats.requeued > num_requeued:
+                            log.warning("Nothing could be sent, stopping the drain")
+                            stats.seconds = time.perf_counter() - t0
+                            return stats
+
+                # Clear the cursor first: if we crash in between, the segment is sent again
+                # rather than its cursor being applied to another segment.
+                outbox._clear_cursor()
+                path.unlink()
+
+    stats.seconds = time.perf_counter() - t0
+    return stats
+
+
+def report_outbox_metrics(outbox: Outbox, stats: OutboxDrainStats | None = None) -> None:
+    """Report the depth (and drain rate) of an outbox.
+
+    They are exported as Sentry metrics named "dp_outbox.<name>", logged, and attached to Sentry
+    events.
+    """
+    metrics = dataclasses.asdict(outbox.metrics())
+    if stats is not None:
+        metrics |= dataclasses.asdict(stats) | {"drain_rate": stats.drain_rate}
+
+    for key, value in metrics.items():
+        sentry_sdk.metrics.gauge(f"dp_outbox.{key}", value, unit=_METRIC_UNITS.get(key, "none"))
+    log.info(
+        "DP outbox metrics | " + "  ".join(f"{key}={value:.6g}" for key, value in metrics.items())
+    )
+    sentry_sdk.set_context("dp_outbox", metrics)
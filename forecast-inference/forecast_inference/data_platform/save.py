@@ -4,8 +4,10 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import weakref
 from datetime import datetime, timedelta
 
+import numpy as np
 import pandas as pd
 from betterproto.lib.google.protobuf import Struct, Value
 from ocf import dp
@@ -16,12 +18,33 @@ from forecast_inference.data_platform.client import (
     _sanitize,
     fetch_dp_location_map,
 )
+from forecast_inference.forecast_batch import ForecastBatch
+from forecast_inference.utils.concurrency import BoundedTaskGroup
 
 log = logging.getLogger(__name__)
 
 # Keep this static so the adjuster and API keep working even if the app version changes.
 dp_forecaster_version = "1.4.0"
 
+# Forecaster resolutions, per client and (model tag, forecaster version), shared by all the saves
+# of a run. We keep the tasks rather than their results so that concurrent saves wait for the same
+# resolution instead of racing to create the forecaster.
+_forecaster_tasks: weakref.WeakKeyDictionary[
+    DataPlatformClient, dict[tuple[str, str], asyncio.Task[dp.Forecaster]]
+] = weakref.WeakKeyDictionary()
+
+
+def _to_utc(timestamp: datetime, floor: str | None = None) -> datetime:
+    """Make a timezone-aware UTC datetime, naive datetimes being UTC already."""
+    ts = pd.Timestamp(timestamp)
+    if ts.tz is None:
+        ts = ts.tz_localize("UTC")
+    else:
+        ts = ts.tz_convert("UTC")
+    if floor is not None:
+        ts = ts.floor(floor)
+    return ts.to_pydatetime()
+
 
 async def resolve_target_uuid(
     client: DataPlatformClient,
@@ -90,12 +113,85 @@ async def create_new_location(
         ) from create_error
 
 
+async def create_missing_locations(
+    client: DataPlatformClient,
+    sites: list[dict],
+    location_map: dict[str, LocationSummary],
+    init_time_utc: datetime,
+    max_concurrency: int = 10,
+) -> dict[str, BaseException]:
+    """Create, concurrently, the sites that are missing from the Data Platform.
+
+    The created locations are added to *location_map* so that saving their forecasts doesn't
+    need to create them inline.
+
+    Args:
+        client: Data Platform client.
+        sites: Dicts with keys client_location_name, capacity_kw, latitude and longitude.
+        location_map: Pre-fetched name → LocationSummary map, updated in place.
+        init_time_utc: Forecast initialisation time, floored to 15 minutes like in
+            `save_forecast_to_dataplatform`, see `create_new_location`.
+        max_concurrency: Maximum number of locations being created at the same time.
+
+    Returns a name → exception map of the locations that could not be created.
+    """
+    missing: dict[str, dict] = {}
+    for site in sites:
+        name = _sanitize(site["client_location_name"])
+        if name not in location_map:
+            # Sites can share a sanitized name: create it only once.
+            missing.setdefault(name, site)
+
+    if not missing:
+        return {}
+
+    log.info(f"Creating {len(missing)} missing DP location(s)")
+    init_time_utc = _to_utc(init_time_utc, floor="15min")
+
+    creations: BoundedTaskGroup[str] = BoundedTaskGroup(max_concurrency)
+    for name, site in missing.items():
+        await creations.submit(
+            name,
+            create_new_location(
+                client,
+                name,
+                site["capacity_kw"],
+                site["latitude"],
+                site["longitude"],
+                init_time_utc,
+            ),
+        )
+    results = await creations.wait()
+
+    errors: dict[str, BaseException] = {}
+    for name, result in results.items():
+        if isinstance(result, BaseException):
+            errors[name] = result
+            continue
+        site = missing[name]
+        location_map[name] = LocationSummary(
+            location_name=name,
+            location_uuid=result,
+            effective_capacity_watts=int(site["capacity_kw"] * 1000),
+            latlng=dp.LatLng(latitude=site["latitude"], longitude=site["longitude"]),
+            location_type=dp.LocationType.SITE,
+            energy_source=dp.EnergySource.SOLAR,
+        )
+
+    return errors
+
+
+def get_forecaster_name(model_tag: str) -> str:
+    """Name of the Data Platform forecaster of `model_tag`."""
+    return model_tag.replace("-", "_").lower()
+
+
 async def create_forecaster_if_not_exists(
     client: DataPlatformClient,
     model_tag: str,
 ) -> dp.Forecaster:
     """Create the current forecaster if it does not exist."""
-    forecaster_name = model_tag.replace("-", "_").lower()
+    forecaster_name = get_forecaster_name(model_tag)
 
     list_forecasters_request = dp.ListForecastersRequest(
         forecaster_names_filter=[forecaster_name],
@@ -133,47 +229,140 @@ async def create_forecaster_if_not_exists(
         return create_forecaster_response.forecaster
 
 
+async def get_forecaster(client: DataPlatformClient, model_tag: str) -> dp.Forecaster:
+    """Get the current forecaster for `model_tag`, resolving it once per client.
+
+    The first call runs `create_forecaster_if_not_exists` and subsequent calls with the same
+    client reuse its result, unless it failed or `dp_forecaster_version` changed since.
+    """
+    tasks = _forecaster_tasks.setdefault(client, {})
+    key = (model_tag, dp_forecaster_version)
+    task = tasks.get(key)
+
+    if task is None or (task.done() and task.exception() is not None):
+        task = asyncio.ensure_future(create_forecaster_if_not_exists(client, model_tag))
+        tasks[key] = task
+
+    return await asyncio.shield(task)
+
+
+def _to_fractions(power_kw: np.ndarray, capacity_watts: int | np.ndarray, clip: bool) -> np.ndarray:
+    p50_fractions = power_kw * 1000 / capacity_watts
+    # The Data Platform needs numbers: save the powers that the model couldn't predict as 0.
+    missing = np.isnan(p50_fractions)
+    if missing.any():
+        log.warning(f"Saving {missing.sum()} NaN forecast value(s) as 0")
+        p50_fractions[missing] = 0.0
+    if clip:
+        p50_fractions = np.clip(p50_fractions, 0.0, 1.0)
+    return p50_fractions
+
+
+def compute_forecast_arrays(
+    rows: list[dict] | ForecastBatch,
+    init_time_utc: datetime,
+    capacity_watts: int | np.ndarray,
+    clip: bool = True,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Compute the horizons and p50 fractions of forecast rows, as arrays.
+
+    Args:
+        rows: List of dicts with keys start_utc, forecast_power_kw and optionally
+            horizon_minutes. Or a `ForecastBatch`, whose sites are flattened one after the
+            other.
+        init_time_utc: Forecast initialisation time. Horizons missing from the rows are derived
+            from their start_utc relative to this time, floored to 15 minutes.
+        capacity_watts: Capacity in watts used to calculate the power fraction. Either one value
+            for all the rows, or one value per row.
+        clip: Clip the fractions to [0, 1]. NaN powers are saved as 0 either way.
+
+    Returns a (horizon_mins, p50_fraction) tuple of int64 and float64 arrays.
+    """
+    if isinstance(rows, ForecastBatch):
+        horizons = np.tile(rows.horizon_start_minutes, rows.num_sites)
+        p50_fractions = _to_fractions(rows.powers_kw.ravel(), capacity_watts, clip)
+        return horizons.astype(np.int64), p50_fractions
+
+    power_kw = np.fromiter((row["forecast_power_kw"] for row in rows), float, len(rows))
+    p50_fractions = _to_fractions(power_kw, capacity_watts, clip)
+
+    horizons = np.fromiter(
+        (
+            np.nan if row.get("horizon_minutes") is None else row["horizon_minutes"]
+            for row in rows
+        ),
+        float,
+        len(rows),
+    )
+    missing = np.isnan(horizons)
+    if missing.any():
+        init_ts = _to_utc(init_time_utc, floor="15min")
+        # Naive timestamps are taken as UTC.
+        start_ts = pd.to_datetime(
+            [row["start_utc"] for row, is_missing in zip(rows, missing) if is_missing], utc=True
+        )
+        horizons[missing] = (start_ts - init_ts).total_seconds().to_numpy() / 60
+
+    # Truncate towards zero, like `int()`.
+    return horizons.astype(np.int64), p50_fractions
+
+
+def _to_forecast_values(
+    horizons: np.ndarray, p50_fractions: np.ndarray
+) -> list[dp.CreateForecastRequestForecastValue]:
+    return [
+        dp.CreateForecastRequestForecastValue(horizon_mins=horizon, p50_fraction=fraction)
+        for horizon, fraction in zip(horizons.tolist(), p50_fractions.tolist())
+    ]
+
+
 def prepare_forecast_values(
-    rows: list[dict],
+    rows: list[dict] | ForecastBatch,
     init_time_utc: datetime,
     capacity_watts: int,
 ) -> list[dp.CreateForecastRequestForecastValue]:
     """Convert forecast rows to a list of DP forecast value objects.
 
     Args:
-        rows: List of dicts with keys start_utc, end_utc, forecast_power_kw, horizon_minutes.
+        rows: List of dicts with keys start_utc, end_utc, forecast_power_kw, horizon_minutes,
+            or a single-site `ForecastBatch`.
         init_time_utc: Forecast initialisation time.
         capacity_watts: Site capacity in watts used to calculate the power fraction.
     """
-    init_ts = pd.Timestamp(init_time_utc)
-    if init_ts.tz is None:
-        init_ts = init_ts.tz_localize("UTC")
-    init_ts = init_ts.floor("15min")
-
-    forecast_values: list[dp.CreateForecastRequestForecastValue] = []
-    for row in rows:
-        if "horizon_minutes" in row and row["horizon_minutes"] is not None:
-            horizon_mins = int(row["horizon_minutes"])
-        else:
-            start_ts = pd.Timestamp(row["start_utc"])
-            if start_ts.tz is None:
-                start_ts = start_ts.tz_localize("UTC")
-            horizon_mins = int((start_ts - init_ts).total_seconds() / 60)
+    if not rows:
+        return []
+    return _to_forecast_values(*compute_forecast_arrays(rows, init_time_utc, capacity_watts))
 
-        p50_fraction = max(0.0, min(1.0, (row["forecast_power_kw"] * 1000) / capacity_watts))
 
-        forecast_values.append(
-            dp.CreateForecastRequestForecastValue(
-                horizon_mins=horizon_mins,
-                p50_fraction=p50_fraction,
-            ),
-        )
+def prepare_many_forecast_values(
+    forecasts: list[tuple[list[dict], int]],
+    init_time_utc: datetime,
+) -> list[list[dp.CreateForecastRequestForecastValue]]:
+    """Same as `prepare_forecast_values` for many forecasts at once.
+
+    Args:
+        forecasts: List of (rows, capacity_watts) tuples, one per forecast.
+        init_time_utc: Forecast initialisation time, shared by all the forecasts.
+
+    Returns the forecast values of each forecast, in the same order.
+    """
+    all_rows = [row for rows, _ in forecasts for row in rows]
+    if not all_rows:
+        return [[] for _ in forecasts]
+
+    lengths = [len(rows) for rows, _ in forecasts]
+    capacities = np.repeat([capacity for _, capacity in forecasts], lengths)
+    horizons, p50_fractions = compute_forecast_arrays(all_rows, init_time_utc, capacities)
 
-    return forecast_values
+    splits = np.cumsum(lengths)[:-1]
+    return [
+        _to_forecast_values(h, f)
+        for h, f in zip(np.split(horizons, splits), np.split(p50_fractions, splits))
+    ]
 
 
 async def save_forecast_to_dataplatform(
-    rows: list[dict],
+    rows: list[dict] | ForecastBatch,
     client_location_name: str,
     model_tag: str,
     init_time_utc: datetime,
@@ -182,8 +371,14 @@ async def save_forecast_to_dataplatform(
     latitude: float,
     longitude: float,
     location_map: dict[str, LocationSummary] | None = None,
+    forecaster: dp.Forecaster | None = None,
 ) -> None:
-    """Save forecast to the Data Platform."""
+    """Save forecast to the Data Platform.
+
+    When both the pre-fetched *location_map* and the run's *forecaster* (see `get_forecaster`)
+    are given, saving a site that already exists in the Data Platform is a single
+    create_forecast RPC.
+    """
     if not rows:
         log.warning("forecast rows list is empty")
         return
@@ -195,12 +390,7 @@ async def save_forecast_to_dataplatform(
     client_location_name = _sanitize(client_location_name)
     energy_source = dp.EnergySource.SOLAR  # UK PV only
 
-    init_ts = pd.Timestamp(init_time_utc)
-    if init_ts.tz is None:
-        init_ts = init_ts.tz_localize("UTC")
-    else:
-        init_ts = init_ts.tz_convert("UTC")
-    init_time_utc_dt: datetime = init_ts.floor("15min").to_pydatetime()
+    init_time_utc_dt = _to_utc(init_time_utc, floor="15min")
 
 
     log.info(
@@ -214,13 +404,18 @@ async def save_forecast_to_dataplatform(
     if location_map is None:
         location_map = await fetch_dp_location_map(client)
 
-    target_uuid_str, forecaster = await asyncio.gather(
-        resolve_target_uuid(client, client_location_name, location_map),
-        create_forecaster_if_not_exists(client=client, model_tag=model_tag),
-    )
+    run_forecaster: dp.Forecaster
+    if forecaster is None:
+        target_uuid_str, run_forecaster = await asyncio.gather(
+            resolve_target_uuid(client, client_location_name, location_map),
+            get_forecaster(client=client, model_tag=model_tag),
+        )
+    else:
+        target_uuid_str = await resolve_target_uuid(client, client_location_name, location_map)
+        run_forecaster = forecaster
     log.info(
         f"uuid={target_uuid_str}  "
-        f"forecaster={forecaster.forecaster_name!r} v{forecaster.forecaster_version}",
+        f"forecaster={run_forecaster.forecaster_name!r} v{run_forecaster.forecaster_version}",
     )
 
     if target_uuid_str is None:
@@ -262,7 +457,7 @@ async def save_forecast_to_dataplatform(
 
 
     base_request = dp.CreateForecastRequest(
-        forecaster=forecaster,
+        forecaster=run_forecaster,
         location_uuid=target_uuid_str,
         energy_source=energy_source,
         init_time_utc=init_time_utc_dt,
@@ -271,7 +466,7 @@ async def save_forecast_to_dataplatform(
     )
     log.info(
         f"submitting forecast  "
-        f"forecaster={forecaster.forecaster_name!r}  "
+        f"forecaster={run_forecaster.forecaster_name!r}  "
         f"location={target_uuid_str}  values={len(forecast_values)}",
     )
 
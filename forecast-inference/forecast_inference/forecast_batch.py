@@ -0,0 +1,95 @@
+"""Columnar representation of the forecasts made in a run."""
+
+from __future__ import annotations
+
+import dataclasses
+import datetime as dt
+from collections.abc import Iterable, Sequence
+
+import numpy as np
+from psp.typings import PvId
+
+
+@dataclasses.dataclass(frozen=True)
+class ForecastBatch:
+    """Forecasts of many sites, made at the same time for the same horizons.
+
+    Attributes:
+    ----------
+    timestamp: Time at which the forecasts are made, naive UTC.
+    pv_ids: The sites, of length `num_sites`.
+    horizon_start_minutes: Start of each horizon, relative to `timestamp`, of shape
+        `(num_horizons,)`.
+    horizon_end_minutes: End of each horizon, of shape `(num_horizons,)`.
+    powers_kw: Forecasted power, of shape `(num_sites, num_horizons)`.
+    """
+
+    timestamp: dt.datetime
+    pv_ids: list[PvId]
+    horizon_start_minutes: np.ndarray
+    horizon_end_minutes: np.ndarray
+    powers_kw: np.ndarray
+
+    @classmethod
+    def from_predictions(
+        cls,
+        timestamp: dt.datetime,
+        horizons: Iterable[tuple[int, int]],
+        pv_ids: list[PvId],
+        powers: Sequence[np.ndarray] | np.ndarray,
+    ) -> ForecastBatch:
+        """Build a batch from the model's horizons and the `powers` of its predictions.
+
+        Arguments:
+        ---------
+        timestamp: Time at which the predictions were made.
+        horizons: The (start, end) minutes of the model's horizons.
+        pv_ids: The sites of the predictions.
+        powers: The `powers` of each site's prediction.
+        """
+        horizons_array = np.array(list(horizons), dtype=np.int64).reshape(-1, 2)
+        powers_kw = np.round(np.asarray(powers, dtype=np.float64), 3)
+        powers_kw = powers_kw.reshape(len(pv_ids), len(horizons_array))
+        return cls(
+            timestamp=timestamp,
+            pv_ids=list(pv_ids),
+            horizon_start_minutes=horizons_array[:, 0],
+            horizon_end_minutes=horizons_array[:, 1],
+            powers_kw=powers_kw,
+        )
+
+    @property
+    def num_sites(self) -> int:
+        """Number of sites."""
+        return len(self.pv_ids)
+
+    @property
+    def num_horizons(self) -> int:
+        """Number of horizons per site."""
+        return len(self.horizon_start_minutes)
+
+    def __len__(self) -> int:
+        """Number of forecast values, over all the sites."""
+        return self.num_sites * self.num_horizons
+
+    @property
+    def start_utc(self) -> np.ndarray:
+        """Start time of each horizon, as `datetime64[us]`."""
+        return np.datetime64(self.timestamp, "us") + self.horizon_start_minutes.astype(
+            "timedelta64[m]"
+        )
+
+    @property
+    def end_utc(self) -> np.ndarray:
+        """End time of each horizon, as `datetime64[us]`."""
+        return np.datetime64(self.timestamp, "us") + self.horizon_end_minutes.astype(
+            "timedelta64[m]"
+        )
+
+    def site(self, index: int) -> ForecastBatch:
+        """Batch of only the `index`-th site."""
+        return dataclasses.replace(
+            self,
+            pv_ids=[self.pv_ids[index]],
+            powers_kw=self.powers_kw[index : index + 1],
+        )
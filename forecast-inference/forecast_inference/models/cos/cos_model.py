@@ -10,13 +10,14 @@ ___/       \____
 
 """
 
-from datetime import timedelta
+from collections.abc import Sequence
 from typing import Any
 
 import numpy as np
+import pandas as pd
 from psp.data_sources.pv import PvDataSource
 from psp.models.base import PvSiteModel, PvSiteModelConfig
-from psp.typings import Features, Horizons, X, Y
+from psp.typings import Features, Horizons, PvId, Timestamp, X, Y
 
 from forecast_inference.models.cos.intensities import make_fake_intensity
 
@@ -29,13 +30,29 @@ class CosModel(PvSiteModel):
         # Features are supposed to be ndarrays but we know this won't actually break anything.
         return {"ts": x.ts}  # type: ignore
 
+    def _horizon_times(self, ts: Timestamp) -> np.ndarray:
+        """The naive UTC datetime64 times at which we evaluate each horizon."""
+        timestamp = pd.Timestamp(ts)
+        if timestamp.tz is not None:
+            timestamp = timestamp.tz_convert(None)
+        offsets = np.array([end - start for start, end in self.config.horizons], dtype=np.int64)
+        return timestamp.to_datetime64() + offsets.astype("timedelta64[m]")
+
     def predict_from_features(self, x: X, features: Features) -> Y:
         """Get the output from features."""
-        ts = features["ts"]
-        tss = [ts + timedelta(minutes=f[1] - f[0]) for f in self.config.horizons]
-        powers = np.array([make_fake_intensity(ts) for ts in tss])
+        powers = make_fake_intensity(self._horizon_times(features["ts"]))  # type: ignore
         return Y(powers=powers)
 
+    def predict_batch(self, pv_ids: Sequence[PvId], ts: Timestamp) -> np.ndarray:
+        """Predict for many sites at once.
+
+        Return:
+        ------
+        The powers, of shape (number of sites, number of horizons).
+        """
+        times = self._horizon_times(ts)
+        return make_fake_intensity(np.broadcast_to(times, (len(pv_ids), len(times))))
+
 
 def get_model(config: dict[str, Any], pv_data_source: PvDataSource | None) -> PvSiteModel:
     """Get a ready cosine model."""
@@ -1,23 +1,40 @@
-""" Function to make a solar intensity from one datetime """
+""" Function to make a solar intensity from datetimes """
 from datetime import datetime
+from typing import overload
 
 import numpy as np
 
 TOTAL_MINUTES_IN_ONE_DAY = 24 * 60
 
 
+@overload
 def make_fake_intensity(datetime_utc: datetime) -> float:
+    ...
+
+
+@overload
+def make_fake_intensity(datetime_utc: np.ndarray) -> np.ndarray:
+    ...
+
+
+def make_fake_intensity(datetime_utc: datetime | np.ndarray) -> float | np.ndarray:
     """
     Make a fake intesnity value based on the time of the day
 
-    :param datetime_utc:
-    :return: intensity, between 0 and 1
+    :param datetime_utc: a datetime, or a numpy array of (naive UTC) datetime64 of any shape
+    :return: intensity, between 0 and 1, of the same shape as `datetime_utc`
     """
+    if isinstance(datetime_utc, datetime):
+        minute_of_day: float | np.ndarray = datetime_utc.hour * 60 + datetime_utc.minute
+    else:
+        minutes = np.asarray(datetime_utc).astype("datetime64[m]")
+        minute_of_day = (minutes - minutes.astype("datetime64[D]")).astype(np.int64)
 
-    fraction_of_day = (datetime_utc.hour * 60 + datetime_utc.minute) / TOTAL_MINUTES_IN_ONE_DAY
+    fraction_of_day = minute_of_day / TOTAL_MINUTES_IN_ONE_DAY
     # use single cos**2 wave for intensity, but set night time to zero
-    if (fraction_of_day > 0.25) & (fraction_of_day < 0.75):
-        intensity = np.cos(2 * np.pi * fraction_of_day) ** 2
-    else:
-        intensity = 0.0
+    is_day = (fraction_of_day > 0.25) & (fraction_of_day < 0.75)
+    intensity = np.where(is_day, np.cos(2 * np.pi * fraction_of_day) ** 2, 0.0)
+
+    if isinstance(datetime_utc, datetime):
+        return float(intensity)
     return intensity
@@ -0,0 +1,167 @@
+"""
+Model with a configurable cost, to benchmark the pipeline around the models.
+
+It predicts the same values as the cosine model, but reads the PV and NWP data, burns CPU and
+fails the way a real model would, as set in the `synthetic` section of the config:
+
+```yaml
+run_model_func: forecast_inference.models.cos.synthetic_model.get_model
+pv_db_url: ${OCF_PV_DB_URL}
+synthetic:
+  cpu_ms: 20
+  pv_reads: 1
+  nwp_reads: 1
+  failure_rate: 0.01
+# Optional, only needed with `nwp_reads`, same as for the psp models.
+nwp:
+  cls: psp.data_sources.nwp.NwpDataSource
+  ...
+  kwargs:
+    ...
+    # Also the variables kept when converting the NWP data from `NWP_ZARR_PATH`.
+    variables: [dswrf]
+```
+"""
+
+import dataclasses
+import datetime as dt
+import hashlib
+import time
+from typing import Any
+
+import xarray as xr
+from psp.data_sources.nwp import NwpDataSource
+from psp.data_sources.pv import PvDataSource
+from psp.models.base import PvSiteModel, PvSiteModelConfig
+from psp.typings import Features, Horizons, Timestamp, X
+
+from forecast_inference.models.cos.cos_model import CosModel
+from forecast_inference.models.psp import preload_nwp
+from forecast_inference.utils.imports import instantiate
+
+
+@dataclasses.dataclass
+class SyntheticCost:
+    """What it costs to predict one site.
+
+    Attributes:
+    ----------
+    cpu_ms: CPU time spent per site, holding the GIL like Python code does.
+    pv_reads: Number of reads of the PV data of the site.
+    pv_lookback_minutes: How far back each PV read goes.
+    nwp_reads: Number of reads of the NWP data at the site, which needs `pv_reads` for the
+        coordinates of the site.
+    horizon_duration: Duration of each horizon, in minutes.
+    num_horizons: Number of horizons.
+    failure_rate: Share of the sites for which the prediction raises an error.
+    seed: The failing sites depend on the seed and the PV id only, so that they are the same from
+        one run to the next.
+    """
+
+    cpu_ms: float = 0.0
+    pv_reads: int = 0
+    pv_lookback_minutes: int = 24 * 60
+    nwp_reads: int = 0
+    horizon_duration: int = 15
+    num_horizons: int = 4 * 48
+    failure_rate: float = 0.0
+    seed: int = 0
+
+
+class SyntheticFailure(Exception):
+    """Failure simulated by the synthetic model."""
+
+
+def _burn_cpu(seconds: float) -> None:
+    """Keep the current thread busy for that much CPU time."""
+    end = time.thread_time() + seconds
+    x = 0
+    while time.thread_time() < end:
+        for i in range(1000):
+            x += i * i
+
+
+class SyntheticCostModel(CosModel):
+    """Cosine model with the cost set in `SyntheticCost`."""
+
+    def __init__(
+        self,
+        config: PvSiteModelConfig,
+        cost: SyntheticCost,
+        pv_data_source: PvDataSource | None,
+        nwp_data_source: NwpDataSource | None,
+    ):
+        super().__init__(config)
+        self._cost = cost
+        self._pv_data_source = pv_data_source
+        # Same attribute as the psp models, so that `precompute_site_nwp` works with this model.
+        self._nwp_data_sources = {} if nwp_data_source is None else {"ukv": nwp_data_source}
+
+    def _fails(self, pv_id: str) -> bool:
+        digest = hashlib.sha256(f"{self._cost.seed}:{pv_id}".encode()).digest()
+        return int.from_bytes(digest[:8], "big") / 2**64 < self._cost.failure_rate
+
+    def get_features(self, x: X, is_training: bool = False) -> Features:
+        """Read the data and burn the CPU of a real model."""
+        cost = self._cost
+
+        pv_data = None
+        for _ in range(cost.pv_reads):
+            assert self._pv_data_source is not None
+            pv_data = self._pv_data_source.get(
+                x.pv_id, x.ts - dt.timedelta(minutes=cost.pv_lookback_minutes), x.ts
+            )
+
+        if cost.nwp_reads > 0:
+            assert pv_data is not None
+            self._read_nwp(x.ts, float(pv_data.latitude), float(pv_data.longitude))
+
+        _burn_cpu(cost.cpu_ms / 1000)
+
+        if self._fails(x.pv_id):
+            raise SyntheticFailure(f'Synthetic failure for pv_id="{x.pv_id}"')
+
+        return super().get_features(x, is_training)
+
+    def _read_nwp(self, ts: Timestamp, lat: float, lon: float) -> xr.DataArray | None:
+        timestamps = [ts + dt.timedelta(minutes=start) for start, _ in self.config.horizons]
+        nwp_data = None
+        for _ in range(self._cost.nwp_reads):
+            nwp_data = self._nwp_data_sources["ukv"].get(
+                now=ts, timestamps=timestamps, nearest_lat=lat, nearest_lon=lon
+            )
+        return nwp_data
+
+
+def get_model(
+    config: dict[str, Any],
+    pv_data_source: PvDataSource | None,
+    nwp_data: xr.Dataset | None = None,
+    now: Timestamp | None = None,
+) -> PvSiteModel:
+    """Get a ready synthetic model.
+
+    Arguments:
+    ---------
+    config: The model's configuration, see the module's docstring.
+    pv_data_source: Source of the PV data.
+    nwp_data: NWP data already in memory, used instead of the path in `config["nwp"]["args"]`.
+    now: Time at which the predictions will be made.
+    """
+    cost = SyntheticCost(**config.get("synthetic", {}))
+    if cost.nwp_reads > 0 and cost.pv_reads == 0:
+        raise ValueError("`nwp_reads` needs `pv_reads`, for the coordinates of the sites")
+
+    nwp_data_source = None
+    if cost.nwp_reads > 0:
+        nwp_config = dict(config["nwp"])
+        if nwp_data is not None:
+            nwp_config["args"] = [nwp_data, *nwp_config.get("args", [])[1:]]
+        nwp_data_source = instantiate(**nwp_config)
+        if "nwp_preload_max_size" in config:
+            preload_nwp(nwp_data_source, now, config["nwp_preload_max_size"])
+
+    model_config = PvSiteModelConfig(
+        horizons=Horizons(duration=cost.horizon_duration, num_horizons=cost.num_horizons),
+    )
+    return SyntheticCostModel(model_config, cost, pv_data_source, nwp_data_source)
@@ -1,27 +1,102 @@
 """
 Models from the `pv-site-prediction` repo.
 """
+import contextlib
+import datetime as dt
+import functools
 import logging
+import types
+from collections.abc import Iterator
 from typing import Any
 
+import xarray as xr
+from dask.utils import parse_bytes
 from psp.data_sources.pv import PvDataSource
+from psp.data_sources.utils import _TIME
+from psp.models import recent_history
 from psp.models.base import PvSiteModel
-from psp.serialization import load_model
+from psp.typings import Timestamp
 
+from forecast_inference.data.cached_nwp_data_source import CachedNwpDataSource
+from forecast_inference.data.psp_internals import (
+    NwpSource,
+    model_nwp_data_sources,
+    nwp_data,
+    nwp_lag,
+    set_model_nwp_data_sources,
+    set_nwp_data,
+)
+from forecast_inference.data.site_nwp_data_source import SiteNwpDataSource
+from forecast_inference.models.serialization import load_model
+from forecast_inference.models.solar_geometry import SolarGeometry
 from forecast_inference.utils.imports import instantiate
 from forecast_inference.utils.profiling import profile
 
 _log = logging.getLogger(__name__)
 
 
-def get_model(config: dict[str, Any], pv_data_source: PvDataSource) -> PvSiteModel:
-    """Get a serialized pv-site-prediction model."""
+def preload_nwp(source: NwpSource, now: Timestamp | None, max_size: int | str) -> None:
+    """Load in memory the only init_time of `source` that we need to make predictions at `now`.
+
+    The source keeps reading lazily when that init_time is bigger than `max_size`.
+    """
+    data = nwp_data(source)
+    if now is None:
+        init_time = data[_TIME].values[-1]
+    else:
+        try:
+            init_time = data[_TIME].sel({_TIME: now - nwp_lag(source)}, method="ffill").values
+        except KeyError:
+            _log.warning(f"No NWP data before {now}, not preloading it")
+            return
+
+    data = data.sel({_TIME: [init_time]})
+    max_bytes = parse_bytes(max_size) if isinstance(max_size, str) else max_size
+    if data.nbytes > max_bytes:
+        _log.warning(
+            f"Not preloading the NWP data: {data.nbytes / 1e6:.0f}MB is more than {max_size}"
+        )
+        return
+
+    with profile(f"Preloading {data.nbytes / 1e6:.0f}MB of NWP data for {init_time}"):
+        set_nwp_data(source, data.load())
+
+
+def get_model(
+    config: dict[str, Any],
+    pv_data_source: PvDataSource,
+    nwp_data: xr.Dataset | None = None,
+    now: Timestamp | None = None,
+) -> PvSiteModel:
+    """Get a serialized pv-site-prediction model.
+
+    The model is either a pickle or an artifact directory (see `models.serialization`). With
+    `model_cache_dir` in the config, a remote model is loaded from a local copy in that directory.
+
+    With `nwp_preload_max_size` in the config, the NWP init_time used for predictions at `now`
+    (by default the latest) is loaded in memory, if it's not bigger than that size, e.g. "2GB".
+
+    With `nwp_feature_cache_size` in the config, the NWP data of that many pixels is kept and
+    shared by all the sites of each pixel (see `CachedNwpDataSource`).
+
+    Arguments:
+    ---------
+    config: The model's configuration.
+    pv_data_source: Source of the PV data.
+    nwp_data: NWP data already in memory, used instead of the path in `config["nwp"]["args"]`.
+    now: Time at which the predictions will be made.
+    """
 
     with profile(f'Loading model: {config["model_path"]}'):
-        model = load_model(config["model_path"])
+        model = load_model(config["model_path"], cache_dir=config.get("model_cache_dir"))
+
+    nwp_config = dict(config["nwp"])
+    if nwp_data is not None:
+        # The data replaces the path, which is the first argument.
+        nwp_config["args"] = [nwp_data, *nwp_config.get("args", [])[1:]]
 
     with profile(f'Getting NWP data: {config["nwp"]}'):
-        nwp_data_sources = instantiate(**config["nwp"])
+        nwp_data_sources = instantiate(**nwp_config)
 
     # TODO Make the setup step uniform across all `psp` models. In other words it should be defined
     # directly in `PvSiteModel`.
@@ -31,4 +106,99 @@ def get_model(config: dict[str, Any], pv_data_source: PvDataSource) -> PvSiteMod
             nwp_data_sources={"ukv": nwp_data_sources},
         )
 
+    if "nwp_preload_max_size" in config:
+        preload_nwp(nwp_data_sources, now, config["nwp_preload_max_size"])
+
+    if "nwp_feature_cache_size" in config:
+        set_model_nwp_data_sources(
+            model,
+            {
+                key: CachedNwpDataSource(source, max_entries=config["nwp_feature_cache_size"])
+                for key, source in model_nwp_data_sources(model).items()
+            },
+        )
+
     return model
+
+
+def precompute_site_nwp(
+    model: PvSiteModel, coordinates: list[tuple[float, float]], now: Timestamp
+) -> None:
+    """Extract the NWP data of all the sites at once, before making the predictions.
+
+    Arguments:
+    ---------
+    model: A model returned by `get_model`.
+    coordinates: (latitude, longitude) of the sites.
+    now: Time at which the predictions will be made.
+    """
+    nwp_data_sources = dict(model_nwp_data_sources(model))
+    if not nwp_data_sources:
+        _log.warning("The model doesn't use NWP data, nothing to precompute")
+        return
+
+    for key, source in nwp_data_sources.items():
+        with profile(f"Precomputing the NWP data of {len(coordinates)} sites for {key}"):
+            nwp_data_sources[key] = SiteNwpDataSource(source, coordinates, now)
+    set_model_nwp_data_sources(model, nwp_data_sources)
+
+
+@contextlib.contextmanager
+def precomputed_solar_geometry(
+    model: PvSiteModel,
+    coordinates: list[tuple[float, float]],
+    now: Timestamp,
+    decimals: int | None = 2,
+) -> Iterator[SolarGeometry | None]:
+    """Compute the solar geometry of all the sites at once, for the predictions made within the
+    context.
+
+    `RecentHistoryModel` computes the irradiance of each site, at the middle of each horizon and
+    for its recent power, with `get_irradiance`. Within the context, `model` looks them up in a
+    `SolarGeometry` instead. Only `model` is affected: the other models, and the `get_irradiance`
+    of `psp`, are left as they are.
+
+    Arguments:
+    ---------
+    model: A model returned by `get_model`.
+    coordinates: (latitude, longitude) of the sites.
+    now: Time at which the predictions will be made.
+    decimals: Decimals of the coordinates to keep, see `SolarGeometry`.
+    """
+    if not isinstance(model, recent_history.RecentHistoryModel):
+        _log.warning("The model doesn't use the solar geometry, nothing to precompute")
+        yield None
+        return
+
+    get_features = type(model)._get_features
+    if "get_irradiance" not in get_features.__code__.co_names:
+        _log.warning("This version of psp doesn't use `get_irradiance` in `_get_features`")
+        yield None
+        return
+
+    # The timestamps used by `RecentHistoryModel`, which averages the recent power over 30 minutes.
+    timestamps = [
+        now + dt.timedelta(minutes=(start + end) / 2) for start, end in model.config.horizons
+    ] + [now - dt.timedelta(minutes=15)]
+
+    with profile(f"Precomputing the solar geometry of {len(coordinates)} sites"):
+        geometry = SolarGeometry(coordinates, timestamps, decimals=decimals)
+
+    # The same method, looking up `get_irradiance` in the geometry instead of in `psp`. We don't
+    # patch `recent_history.get_irradiance`, which would affect the other models too.
+    patched_get_features = types.FunctionType(
+        get_features.__code__,
+        get_features.__globals__ | {"get_irradiance": geometry.get_irradiance},
+        get_features.__name__,
+        get_features.__defaults__,
+        get_features.__closure__,
+    )
+    patched_get_features.__kwdefaults__ = get_features.__kwdefaults__
+    functools.update_wrapper(patched_get_features, get_features)
+    model._get_features = types.MethodType(  # type: ignore[method-assign]
+        patched_get_features, model
+    )
+    try:
+        yield geometry
+    finally:
+        del model._get_features
@@ -0,0 +1,172 @@
+"""
+Serialization of the models, with their large arrays memory-mapped.
+
+A model artifact is a directory with:
+
+* `model.pkl`: the model, pickled like `psp.serialization.save_model` does, except for its large
+  buffers (typically the data of numpy arrays), which are left out of it;
+* `buffers.bin`: those buffers, one after the other;
+* `buffers.json`: where each buffer is in `buffers.bin`.
+
+When loading, `buffers.bin` is memory-mapped and the arrays are built on top of it without reading
+or copying it, so that the pages are only read when used, and shared by all the processes using the
+same artifact.
+"""
+import hashlib
+import json
+import logging
+import mmap
+import pathlib
+import pickle
+import shutil
+import tempfile
+from typing import Any
+
+import fsspec
+from dask.utils import parse_bytes
+from fsspec.implementations.local import LocalFileSystem
+from psp.models.base import PvSiteModel
+from psp.serialization import load_model as load_pickled_model
+
+from forecast_inference.data.cached_store import file_version
+
+_log = logging.getLogger(__name__)
+
+_MODEL = "model.pkl"
+_BUFFERS = "buffers.bin"
+_BUFFERS_INDEX = "buffers.json"
+# Buffers are aligned on this many bytes, for the arrays built on top of them.
+_ALIGNMENT = 64
+
+
+def _save_state(state: Any, path: str | pathlib.Path, min_buffer_size: int | str) -> None:
+    if isinstance(min_buffer_size, str):
+        min_buffer_size = parse_bytes(min_buffer_size)
+    path = pathlib.Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    buffers: list[pickle.PickleBuffer] = []
+
+    def _buffer_callback(buffer: pickle.PickleBuffer) -> bool:
+        # Returning True keeps the buffer in the pickle.
+        if buffer.raw().nbytes < min_buffer_size:
+            return True
+        buffers.append(buffer)
+        return False
+
+    with open(path / _MODEL, "wb") as f:
+        pickle.dump(state, f, protocol=5, buffer_callback=_buffer_callback)
+
+    index = []
+    with open(path / _BUFFERS, "wb") as f:
+        for buffer in buffers:
+            f.write(b"\0" * (-f.tell() % _ALIGNMENT))
+            data = buffer.raw()
+            index.append([f.tell(), data.nbytes])
+            f.write(data)
+
+    with open(path / _BUFFERS_INDEX, "w") as index_file:
+        json.dump(index, index_file)
+
+
+def save_model(
+    model: PvSiteModel, path: str | pathlib.Path, min_buffer_size: int | str = "64kB"
+) -> None:
+    """Save a model as an artifact directory.
+
+    Arguments:
+    ---------
+    model: The model.
+    path: Directory of the artifact.
+    min_buffer_size: Smaller buffers stay in the pickle.
+    """
+    _save_state((model.__class__, model.get_state()), path, min_buffer_size)
+
+
+def convert_pickled_model(
+    from_path: str, to_path: str | pathlib.Path, min_buffer_size: int | str = "64kB"
+) -> None:
+    """Convert a model saved with `psp.serialization.save_model` to an artifact directory."""
+    # We don't need to unpickle the model itself, which can't be saved again without its data
+    # sources.
+    with fsspec.open(from_path, "rb") as f:
+        state = pickle.load(f)
+    _save_state(state, to_path, min_buffer_size)
+
+
+def _load_artifact(path: pathlib.Path) -> PvSiteModel:
+    with open(path / _BUFFERS_INDEX) as f:
+        index = json.load(f)
+
+    buffers: list[memoryview] = []
+    if index:
+        with open(path / _BUFFERS, "rb") as f:
+            # Copy-on-write, in case the model writes in its arrays.
+            mapped = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY))
+        buffers = [mapped[offset : offset + size] for offset, size in index]
+
+    with open(path / _MODEL, "rb") as f:
+        (cls, attrs) = pickle.load(f, buffers=buffers)
+
+    model = cls.__new__(cls)
+    model.set_state(attrs)
+    return model
+
+
+def _cache_locally(model_path: str, cache_dir: str | pathlib.Path) -> pathlib.Path:
+    """Download a remote model to `cache_dir`, unless the same version is already there."""
+    fs, path = fsspec.core.url_to_fs(model_path)
+    path = path.rstrip("/")
+    files = fs.find(path, detail=True)
+    versions = sorted((name[len(path) :], file_version(info)) for name, info in files.items())
+
+    model_dir = pathlib.Path(cache_dir) / hashlib.sha256(model_path.encode()).hexdigest()[:16]
+    version = hashlib.sha256(json.dumps(versions).encode()).hexdigest()[:16]
+    local_path = model_dir / version / path.rsplit("/", 1)[-1]
+    if local_path.exists():
+        _log.info(f"Using the cached model {local_path}")
+        return local_path
+
+    model_dir.mkdir(parents=True, exist_ok=True)
+    # Download then rename, so that we never load a partial model.
+    with tempfile.TemporaryDirectory(dir=model_dir, prefix="tmp") as tmp_dir:
+        tmp_path = pathlib.Path(tmp_dir) / version
+        tmp_path.mkdir()
+        fs.get(path, str(tmp_path / local_path.name), recursive=fs.isdir(path))
+        try:
+            tmp_path.rename(local_path.parent)
+        except OSError:
+            # Another process cached it in the meantime.
+            if not local_path.exists():
+                raise
+    _log.info(f"Cached the model {model_path} in {local_path}")
+
+    # Only keep the latest version.
+    for old_version in model_dir.iterdir():
+        if old_version.name != version and not old_version.name.startswith("tmp"):
+            shutil.rmtree(old_version, ignore_errors=True)
+
+    return local_path
+
+
+def load_model(model_path: str, cache_dir: str | pathlib.Path | None = None) -> PvSiteModel:
+    """Load a model, either an artifact directory or a pickle from `psp.serialization`.
+
+    Arguments:
+    ---------
+    model_path: Local path or URL, e.g. "s3://bucket/model.pkl", of the model.
+    cache_dir: When set, remote models are loaded from a copy in this directory, which is only
+        downloaded again when the model changes.
+    """
+    fs, _ = fsspec.core.url_to_fs(model_path)
+    if cache_dir is not None and not isinstance(fs, LocalFileSystem):
+        model_path = str(_cache_locally(model_path, cache_dir))
+        fs = LocalFileSystem()
+
+    if not fs.isdir(model_path):
+        return load_pickled_model(model_path)
+    if not isinstance(fs, LocalFileSystem):
+        raise ValueError(
+            f"Can not memory-map the remote model {model_path}, set a cache directory for it"
+        )
+    return _load_artifact(pathlib.Path(model_path))
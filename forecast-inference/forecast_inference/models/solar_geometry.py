@@ -0,0 +1,135 @@
+"""
+Solar geometry of all the sites, computed once per run.
+"""
+import logging
+import os
+
+import h5py
+import numpy as np
+import pandas as pd
+from psp import pv
+from psp.typings import Timestamp
+from pvlib import atmosphere, clearsky, irradiance, location, solarposition
+
+_log = logging.getLogger(__name__)
+
+# The file read by `clearsky.lookup_linke_turbidity`.
+_LINKE_TURBIDITY_PATH = os.path.join(
+    os.path.dirname(clearsky.__file__), "data", "LinkeTurbidities.h5"
+)
+
+
+def _linke_turbidity(times: pd.DatetimeIndex, locations: list[tuple[float, float]]) -> np.ndarray:
+    """Same as `clearsky.lookup_linke_turbidity` for each location, one after the other.
+
+    The file is only read once, and the values are only interpolated once per cell of its grid,
+    which is about 9km wide and shared by the nearby locations.
+    """
+    cells = [
+        (
+            clearsky._degrees_to_index(lat, coordinate="latitude"),
+            clearsky._degrees_to_index(lon, coordinate="longitude"),
+        )
+        for lat, lon in locations
+    ]
+    with h5py.File(_LINKE_TURBIDITY_PATH, "r") as f:
+        monthly = {cell: f["LinkeTurbidity"][cell] for cell in sorted(set(cells))}
+    values = {
+        cell: clearsky._interpolate_turbidity(lts, times).to_numpy() / 20.0
+        for cell, lts in monthly.items()
+    }
+    return np.concatenate([values[cell] for cell in cells])
+
+
+class SolarGeometry:
+    """Position of the sun and clear sky irradiance of many sites, at the same timestamps.
+
+    Everything is computed at once for all the sites and timestamps. The coordinates of the sites
+    are rounded to `decimals` decimals, so that nearby sites share their values.
+
+    `get_irradiance` is a drop-in replacement for `psp.pv.get_irradiance` that only computes the
+    irradiance on the panels, which depends on their tilt and orientation, from those values.
+
+    Arguments:
+    ---------
+    coordinates: (latitude, longitude) of the sites.
+    timestamps: Naive UTC timestamps.
+    decimals: Decimals of the coordinates to keep, 2 being about 1km. `None` to keep them as is.
+    """
+
+    def __init__(
+        self,
+        coordinates: list[tuple[float, float]],
+        timestamps: pd.DatetimeIndex | list[pd.Timestamp] | list[Timestamp],
+        decimals: int | None = 2,
+    ):
+        self._decimals = decimals
+        self._times = pd.DatetimeIndex(timestamps)
+
+        locations = sorted({self._round(lat, lon) for lat, lon in coordinates})
+        self._row_of_coordinates = {coords: i for i, coords in enumerate(locations)}
+        shape = (len(locations), len(self._times))
+        if len(locations) == 0:
+            self._clearsky = {key: np.empty(shape) for key in ["ghi", "dni", "dhi"]}
+            self._zenith = self._azimuth = np.empty(shape)
+            return
+
+        lats = np.repeat([lat for lat, _ in locations], len(self._times))
+        lons = np.repeat([lon for _, lon in locations], len(self._times))
+        times = pd.DatetimeIndex(np.tile(self._times.values, len(locations)))
+
+        # The same as `psp.pv.get_irradiance`, for all the locations and timestamps at once.
+        solar_position = solarposition.get_solarposition(
+            times, lats, lons, altitude=0, pressure=atmosphere.alt2pres(0)
+        )
+        linke_turbidity = _linke_turbidity(self._times, locations)
+        sky = location.Location(0, 0).get_clearsky(
+            times, solar_position=solar_position, linke_turbidity=linke_turbidity
+        )
+
+        self._clearsky = {key: sky[key].to_numpy().reshape(shape) for key in ["ghi", "dni", "dhi"]}
+        self._zenith = solar_position["apparent_zenith"].to_numpy().reshape(shape)
+        self._azimuth = solar_position["azimuth"].to_numpy().reshape(shape)
+
+        _log.info(
+            f"Computed the solar geometry of {len(coordinates)} sites at {len(locations)} locations"
+            f" for {len(self._times)} timestamps"
+        )
+
+    def _round(self, lat: float, lon: float) -> tuple[float, float]:
+        if self._decimals is None:
+            return (lat, lon)
+        return (round(lat, self._decimals), round(lon, self._decimals))
+
+    def get_irradiance(
+        self,
+        *,
+        lat: float,
+        lon: float,
+        timestamps: pd.DatetimeIndex | list[pd.Timestamp] | list[Timestamp],
+        tilt: float,
+        orientation: float,
+    ) -> pd.DataFrame:
+        """Same as `psp.pv.get_irradiance`, computed by the latter for unknown sites or
+        timestamps."""
+        index = pd.DatetimeIndex(timestamps)
+        row = self._row_of_coordinates.get(self._round(lat, lon))
+        columns = self._times.get_indexer(index)
+        if row is None or (columns == -1).any():
+            return pv.get_irradiance(
+                lat=lat, lon=lon, timestamps=timestamps, tilt=tilt, orientation=orientation
+            )
+
+        sky = pd.DataFrame(
+            {key: values[row, columns] for key, values in self._clearsky.items()}, index=index
+        )
+        irr = irradiance.get_total_irradiance(
+            surface_tilt=tilt,
+            surface_azimuth=orientation,
+            dni=sky["dni"],
+            ghi=sky["ghi"],
+            dhi=sky["dhi"],
+            solar_zenith=pd.Series(self._zenith[row, columns], index=index),
+            solar_azimuth=pd.Series(self._azimuth[row, columns], index=index),
+        )
+        return pd.concat([sky, irr], axis=1)
@@ -0,0 +1,223 @@
+"""Benchmark our Data Platform save and load paths against a local fake Data Platform.
+
+The fake server (see `forecast_inference.utils.fake_dataplatform`) is served on localhost and
+reached through the real `get_dataplatform_client`, so channel settings such as
+DATA_PLATFORM_NUM_CHANNELS apply. We report the number of RPCs and the throughput of each path.
+"""
+
+import asyncio
+import collections
+import datetime as dt
+import logging
+import os
+import time
+import uuid
+
+import click
+from pvsite_datamodel.sqlmodels import LocationSQL
+
+from forecast_inference.data_platform.client import fetch_dp_location_map, get_dataplatform_client
+from forecast_inference.data_platform.load import fetch_generation_and_locations_from_dp
+from forecast_inference.data_platform.save import (
+    create_missing_locations,
+    save_forecast_to_dataplatform,
+)
+from forecast_inference.utils.fake_dataplatform import (
+    FakeDataPlatformConfig,
+    FakeDataPlatformDataService,
+    serve_fake_dataplatform,
+)
+
+_log = logging.getLogger(__name__)
+
+_INIT_TIME = dt.datetime(2024, 6, 1, 12, tzinfo=dt.UTC)
+_CAPACITY_KW = 4.0
+
+
+def _make_rows(num_horizons: int) -> list[dict]:
+    return [
+        {
+            "start_utc": _INIT_TIME + dt.timedelta(minutes=15 * i),
+            "end_utc": _INIT_TIME + dt.timedelta(minutes=15 * (i + 1)),
+            "forecast_power_kw": _CAPACITY_KW * (i % 10) / 10,
+            "horizon_minutes": 15 * i,
+        }
+        for i in range(num_horizons)
+    ]
+
+
+def _report(name: str, num_sites: int, seconds: float, rpc_counts: collections.Counter) -> None:
+    print(f"\n{name}: {num_sites} sites in {seconds:.2f}s ({num_sites / seconds:.1f} sites/s)")
+    for rpc, count in sorted(rpc_counts.items()):
+        print(f"    {rpc:<32} {count:>8} ({count / num_sites:.2f} per site)")
+
+
+async def _run_benchmark(
+    service: FakeDataPlatformDataService,
+    num_sites: int,
+    num_horizons: int,
+    concurrency: int,
+    missing_locations: float,
+    history_hours: int,
+) -> None:
+    names = [f"benchmark_site_{i}" for i in range(num_sites)]
+    # Some sites are already known to the Data Platform, the others get created while saving.
+    for name in names[int(num_sites * missing_locations) :]:
+        service.add_location(name, int(_CAPACITY_KW * 1000), latitude=51.5, longitude=-1.8)
+
+    rows = _make_rows(num_horizons)
+    semaphore = asyncio.Semaphore(concurrency)
+    num_failures = 0
+
+    async with get_dataplatform_client() as client:
+        rpc_counts_before = collections.Counter(service.rpc_counts)
+        t0 = time.perf_counter()
+        location_map = await fetch_dp_location_map(client)
+        # Like the app, create the missing locations up front.
+        await create_missing_locations(
+            client,
+            [
+                {
+                    "client_location_name": name,
+                    "capacity_kw": _CAPACITY_KW,
+                    "latitude": 51.5,
+                    "longitude": -1.8,
+                }
+                for name in names
+            ],
+            location_map,
+            _INIT_TIME,
+            max_concurrency=concurrency,
+        )
+
+        async def _save(name: str) -> None:
+            nonlocal num_failures
+            async with semaphore:
+                try:
+                    await save_forecast_to_dataplatform(
+                        rows=rows,
+                        client_location_name=name,
+                        model_tag="pv-site-production",
+                        init_time_utc=_INIT_TIME,
+                        client=client,
+                        capacity_kw=_CAPACITY_KW,
+                        latitude=51.5,
+                        longitude=-1.8,
+                        location_map=location_map,
+                    )
+                except Exception:
+                    num_failures += 1
+
+        await asyncio.gather(*[_save(name) for name in names])
+        seconds = time.perf_counter() - t0
+
+    _report(
+        "Save forecasts", num_sites, seconds, service.rpc_counts - rpc_counts_before
+    )
+    print(f"    failed sites: {num_failures}")
+
+    sites = [
+        LocationSQL(location_uuid=uuid.uuid4(), client_location_name=name) for name in names
+    ]
+    rpc_counts_before = collections.Counter(service.rpc_counts)
+    t0 = time.perf_counter()
+    df, _, _ = await fetch_generation_and_locations_from_dp(
+        sites,
+        _INIT_TIME - dt.timedelta(hours=history_hours),
+        _INIT_TIME,
+        loc_map_cache=None,
+    )
+    seconds = time.perf_counter() - t0
+    _report("Fetch generation", num_sites, seconds, service.rpc_counts - rpc_counts_before)
+    print(f"    generation values: {len(df)}")
+
+    print(f"\nMax concurrent RPCs seen by the server: {service.max_in_flight}")
+    print(f"Injected errors: {sum(service.error_counts.values())}")
+
+
+@click.command()
+@click.option("--num-sites", type=int, default=1000, show_default=True)
+@click.option("--num-horizons", type=int, default=192, show_default=True)
+@click.option(
+    "--concurrency",
+    type=int,
+    default=50,
+    show_default=True,
+    help="Number of sites saved concurrently.",
+)
+@click.option(
+    "--missing-locations",
+    type=float,
+    default=0.0,
+    show_default=True,
+    help="Fraction of the sites that don't exist in the Data Platform yet.",
+)
+@click.option(
+    "--history-hours",
+    type=int,
+    default=24,
+    show_default=True,
+    help="How much generation history to fetch per site.",
+)
+@click.option("--latency-ms", type=float, default=5.0, show_default=True)
+@click.option("--jitter-ms", type=float, default=2.0, show_default=True)
+@click.option("--error-rate", type=float, default=0.0, show_default=True)
+@click.option(
+    "--max-concurrent-streams",
+    type=int,
+    default=100,
+    show_default=True,
+    help="Maximum number of RPCs the fake server handles at the same time.",
+)
+@click.option("--seed", type=int, default=0, show_default=True)
+@click.option(
+    "--log-level",
+    default="warning",
+    show_default=True,
+    help="logging level",
+)
+def main(
+    num_sites: int,
+    num_horizons: int,
+    concurrency: int,
+    missing_locations: float,
+    history_hours: int,
+    latency_ms: float,
+    jitter_ms: float,
+    error_rate: float,
+    max_concurrent_streams: int,
+    seed: int,
+    log_level: str,
+):
+    """Main."""
+    logging.basicConfig(level=log_level.upper())
+
+    service = FakeDataPlatformDataService(
+        FakeDataPlatformConfig(
+            latency_seconds=latency_ms / 1000,
+            jitter_seconds=jitter_ms / 1000,
+            error_rate=error_rate,
+            max_concurrent_streams=max_concurrent_streams,
+            seed=seed,
+        )
+    )
+
+    async def _run():
+        async with serve_fake_dataplatform(service) as (host, port):
+            _log.info(f"Fake Data Platform listening on {host}:{port}")
+            os.environ["DATA_PLATFORM_HOST"] = host
+            os.environ["DATA_PLATFORM_PORT"] = str(port)
+            await _run_benchmark(
+                service,
+                num_sites=num_sites,
+                num_horizons=num_horizons,
+                concurrency=concurrency,
+                missing_locations=missing_locations,
+                history_hours=history_hours,
+            )
+
+    asyncio.run(_run())
+
+
+if __name__ == "__main__":
+    main()
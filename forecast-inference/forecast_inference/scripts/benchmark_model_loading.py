@@ -0,0 +1,60 @@
+"""Benchmark of the loading of a model, pickled and as an artifact directory.
+
+The pickled model is converted to an artifact in a temporary directory, and both are loaded a few
+times. Note that the first load of each is the one that reads the files from disk.
+"""
+
+import pathlib
+import shutil
+import tempfile
+import time
+
+import click
+import numpy as np
+from psp.serialization import load_model as load_pickled_model
+
+from forecast_inference.models.serialization import convert_pickled_model, load_model
+
+
+def _size(path: pathlib.Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def _load_seconds(load, path: str, repeat: int) -> np.ndarray:
+    seconds = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        load(path)
+        seconds.append(time.perf_counter() - t0)
+    return np.array(seconds)
+
+
+@click.command()
+@click.option("--model-path", required=True, help="Path of the pickled model.")
+@click.option("--repeat", type=int, default=5, show_default=True)
+@click.option("--min-buffer-size", default="64kB", show_default=True)
+def main(model_path: str, repeat: int, min_buffer_size: str):
+    """Main."""
+    work_dir = pathlib.Path(tempfile.mkdtemp())
+    try:
+        artifact_path = work_dir / "model"
+        convert_pickled_model(model_path, artifact_path, min_buffer_size=min_buffer_size)
+
+        print(f"{'format':<10} {'size (MB)':>10} {'first (ms)':>11} {'mean (ms)':>10}")
+        for name, load, path in [
+            ("pickle", load_pickled_model, model_path),
+            ("artifact", load_model, str(artifact_path)),
+        ]:
+            seconds = _load_seconds(load, path, repeat) * 1000
+            print(
+                f"{name:<10} {_size(pathlib.Path(path)) / 1e6:>10.2f} {seconds[0]:>11.2f}"
+                f" {seconds.mean():>10.2f}"
+            )
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Benchmark of the profiles of the local NWP store (see `STORE_PROFILES`).
+
+For each profile, converts the source NWP data and reports the conversion time, the size of the
+store and the latency of reading the NWP data of a site, the way the model does.
+"""
+
+import datetime as dt
+import pathlib
+import shutil
+import tempfile
+import time
+
+import click
+import numpy as np
+import pandas as pd
+import pyproj
+import xarray as xr
+from psp.data_sources.nwp import NwpDataSource
+
+from forecast_inference.data.nwp_data_sources import (
+    STORE_PROFILES,
+    download_and_add_osgb_to_nwp_data_source,
+)
+from forecast_inference.data.psp_internals import nwp_data
+
+
+def _store_size(path: pathlib.Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def _sites(path: pathlib.Path, num_sites: int, seed: int) -> list[tuple[float, float]]:
+    """Random (latitude, longitude) points of the grid."""
+    nwp = xr.open_zarr(path)
+    rng = np.random.default_rng(seed)
+    xs = rng.choice(nwp.x.values, num_sites)
+    ys = rng.choice(nwp.y.values, num_sites)
+    lats, lons = pyproj.Transformer.from_crs(27700, 4326).transform(xs, ys)
+    return list(zip(lats, lons))
+
+
+def _read_latencies(path: pathlib.Path, sites: list[tuple[float, float]]) -> np.ndarray:
+    # How the models read our local store.
+    source = NwpDataSource(
+        str(path),
+        time_dim_name="init_time",
+        value_name="UKV",
+        y_is_ascending=False,
+        coord_system=27700,
+    )
+    now = pd.Timestamp(nwp_data(source).time.values[-1]).to_pydatetime()
+    timestamps = [now + dt.timedelta(minutes=15 * i) for i in range(4 * 48)]
+
+    latencies = []
+    for lat, lon in sites:
+        t0 = time.perf_counter()
+        source.get(now=now, timestamps=timestamps, nearest_lat=lat, nearest_lon=lon)
+        latencies.append(time.perf_counter() - t0)
+    return np.array(latencies)
+
+
+@click.command()
+@click.option("--source", "source_path", required=True, help="Path of the source NWP zarr.")
+@click.option(
+    "--profile",
+    "profiles",
+    type=click.Choice(list(STORE_PROFILES)),
+    multiple=True,
+    help="Profiles to compare. Defaults to all of them.",
+)
+@click.option("--variables", default=None, help="Comma-separated NWP variables to keep.")
+@click.option("--num-sites", type=int, default=100, show_default=True)
+@click.option("--seed", type=int, default=0, show_default=True)
+def main(
+    source_path: str,
+    profiles: tuple[str, ...],
+    variables: str | None,
+    num_sites: int,
+    seed: int,
+):
+    """Main."""
+    variables_to_keep = variables.split(",") if variables else None
+
+    work_dir = pathlib.Path(tempfile.mkdtemp())
+    try:
+        print(
+            f"{'profile':<20} {'convert (s)':>12} {'size (MB)':>10}"
+            f" {'read p50 (ms)':>14} {'read p95 (ms)':>14}"
+        )
+        sites = None
+        for profile in profiles or list(STORE_PROFILES):
+            path = work_dir / f"{profile}.zarr"
+            t0 = time.perf_counter()
+            download_and_add_osgb_to_nwp_data_source(
+                source_path,
+                str(path),
+                variables_to_keep=variables_to_keep,
+                skip_unchanged=False,
+                store_profile=profile,
+            )
+            convert_seconds = time.perf_counter() - t0
+
+            if sites is None:
+                sites = _sites(path, num_sites, seed)
+            latencies = _read_latencies(path, sites) * 1000
+
+            print(
+                f"{profile:<20} {convert_seconds:>12.2f} {_store_size(path) / 1e6:>10.2f}"
+                f" {np.percentile(latencies, 50):>14.2f} {np.percentile(latencies, 95):>14.2f}"
+            )
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
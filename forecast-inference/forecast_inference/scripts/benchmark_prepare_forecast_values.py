@@ -0,0 +1,128 @@
+"""Microbenchmark of the conversion of forecast rows into Data Platform forecast values.
+
+Compares the original row-by-row implementation of `prepare_forecast_values` with the
+vectorized one, per site and for all the sites at once, with and without `horizon_minutes` in
+the rows.
+"""
+
+import datetime as dt
+import time
+from typing import Callable
+
+import click
+import pandas as pd
+from ocf import dp
+
+from forecast_inference.data_platform.save import (
+    compute_forecast_arrays,
+    prepare_forecast_values,
+    prepare_many_forecast_values,
+)
+
+_INIT_TIME = dt.datetime(2024, 6, 1, 12, tzinfo=dt.UTC)
+_CAPACITY_WATTS = 4000
+
+
+def _prepare_forecast_values_loop(
+    rows: list[dict],
+    init_time_utc: dt.datetime,
+    capacity_watts: int,
+) -> list[dp.CreateForecastRequestForecastValue]:
+    """Row-by-row implementation that `prepare_forecast_values` replaced, as a baseline."""
+    init_ts = pd.Timestamp(init_time_utc)
+    if init_ts.tz is None:
+        init_ts = init_ts.tz_localize("UTC")
+    init_ts = init_ts.floor("15min")
+
+    forecast_values: list[dp.CreateForecastRequestForecastValue] = []
+    for row in rows:
+        if "horizon_minutes" in row and row["horizon_minutes"] is not None:
+            horizon_mins = int(row["horizon_minutes"])
+        else:
+            start_ts = pd.Timestamp(row["start_utc"])
+            if start_ts.tz is None:
+                start_ts = start_ts.tz_localize("UTC")
+            horizon_mins = int((start_ts - init_ts).total_seconds() / 60)
+
+        p50_fraction = max(0.0, min(1.0, (row["forecast_power_kw"] * 1000) / capacity_watts))
+
+        forecast_values.append(
+            dp.CreateForecastRequestForecastValue(
+                horizon_mins=horizon_mins,
+                p50_fraction=p50_fraction,
+            ),
+        )
+
+    return forecast_values
+
+
+def _make_rows(num_horizons: int, with_horizons: bool) -> list[dict]:
+    rows = []
+    for i in range(num_horizons):
+        row = {
+            "start_utc": _INIT_TIME + dt.timedelta(minutes=15 * i),
+            "end_utc": _INIT_TIME + dt.timedelta(minutes=15 * (i + 1)),
+            "forecast_power_kw": _CAPACITY_WATTS / 1000 * (i % 12) / 10,
+        }
+        if with_horizons:
+            row["horizon_minutes"] = 15 * i
+        rows.append(row)
+    return rows
+
+
+def _best_of(func: Callable[[], object], repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+@click.command()
+@click.option("--num-sites", type=int, default=1000, show_default=True)
+@click.option("--num-horizons", type=int, default=192, show_default=True)
+@click.option(
+    "--repeats",
+    type=int,
+    default=3,
+    show_default=True,
+    help="Each implementation is run this many times and the best time is reported.",
+)
+def main(num_sites: int, num_horizons: int, repeats: int):
+    """Main."""
+    for with_horizons in [True, False]:
+        forecasts = [
+            (_make_rows(num_horizons, with_horizons), _CAPACITY_WATTS) for _ in range(num_sites)
+        ]
+
+        # Make sure we are comparing implementations that agree.
+        expected = _prepare_forecast_values_loop(forecasts[0][0], _INIT_TIME, _CAPACITY_WATTS)
+        assert prepare_forecast_values(forecasts[0][0], _INIT_TIME, _CAPACITY_WATTS) == expected
+
+        implementations: dict[str, Callable[[], object]] = {
+            "loop (baseline)": lambda: [
+                _prepare_forecast_values_loop(rows, _INIT_TIME, cap) for rows, cap in forecasts
+            ],
+            "vectorized, per site": lambda: [
+                prepare_forecast_values(rows, _INIT_TIME, cap) for rows, cap in forecasts
+            ],
+            "vectorized, all sites": lambda: prepare_many_forecast_values(forecasts, _INIT_TIME),
+            "arrays only, per site": lambda: [
+                compute_forecast_arrays(rows, _INIT_TIME, cap) for rows, cap in forecasts
+            ],
+        }
+
+        print(
+            f"\n{num_sites} sites x {num_horizons} horizons,"
+            f" horizon_minutes {'given' if with_horizons else 'derived from start_utc'}:"
+        )
+        baseline = None
+        for name, func in implementations.items():
+            seconds = _best_of(func, repeats)
+            baseline = baseline or seconds
+            print(f"    {name:<24} {seconds * 1000:>10.1f} ms  (x{baseline / seconds:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""Convert a pickled model to an artifact directory, whose large arrays are memory-mapped when
+loaded (see `forecast_inference.models.serialization`).
+"""
+
+import click
+
+from forecast_inference.models.serialization import convert_pickled_model
+
+
+@click.command()
+@click.option("--input", "input_path", required=True, help="Path or URL of the pickled model.")
+@click.option("--output", "output_path", required=True, help="Directory of the artifact.")
+@click.option(
+    "--min-buffer-size",
+    default="64kB",
+    show_default=True,
+    help="Smaller buffers stay in the pickle.",
+)
+def main(input_path: str, output_path: str, min_buffer_size: str):
+    """Main."""
+    convert_pickled_model(input_path, output_path, min_buffer_size=min_buffer_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Send the forecasts of a Data Platform outbox (see `DATA_PLATFORM_OUTBOX_DIR`).
+
+Drains the outbox once, or forever every `--interval` seconds, and reports the depth of the
+outbox and the drain rate after each drain, as Sentry metrics when `SENTRY_DSN` is set.
+"""
+
+import asyncio
+import logging
+import os
+import pathlib
+
+import click
+import sentry_sdk
+
+from forecast_inference.data_platform import (
+    Outbox,
+    drain_outbox,
+    get_dataplatform_client,
+    report_outbox_metrics,
+)
+
+_log = logging.getLogger(__name__)
+
+
+@click.command()
+@click.option(
+    "--outbox-dir",
+    type=click.Path(path_type=pathlib.Path),
+    default=lambda: os.getenv("DATA_PLATFORM_OUTBOX_DIR"),
+    required=True,
+    help="Directory of the outbox. Defaults to DATA_PLATFORM_OUTBOX_DIR.",
+)
+@click.option("--batch-size", type=int, default=100, show_default=True)
+@click.option(
+    "--max-concurrency",
+    type=int,
+    default=10,
+    show_default=True,
+    help="Maximum number of forecasts being sent at the same time.",
+)
+@click.option(
+    "--max-attempts",
+    type=int,
+    default=5,
+    show_default=True,
+    help="Attempts per forecast before putting it back in the outbox.",
+)
+@click.option("--backoff-seconds", type=float, default=1.0, show_default=True)
+@click.option(
+    "--interval",
+    type=float,
+    default=None,
+    help="Keep draining, every INTERVAL seconds. By default we drain only once.",
+)
+@click.option(
+    "--log-level",
+    default="info",
+    show_default=True,
+    help="logging level",
+)
+def main(
+    outbox_dir: pathlib.Path,
+    batch_size: int,
+    max_concurrency: int,
+    max_attempts: int,
+    backoff_seconds: float,
+    interval: float | None,
+    log_level: str,
+):
+    """Main."""
+    logging.basicConfig(level=log_level.upper())
+    # Where the metrics of the outbox are exported.
+    sentry_sdk.init(dsn=os.getenv("SENTRY_DSN"), environment=os.getenv("ENVIRONMENT", "local"))
+
+    outbox = Outbox(outbox_dir)
+
+    async def _run():
+        while True:
+            try:
+                async with get_dataplatform_client() as client:
+                    stats = await drain_outbox(
+                        outbox,
+                        client,
+                        batch_size=batch_size,
+                        max_concurrency=max_concurrency,
+                        max_attempts=max_attempts,
+                        backoff_seconds=backoff_seconds,
+                    )
+                report_outbox_metrics(outbox, stats)
+            except Exception:
+                if interval is None:
+                    raise
+                _log.exception("Draining the outbox failed")
+
+            if interval is None:
+                return
+            await asyncio.sleep(interval)
+
+    asyncio.run(_run())
+
+
+if __name__ == "__main__":
+    main()
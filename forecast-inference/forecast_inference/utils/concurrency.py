@@ -0,0 +1,109 @@
+"""
+Utils related to running coroutines, and processes, concurrently.
+"""
+
+import asyncio
+import contextlib
+import gc
+import math
+import multiprocessing
+from collections.abc import Callable, Coroutine, Hashable, Iterable, Iterator
+from typing import Any, Generic, TypeVar
+
+_K = TypeVar("_K", bound=Hashable)
+
+# The function applied by `fork_map`, inherited by the worker processes when they are forked.
+_forked_func: Callable[[Any], Any] | None = None
+
+
+class BoundedTaskGroup(Generic[_K]):
+    """Run coroutines as background tasks, at most `limit` of them at the same time.
+
+    `submit` waits for a free slot before starting the task, so a producer submitting work
+    faster than it completes is naturally slowed down. `wait` waits for every submitted task and
+    returns their results (or the exception they raised) in submission order.
+    """
+
+    def __init__(self, limit: int):
+        """Constructor"""
+        if limit < 1:
+            raise ValueError(f"limit must be at least 1, got {limit}")
+        self._semaphore = asyncio.Semaphore(limit)
+        self._tasks: dict[_K, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        """Number of submitted tasks."""
+        return len(self._tasks)
+
+    async def submit(self, key: _K, coro: Coroutine[Any, Any, Any]) -> None:
+        """Start `coro` in the background as soon as there is a free slot.
+
+        `key` identifies the task in the result of `wait`.
+        """
+        if key in self._tasks:
+            coro.close()
+            raise KeyError(f"A task was already submitted for {key!r}")
+
+        await self._semaphore.acquire()
+        task = asyncio.create_task(coro)
+        task.add_done_callback(lambda _: self._semaphore.release())
+        self._tasks[key] = task
+
+    async def wait(self) -> dict[_K, Any]:
+        """Wait for all the tasks and return a `{key: result or exception}` dict."""
+        results = await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        return dict(zip(self._tasks.keys(), results))
+
+
+def _call_forked(chunk: list[Any]) -> list[Any]:
+    assert _forked_func is not None
+    return [_forked_func(item) for item in chunk]
+
+
+@contextlib.contextmanager
+def fork_map(
+    func: Callable[[Any], Any],
+    items: Iterable[Any],
+    num_workers: int,
+    chunk_size: int | None = None,
+    initializer: Callable[[], None] | None = None,
+) -> Iterator[Iterator[Any]]:
+    """Apply `func` to `items` in forked worker processes.
+
+    The workers are forked when entering the context, so they share, copy-on-write, everything
+    the process has loaded so far, and `func` doesn't need to be picklable. The items are sent to
+    the workers in chunks, and the iterator returned by the context yields the results in the
+    order of `items`, as soon as their chunk is done. Results must be picklable. The workers are
+    stopped when leaving the context.
+
+    Arguments:
+    ---------
+    func: Function applied to each item.
+    items: The items.
+    num_workers: Number of worker processes.
+    chunk_size: Number of items sent to a worker at once. Defaults to about 4 chunks per worker.
+    initializer: Called in each worker when it starts.
+    """
+    global _forked_func
+
+    if num_workers < 1:
+        raise ValueError(f"num_workers must be at least 1, got {num_workers}")
+    items = list(items)
+    if chunk_size is None:
+        chunk_size = max(1, math.ceil(len(items) / (4 * num_workers)))
+    chunks = [items[i : i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+    _forked_func = func
+    # Keep the objects of the parent out of the garbage collector, which would otherwise write in
+    # them, and copy their memory pages, in each worker.
+    gc.freeze()
+    try:
+        pool = multiprocessing.get_context("fork").Pool(num_workers, initializer)
+    finally:
+        gc.unfreeze()
+
+    try:
+        with pool:
+            yield (result for results in pool.imap(_call_forked, chunks) for result in results)
+    finally:
+        _forked_func = None
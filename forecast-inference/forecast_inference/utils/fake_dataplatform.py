@@ -0,0 +1,274 @@
+"""In-process stand-in for the Data Platform gRPC service.
+
+Implements the subset of `DataPlatformDataService` used by `data_platform.load` and
+`data_platform.save` on top of grpclib, with an in-memory store and configurable latency,
+jitter, error rate and stream limit. It can be used in-process (`fake_dataplatform_client`)
+or served on localhost (`serve_fake_dataplatform`) so the real `get_dataplatform_client`
+connects to it. This is for tests and benchmarks only, and is not imported by the app.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import contextlib
+import dataclasses
+import datetime as dt
+import random
+import re
+import socket
+import uuid
+from collections.abc import AsyncIterator
+
+from grpclib.const import Status
+from grpclib.exceptions import GRPCError
+from grpclib.server import Server
+from grpclib.testing import ChannelFor
+from ocf import dp
+
+from forecast_inference.data_platform.client import DataPlatformClient, LocationSummary
+
+_WKT_POINT = re.compile(r"POINT\s*\(\s*(?P<lon>[-0-9.eE]+)\s+(?P<lat>[-0-9.eE]+)\s*\)")
+
+
+@dataclasses.dataclass
+class FakeDataPlatformConfig:
+    """Behaviour of the fake Data Platform.
+
+    Attributes:
+    ----------
+    latency_seconds: Base time spent handling each RPC.
+    jitter_seconds: Each RPC's latency is drawn uniformly in `latency_seconds +/- jitter_seconds`.
+    error_rate: Probability for an RPC to fail with `UNAVAILABLE`.
+    max_concurrent_streams: Maximum number of RPCs handled at the same time, the others wait.
+        `None` means no limit.
+    observation_interval_minutes: Spacing of the generated observations.
+    seed: Seed of the random generator used for jitter and errors.
+    """
+
+    latency_seconds: float = 0.0
+    jitter_seconds: float = 0.0
+    error_rate: float = 0.0
+    max_concurrent_streams: int | None = None
+    observation_interval_minutes: int = 5
+    seed: int | None = None
+
+
+class FakeDataPlatformDataService(dp.DataPlatformDataServiceBase):
+    """In-memory implementation of the Data Platform RPCs we use.
+
+    Counts every RPC received in `rpc_counts` (and the injected failures in `error_counts`),
+    which lets benchmarks report how many round-trips a code path costs.
+    """
+
+    def __init__(self, config: FakeDataPlatformConfig | None = None):
+        """Constructor"""
+        self.config = config or FakeDataPlatformConfig()
+        self.locations: dict[str, LocationSummary] = {}
+        self.forecasters: dict[str, dp.Forecaster] = {}
+        # Number of forecast values received, per location uuid.
+        self.forecast_values: collections.Counter[str] = collections.Counter()
+        # Last forecast received, per location uuid.
+        self.last_forecasts: dict[str, dp.CreateForecastRequest] = {}
+        self.rpc_counts: collections.Counter[str] = collections.Counter()
+        self.error_counts: collections.Counter[str] = collections.Counter()
+        self.max_in_flight = 0
+
+        self._in_flight = 0
+        self._random = random.Random(self.config.seed)
+        self._streams = (
+            asyncio.Semaphore(self.config.max_concurrent_streams)
+            if self.config.max_concurrent_streams
+            else None
+        )
+
+    def add_location(
+        self,
+        location_name: str,
+        capacity_watts: int,
+        latitude: float,
+        longitude: float,
+        location_type: dp.LocationType = dp.LocationType.SITE,
+    ) -> LocationSummary:
+        """Add a location directly to the store, without going through an RPC."""
+        summary = LocationSummary(
+            location_name=location_name,
+            location_uuid=str(uuid.uuid4()),
+            effective_capacity_watts=capacity_watts,
+            latlng=dp.LatLng(latitude=latitude, longitude=longitude),
+            location_type=location_type,
+        )
+        self.locations[location_name] = summary
+        return summary
+
+    @contextlib.asynccontextmanager
+    async def _rpc(self, name: str) -> AsyncIterator[None]:
+        """Account for one RPC and simulate its latency, stream limit and failures."""
+        self.rpc_counts[name] += 1
+        async with self._streams or contextlib.nullcontext():
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+            try:
+                jitter = self._random.uniform(-1, 1) * self.config.jitter_seconds
+                delay = max(0.0, self.config.latency_seconds + jitter)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if self._random.random() < self.config.error_rate:
+                    self.error_counts[name] += 1
+                    raise GRPCError(Status.UNAVAILABLE, f"Injected failure in {name}")
+                yield
+            finally:
+                self._in_flight -= 1
+
+    async def list_locations(
+        self, list_locations_request: dp.ListLocationsRequest
+    ) -> dp.ListLocationsResponse:
+        """List the locations, optionally filtered by type."""
+        async with self._rpc("list_locations"):
+            types = set(list_locations_request.location_type_filter)
+            return dp.ListLocationsResponse(
+                locations=[
+                    loc
+                    for loc in self.locations.values()
+                    if not types or loc.location_type in types
+                ]
+            )
+
+    async def create_location(
+        self, create_location_request: dp.CreateLocationRequest
+    ) -> dp.CreateLocationResponse:
+        """Create a location from its name, capacity and WKT point."""
+        async with self._rpc("create_location"):
+            req = create_location_request
+            if req.location_name in self.locations:
+                raise GRPCError(
+                    Status.ALREADY_EXISTS, f"Location {req.location_name!r} already exists"
+                )
+            match = _WKT_POINT.match(req.geometry_wkt)
+            if match is None:
+                raise GRPCError(Status.INVALID_ARGUMENT, f"Invalid WKT {req.geometry_wkt!r}")
+            summary = self.add_location(
+                req.location_name,
+                req.effective_capacity_watts,
+                latitude=float(match["lat"]),
+                longitude=float(match["lon"]),
+                location_type=req.location_type,
+            )
+            return dp.CreateLocationResponse(location_uuid=summary.location_uuid)
+
+    async def get_observations_as_timeseries(
+        self, get_observations_as_timeseries_request: dp.GetObservationsAsTimeseriesRequest
+    ) -> dp.GetObservationsAsTimeseriesResponse:
+        """Return a constant half-capacity observation every `observation_interval_minutes`."""
+        async with self._rpc("get_observations_as_timeseries"):
+            req = get_observations_as_timeseries_request
+            summary = next(
+                (s for s in self.locations.values() if s.location_uuid == req.location_uuid),
+                None,
+            )
+            if summary is None:
+                raise GRPCError(Status.NOT_FOUND, f"No location {req.location_uuid}")
+
+            step = dt.timedelta(minutes=self.config.observation_interval_minutes)
+            values = []
+            t = req.time_window.start_timestamp_utc
+            while t < req.time_window.end_timestamp_utc:
+                values.append(
+                    dp.GetObservationsAsTimeseriesResponseValue(
+                        timestamp_utc=t,
+                        value_fraction=0.5,
+                        effective_capacity_watts=summary.effective_capacity_watts,
+                    )
+                )
+                t += step
+            return dp.GetObservationsAsTimeseriesResponse(values=values)
+
+    async def list_forecasters(
+        self, list_forecasters_request: dp.ListForecastersRequest
+    ) -> dp.ListForecastersResponse:
+        """List the forecasters, optionally filtered by name."""
+        async with self._rpc("list_forecasters"):
+            names = set(list_forecasters_request.forecaster_names_filter)
+            return dp.ListForecastersResponse(
+                forecasters=[
+                    f for f in self.forecasters.values() if not names or f.forecaster_name in names
+                ]
+            )
+
+    async def create_forecaster(
+        self, create_forecaster_request: dp.CreateForecasterRequest
+    ) -> dp.CreateForecasterResponse:
+        """Create a forecaster."""
+        async with self._rpc("create_forecaster"):
+            req = create_forecaster_request
+            if req.name in self.forecasters:
+                raise GRPCError(Status.ALREADY_EXISTS, f"Forecaster {req.name!r} already exists")
+            forecaster = dp.Forecaster(forecaster_name=req.name, forecaster_version=req.version)
+            self.forecasters[req.name] = forecaster
+            return dp.CreateForecasterResponse(forecaster=forecaster)
+
+    async def update_forecaster(
+        self, update_forecaster_request: dp.UpdateForecasterRequest
+    ) -> dp.UpdateForecasterResponse:
+        """Bump the version of an existing forecaster."""
+        async with self._rpc("update_forecaster"):
+            req = update_forecaster_request
+            if req.name not in self.forecasters:
+                raise GRPCError(Status.NOT_FOUND, f"No forecaster {req.name!r}")
+            forecaster = dp.Forecaster(forecaster_name=req.name, forecaster_version=req.new_version)
+            self.forecasters[req.name] = forecaster
+            return dp.UpdateForecasterResponse(forecaster=forecaster)
+
+    async def create_forecast(
+        self, create_forecast_request: dp.CreateForecastRequest
+    ) -> dp.CreateForecastResponse:
+        """Record a forecast for an existing location and forecaster."""
+        async with self._rpc("create_forecast"):
+            req = create_forecast_request
+            if not any(s.location_uuid == req.location_uuid for s in self.locations.values()):
+                raise GRPCError(Status.NOT_FOUND, f"No location {req.location_uuid}")
+            if req.forecaster.forecaster_name not in self.forecasters:
+                raise GRPCError(
+                    Status.NOT_FOUND, f"No forecaster {req.forecaster.forecaster_name!r}"
+                )
+            self.forecast_values[req.location_uuid] += len(req.values)
+            self.last_forecasts[req.location_uuid] = req
+            return dp.CreateForecastResponse()
+
+
+@contextlib.asynccontextmanager
+async def fake_dataplatform_client(
+    service: FakeDataPlatformDataService,
+) -> AsyncIterator[DataPlatformClient]:
+    """Yield a client talking to `service` in-process, without opening a socket."""
+    async with ChannelFor([service]) as channel:
+        yield dp.DataPlatformDataServiceStub(channel)
+
+
+def _find_free_port(host: str) -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+@contextlib.asynccontextmanager
+async def serve_fake_dataplatform(
+    service: FakeDataPlatformDataService,
+    host: str = "127.0.0.1",
+    port: int = 0,
+) -> AsyncIterator[tuple[str, int]]:
+    """Serve `service` over TCP and yield its (host, port).
+
+    With `port=0` a free port is picked. Point DATA_PLATFORM_HOST / DATA_PLATFORM_PORT at the
+    yielded address to use it through `get_dataplatform_client`.
+    """
+    if port == 0:
+        port = _find_free_port(host)
+
+    server = Server([service])
+    await server.start(host, port)
+    try:
+        yield host, port
+    finally:
+        server.close()
+        await server.wait_closed()
@@ -2,9 +2,12 @@
 Fixtures for testing
 """
 
+import datetime as dt
 import os
 from datetime import datetime, timedelta
+from unittest.mock import patch
 
+import betterproto
 import pytest
 from freezegun import freeze_time
 from pvsite_datamodel.connection import DatabaseConnection
@@ -98,3 +101,33 @@ def db_data(database_connection, now):
             session.add(status)
 
         session.commit()
+
+
+@pytest.fixture(scope="module")
+def unfreeze_betterproto():
+    """Patch betterproto's datetime serialization and deserialization during freeze_time.
+
+    The session-scoped autouse `now` fixture above uses freeze_time, which
+    replaces the global datetime class with FakeDatetime. When freezegun is active,
+    betterproto's internal default factories and type checks fail because FakeDatetime
+    requires arguments when instantiated.
+    """
+    orig_get_field_default = betterproto.Message._get_field_default
+    orig_postprocess = betterproto.Message._postprocess_single
+
+    def patched_get_field_default(self, field_name: str):
+        try:
+            return orig_get_field_default(self, field_name)
+        except TypeError:
+            return None
+
+    def patched_postprocess(self, wire_type, meta, field_name, value):
+        if meta.proto_type == betterproto.TYPE_MESSAGE:
+            cls = self._betterproto.cls_by_field.get(field_name)
+            if cls is not None and isinstance(cls, type) and issubclass(cls, dt.date):
+                return betterproto._Timestamp().parse(value).to_datetime()
+        return orig_postprocess(self, wire_type, meta, field_name, value)
+
+    with patch.object(betterproto.Message, "_get_field_default", patched_get_field_default), \
+         patch.object(betterproto.Message, "_postprocess_single", patched_postprocess):
+        yield
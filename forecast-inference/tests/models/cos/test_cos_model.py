@@ -1,5 +1,6 @@
-from datetime import UTC, datetime
+from datetime import UTC, datetime, timedelta
 
+import numpy as np
 from psp.typings import X
 
 from forecast_inference.models.cos.cos_model import get_model, make_fake_intensity
@@ -18,3 +19,29 @@ def test_run_cos_model():
     model = get_model(config={}, pv_data_source=None)
     y = model.predict(X(pv_id="1", ts=datetime(2022, 1, 1, 6, tzinfo=UTC)))
     assert len(y.powers) == 48 * 4
+
+
+def test_make_fake_intensities_vectorized():
+    datetimes = [datetime(2021, 6, 1, hour, minute) for hour in range(24) for minute in [0, 17]]
+    expected = [make_fake_intensity(d) for d in datetimes]
+
+    intensities = make_fake_intensity(np.array(datetimes, dtype="datetime64[ns]").reshape(24, 2))
+
+    assert intensities.shape == (24, 2)
+    np.testing.assert_allclose(intensities.ravel(), expected)
+
+
+def test_cos_model_predict_batch():
+    model = get_model(config={}, pv_data_source=None)
+    ts = datetime(2022, 1, 1, 10, 30, tzinfo=UTC)
+
+    powers = model.predict_batch(["1", "2", "3"], ts)
+
+    assert powers.shape == (3, 48 * 4)
+    expected = [
+        make_fake_intensity(ts + timedelta(minutes=end - start))
+        for start, end in model.config.horizons
+    ]
+    np.testing.assert_allclose(powers[0], expected)
+    for row in powers:
+        np.testing.assert_array_equal(row, model.predict(X(pv_id="1", ts=ts)).powers)
@@ -0,0 +1,83 @@
+import datetime as dt
+import time
+
+import numpy as np
+import pyproj
+import pytest
+import xarray as xr
+from psp.typings import X
+
+from forecast_inference.models.cos.cos_model import get_model as get_cos_model
+from forecast_inference.models.cos.synthetic_model import SyntheticFailure, get_model
+
+_NWP_CONFIG = {
+    "cls": "psp.data_sources.nwp.NwpDataSource",
+    "args": ["tests/fixtures/nwp_fixture.zarr"],
+    "kwargs": {
+        "time_dim_name": "init_time",
+        "value_name": "UKV",
+        "y_is_ascending": False,
+        "coord_system": 27700,
+    },
+}
+
+
+class _FakePvDataSource:
+    def __init__(self):
+        self.num_reads = 0
+        self.lat, self.lon = pyproj.Transformer.from_crs(27700, 4326).transform(190000, 300000)
+
+    def get(self, pv_ids, start_ts=None, end_ts=None):
+        self.num_reads += 1
+        return xr.Dataset(coords={"latitude": self.lat, "longitude": self.lon})
+
+
+def test_synthetic_model_costs():
+    pv_data_source = _FakePvDataSource()
+    config = {
+        "synthetic": {"cpu_ms": 50, "pv_reads": 2, "nwp_reads": 3, "num_horizons": 8},
+        "nwp": _NWP_CONFIG,
+    }
+    model = get_model(config, pv_data_source)
+    nwp_data_source = model._nwp_data_sources["ukv"]
+    nwp_reads = []
+    get_nwp = nwp_data_source.get
+    nwp_data_source.get = lambda **kwargs: nwp_reads.append(kwargs) or get_nwp(**kwargs)
+
+    ts = dt.datetime(2020, 1, 2, 12)
+    t0 = time.thread_time()
+    y = model.predict(X(pv_id="1", ts=ts))
+
+    assert time.thread_time() - t0 >= 0.05
+    assert pv_data_source.num_reads == 2
+    assert len(nwp_reads) == 3
+    assert nwp_reads[0]["nearest_lat"] == pv_data_source.lat
+    # Same values as the cos model.
+    np.testing.assert_array_equal(
+        y.powers, get_cos_model({}, None).predict(X(pv_id="1", ts=ts)).powers[:8]
+    )
+
+
+def test_synthetic_model_failures():
+    config = {"synthetic": {"failure_rate": 0.3}}
+    model = get_model(config, None)
+    ts = dt.datetime(2020, 1, 2, 12)
+
+    def _failed():
+        failed = set()
+        for pv_id in range(1000):
+            try:
+                model.predict(X(pv_id=str(pv_id), ts=ts))
+            except SyntheticFailure:
+                failed.add(pv_id)
+        return failed
+
+    failed = _failed()
+    assert 250 < len(failed) < 350
+    # The same sites fail every time.
+    assert _failed() == failed
+
+
+def test_synthetic_model_nwp_reads_need_pv_reads():
+    with pytest.raises(ValueError):
+        get_model({"synthetic": {"nwp_reads": 1}, "nwp": _NWP_CONFIG}, None)
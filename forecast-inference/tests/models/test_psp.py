@@ -1,13 +1,23 @@
+import datetime as dt
+import inspect
 import os
 
+import numpy as np
+import pandas as pd
+import pytest
 import sqlalchemy as sa
+import xarray as xr
 import yaml
+from psp.models import recent_history
 from psp.typings import X
 from pvsite_datamodel.connection import DatabaseConnection
 from pvsite_datamodel.sqlmodels import LocationSQL
 
+from forecast_inference.data.cached_nwp_data_source import CachedNwpDataSource
+from forecast_inference.data.nwp_data_sources import load_nwp_data
 from forecast_inference.data.pv_data_sources import DbPvDataSource
-from forecast_inference.models.psp import get_model
+from forecast_inference.models.psp import get_model, precomputed_solar_geometry
+from forecast_inference.models.solar_geometry import SolarGeometry
 
 
 def test_get_model(now, database_connection):
@@ -27,3 +37,129 @@ def test_get_model(now, database_connection):
     y = model.predict(X(pv_id=str(site.location_uuid), ts=now))
     # The fixture model was trained with 48 * 4 horizons.
     assert y.powers.shape == (48 * 4,)
+
+
+def test_get_model_with_nwp_data():
+    with open("tests/fixtures/model_configs/psp.yaml") as f:
+        config = yaml.safe_load(f)
+    path = config["nwp"]["args"][0]
+
+    nwp_data = load_nwp_data(path, variables_to_keep=config["nwp"]["kwargs"]["variables"])
+    model = get_model(config, None, nwp_data=nwp_data)
+    from_path = get_model(config, None)
+
+    in_memory_source = model._nwp_data_sources["ukv"]
+    assert in_memory_source.raw_data is nwp_data
+    ts = pd.Timestamp(nwp_data.init_time.values[-1]).to_pydatetime() + dt.timedelta(hours=1)
+    kwargs = dict(now=ts, timestamps=[ts], nearest_lat=52.0, nearest_lon=-1.5)
+    xr.testing.assert_allclose(
+        in_memory_source.get(**kwargs), from_path._nwp_data_sources["ukv"].get(**kwargs)
+    )
+
+
+@pytest.mark.parametrize("max_size, preloaded", [("1GB", True), ("1kB", False)])
+def test_get_model_preloads_nwp(max_size, preloaded):
+    with open("tests/fixtures/model_configs/psp.yaml") as f:
+        config = yaml.safe_load(f)
+    now = dt.datetime(2020, 1, 10, 3)
+
+    lazy = get_model(config, None)._nwp_data_sources["ukv"]
+    model = get_model(config | {"nwp_preload_max_size": max_size}, None, now=now)
+    source = model._nwp_data_sources["ukv"]
+
+    assert (source._data.chunks == {}) == preloaded
+    if preloaded:
+        assert list(source._data.time.values) == [np.datetime64("2020-01-10T00:00")]
+    kwargs = dict(now=now, timestamps=[now + dt.timedelta(hours=2)], nearest_lat=52, nearest_lon=-1)
+    xr.testing.assert_identical(source.get(**kwargs), lazy.get(**kwargs))
+
+
+def test_get_model_caches_nwp_features():
+    with open("tests/fixtures/model_configs/psp.yaml") as f:
+        config = yaml.safe_load(f)
+
+    model = get_model(config | {"nwp_feature_cache_size": 100}, None)
+
+    source = model._nwp_data_sources["ukv"]
+    assert isinstance(source, CachedNwpDataSource)
+    assert source._max_entries == 100
+
+
+def test_precomputed_solar_geometry():
+    with open("tests/fixtures/model_configs/psp.yaml") as f:
+        config = yaml.safe_load(f)
+    model = get_model(config, None)
+    now = dt.datetime(2020, 6, 1, 12)
+
+    with precomputed_solar_geometry(model, [(52.0, -1.5)], now) as geometry:
+        # The horizons and the recent power.
+        assert len(geometry._times) == len(model.config.horizons) + 1
+
+
+def test_precomputed_solar_geometry_keeps_the_signature_of_psp():
+    # `precomputed_solar_geometry` rebuilds `_get_features` from its code: review it when this
+    # changes.
+    get_features = recent_history.RecentHistoryModel._get_features
+    assert list(inspect.signature(get_features).parameters) == ["self", "x", "is_training"]
+
+    with open("tests/fixtures/model_configs/psp.yaml") as f:
+        config = yaml.safe_load(f)
+    model = get_model(config, None)
+
+    with precomputed_solar_geometry(model, [(52.0, -1.5)], dt.datetime(2020, 6, 1, 12)):
+        patched = model._get_features
+        assert inspect.signature(patched) == inspect.signature(get_features.__get__(model))
+        assert patched.__qualname__ == get_features.__qualname__
+        assert patched.__kwdefaults__ == get_features.__kwdefaults__
+        assert patched.__wrapped__ is get_features
+
+
+class _Irradiance(Exception):
+    """Which `get_irradiance` was called."""
+
+
+class _FakePvDataSource:
+    def as_available_at(self, ts):
+        return self
+
+    def get(self, pv_ids, start_ts=None, end_ts=None):
+        ts = pd.date_range(start_ts, end_ts, freq="15min")
+        return xr.Dataset(
+            {"power": ("ts", np.ones(len(ts))), "capacity": ("ts", np.ones(len(ts)))},
+            coords={
+                "ts": ts,
+                "latitude": 52.0,
+                "longitude": -1.5,
+                "factor": 1.0,
+                "tilt": 35.0,
+                "orientation": 180.0,
+            },
+        )
+
+
+def test_precomputed_solar_geometry_is_scoped_to_the_model(monkeypatch):
+    with open("tests/fixtures/model_configs/psp.yaml") as f:
+        config = yaml.safe_load(f)
+    model, other_model = get_model(config, None), get_model(config, None)
+    for m in [model, other_model]:
+        m._pv_data_source = _FakePvDataSource()
+    now = dt.datetime(2020, 6, 1, 12)
+
+    def _get_irradiance(source):
+        def _raise(*args, **kwargs):
+            raise _Irradiance(source)
+
+        return _raise
+
+    monkeypatch.setattr(recent_history, "get_irradiance", _get_irradiance("psp"))
+    monkeypatch.setattr(SolarGeometry, "get_irradiance", _get_irradiance("geometry"))
+
+    def _used_irradiance(m):
+        with pytest.raises(_Irradiance) as e:
+            m.get_features(X(pv_id="1", ts=now))
+        return e.value.args[0]
+
+    with precomputed_solar_geometry(model, [(52.0, -1.5)], now):
+        assert _used_irradiance(model) == "geometry"
+        assert _used_irradiance(other_model) == "psp"
+    assert _used_irradiance(model) == "psp"
@@ -0,0 +1,85 @@
+import logging
+import pathlib
+import pickle
+
+import fsspec
+import numpy as np
+import pytest
+from psp.serialization import load_model as load_pickled_model
+
+from forecast_inference.models.cos.cos_model import get_model as get_cos_model
+from forecast_inference.models.serialization import (
+    convert_pickled_model,
+    load_model,
+    save_model,
+)
+
+_PSP_MODEL = "tests/fixtures/psp_model_fixture.pkl"
+
+
+def test_save_and_load_model(tmp_path):
+    model = get_cos_model({}, None)
+    model.weights = np.arange(100_000, dtype=np.float64)
+    model.small_weights = np.arange(10)
+    save_model(model, tmp_path / "model", min_buffer_size="64kB")
+
+    loaded = load_model(str(tmp_path / "model"))
+
+    assert type(loaded) is type(model)
+    np.testing.assert_array_equal(loaded.weights, model.weights)
+    np.testing.assert_array_equal(loaded.small_weights, model.small_weights)
+    # Only the large array is memory-mapped.
+    assert not loaded.weights.flags.owndata
+    assert (tmp_path / "model" / "buffers.bin").stat().st_size == model.weights.nbytes
+    # Writing in it doesn't change the artifact.
+    loaded.weights[0] = -1
+    np.testing.assert_array_equal(load_model(str(tmp_path / "model")).weights, model.weights)
+
+
+def test_convert_pickled_model(tmp_path):
+    convert_pickled_model(_PSP_MODEL, tmp_path / "model", min_buffer_size=0)
+
+    loaded = load_model(str(tmp_path / "model"))
+    expected = load_pickled_model(_PSP_MODEL)
+
+    assert pickle.dumps(loaded.__dict__) == pickle.dumps(expected.__dict__)
+    # Pickles are still supported.
+    assert pickle.dumps(load_model(_PSP_MODEL).__dict__) == pickle.dumps(expected.__dict__)
+
+
+@pytest.mark.parametrize("artifact", [True, False])
+def test_remote_model_is_cached(tmp_path, caplog, artifact):
+    caplog.set_level(logging.INFO)
+    fs = fsspec.filesystem("memory")
+    if artifact:
+        convert_pickled_model(_PSP_MODEL, tmp_path / "model")
+        fs.put(str(tmp_path / "model"), "/models/model", recursive=True)
+        remote_path = "memory://models/model"
+    else:
+        fs.put(_PSP_MODEL, "/models/model.pkl")
+        remote_path = "memory://models/model.pkl"
+    cache_dir = tmp_path / "cache"
+
+    def _cached_files() -> list[pathlib.Path]:
+        return sorted(f for f in cache_dir.rglob("*") if f.is_file())
+
+    load_model(remote_path, cache_dir=cache_dir)
+    assert "Cached the model" in caplog.text
+    files = _cached_files()
+    assert len(files) == (3 if artifact else 1)
+
+    caplog.clear()
+    load_model(remote_path, cache_dir=cache_dir)
+    assert "Using the cached model" in caplog.text
+    assert _cached_files() == files
+
+    # A new version of the model replaces the old one.
+    caplog.clear()
+    fs.pipe(f"{remote_path}/model.pkl" if artifact else remote_path, b"corrupted")
+    with pytest.raises(pickle.UnpicklingError):
+        load_model(remote_path, cache_dir=cache_dir)
+    assert "Cached the model" in caplog.text
+    assert len(_cached_files()) == len(files)
+    assert _cached_files() != files
+
+    fs.rm("/models", recursive=True)
@@ -0,0 +1,77 @@
+import datetime as dt
+
+import h5py
+import numpy as np
+import pandas as pd
+import pytest
+from psp import pv
+from pvlib import clearsky
+
+from forecast_inference.models import solar_geometry
+from forecast_inference.models.solar_geometry import SolarGeometry, _linke_turbidity
+
+_NOW = dt.datetime(2021, 6, 1, 4)
+_TIMESTAMPS = [_NOW + dt.timedelta(minutes=15 * i + 7.5) for i in range(4 * 48)]
+_SITES = [(51.5012, -1.2034), (51.5034, -1.2011), (55.9, -3.2)]
+
+
+@pytest.mark.parametrize("decimals, num_locations", [(None, 3), (2, 2), (1, 2)])
+def test_same_as_psp(decimals, num_locations):
+    geometry = SolarGeometry(_SITES, _TIMESTAMPS, decimals=decimals)
+    assert len(geometry._row_of_coordinates) == num_locations
+
+    for lat, lon in _SITES:
+        kwargs = dict(lat=lat, lon=lon, tilt=30, orientation=170)
+        expected = pv.get_irradiance(timestamps=_TIMESTAMPS[10:20], **kwargs)
+        got = geometry.get_irradiance(timestamps=_TIMESTAMPS[10:20], **kwargs)
+        if decimals is None:
+            pd.testing.assert_frame_equal(got, expected)
+        else:
+            # Within a few W/m^2 of the actual location.
+            pd.testing.assert_frame_equal(got, expected, atol=5, check_exact=False)
+
+
+def test_unknown_sites_and_timestamps(monkeypatch):
+    geometry = SolarGeometry(_SITES[:1], _TIMESTAMPS, decimals=2)
+    calls = []
+    get_irradiance = pv.get_irradiance
+    monkeypatch.setattr(
+        pv, "get_irradiance", lambda **kwargs: calls.append(kwargs) or get_irradiance(**kwargs)
+    )
+
+    for lat, lon, timestamps in [
+        (*_SITES[2], _TIMESTAMPS),
+        (*_SITES[0], [_NOW - dt.timedelta(hours=1)]),
+    ]:
+        kwargs = dict(lat=lat, lon=lon, timestamps=timestamps, tilt=30, orientation=170)
+        pd.testing.assert_frame_equal(geometry.get_irradiance(**kwargs), get_irradiance(**kwargs))
+    assert len(calls) == 2
+
+
+def test_no_sites():
+    geometry = SolarGeometry([], _TIMESTAMPS)
+    lat, lon = _SITES[0]
+    kwargs = dict(lat=lat, lon=lon, timestamps=_TIMESTAMPS, tilt=30, orientation=170)
+    pd.testing.assert_frame_equal(geometry.get_irradiance(**kwargs), pv.get_irradiance(**kwargs))
+
+
+def test_linke_turbidity(monkeypatch):
+    # Across a year boundary, for the interpolation between months.
+    times = pd.date_range("2020-12-30", "2021-01-02", freq="6h")
+    locations = [(51.5012, -1.2034), (51.5034, -1.2011), (55.9, -3.2), (-33.9, 151.2)]
+
+    opened = []
+    h5py_file = h5py.File
+
+    def _file(*args, **kwargs):
+        opened.append(args)
+        return h5py_file(*args, **kwargs)
+
+    monkeypatch.setattr(solar_geometry.h5py, "File", _file)
+    got = _linke_turbidity(times, locations)
+    assert len(opened) == 1
+
+    expected = np.concatenate(
+        [clearsky.lookup_linke_turbidity(times, lat, lon).to_numpy() for lat, lon in locations]
+    )
+    np.testing.assert_array_equal(got, expected)
@@ -0,0 +1,35 @@
+import pytest
+from freezegun import freeze_time
+
+from forecast_inference.scripts.benchmark_dataplatform import main
+from forecast_inference.utils.testing import run_click_script
+
+
+@pytest.mark.usefixtures("unfreeze_betterproto")
+def test_benchmark_dataplatform(monkeypatch, capsys, now):
+    """Make sure the script properly runs and reports the RPCs."""
+    # The script points the Data Platform client at its local server, make sure we restore the
+    # environment afterwards.
+    monkeypatch.setenv("DATA_PLATFORM_HOST", "localhost")
+    monkeypatch.setenv("DATA_PLATFORM_PORT", "50051")
+
+    args = [
+        "--num-sites",
+        "5",
+        "--num-horizons",
+        "4",
+        "--history-hours",
+        "1",
+        "--latency-ms",
+        "0",
+        "--jitter-ms",
+        "0",
+    ]
+    # Timings need the clock to tick.
+    with freeze_time(now, tick=True):
+        result = run_click_script(main, args, catch_exceptions=False)
+
+    assert result.exit_code == 0
+    output = capsys.readouterr().out
+    assert "create_forecast" in output
+    assert "get_observations_as_timeseries" in output
@@ -0,0 +1,15 @@
+from freezegun import freeze_time
+
+from forecast_inference.scripts.benchmark_model_loading import main
+from forecast_inference.utils.testing import run_click_script
+
+
+def test_benchmark_model_loading(capsys, now):
+    args = ["--model-path", "tests/fixtures/psp_model_fixture.pkl", "--repeat", "2"]
+    # Timings need the clock to tick.
+    with freeze_time(now, tick=True):
+        result = run_click_script(main, args, catch_exceptions=False)
+
+    assert result.exit_code == 0
+    lines = capsys.readouterr().out.strip().splitlines()
+    assert [line.split()[0] for line in lines[-2:]] == ["pickle", "artifact"]
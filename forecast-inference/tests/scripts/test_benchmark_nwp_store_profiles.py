@@ -0,0 +1,26 @@
+from freezegun import freeze_time
+
+from forecast_inference.scripts.benchmark_nwp_store_profiles import main
+from forecast_inference.utils.testing import run_click_script
+
+
+def test_benchmark_nwp_store_profiles(capsys, now):
+    args = [
+        "--source",
+        "tests/fixtures/nwp_fixture.zarr",
+        "--profile",
+        "default",
+        "--profile",
+        "site_read",
+        "--variables",
+        "dswrf,t",
+        "--num-sites",
+        "3",
+    ]
+    # Timings need the clock to tick.
+    with freeze_time(now, tick=True):
+        result = run_click_script(main, args, catch_exceptions=False)
+
+    assert result.exit_code == 0
+    lines = capsys.readouterr().out.strip().splitlines()
+    assert [line.split()[0] for line in lines[-2:]] == ["default", "site_read"]
@@ -0,0 +1,17 @@
+from freezegun import freeze_time
+
+from forecast_inference.scripts.benchmark_prepare_forecast_values import main
+from forecast_inference.utils.testing import run_click_script
+
+
+def test_benchmark_prepare_forecast_values(capsys, now):
+    """Make sure the script properly runs and that the implementations agree."""
+    args = ["--num-sites", "3", "--num-horizons", "8", "--repeats", "1"]
+    # Timings need the clock to tick.
+    with freeze_time(now, tick=True):
+        result = run_click_script(main, args, catch_exceptions=False)
+
+    assert result.exit_code == 0
+    output = capsys.readouterr().out
+    assert "loop (baseline)" in output
+    assert "vectorized, all sites" in output
@@ -0,0 +1,13 @@
+from forecast_inference.models.serialization import load_model
+from forecast_inference.scripts.convert_model import main
+from forecast_inference.utils.testing import run_click_script
+
+
+def test_convert_model(tmp_path):
+    output = tmp_path / "model"
+    args = ["--input", "tests/fixtures/psp_model_fixture.pkl", "--output", str(output)]
+    result = run_click_script(main, args, catch_exceptions=False)
+
+    assert result.exit_code == 0
+    assert sorted(f.name for f in output.iterdir()) == ["buffers.bin", "buffers.json", "model.pkl"]
+    assert type(load_model(str(output))).__name__ == "RecentHistoryModel"
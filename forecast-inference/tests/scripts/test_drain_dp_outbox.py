@@ -0,0 +1,42 @@
+import datetime as dt
+import logging
+
+import pytest
+from freezegun.api import real_datetime
+
+from forecast_inference.data_platform import Outbox, enqueue_forecast
+from forecast_inference.scripts.drain_dp_outbox import main
+from forecast_inference.utils.fake_dataplatform import (
+    FakeDataPlatformDataService,
+    fake_dataplatform_client,
+)
+from forecast_inference.utils.testing import run_click_script
+
+
+@pytest.mark.usefixtures("unfreeze_betterproto")
+def test_drain_dp_outbox(tmp_path, monkeypatch, caplog):
+    caplog.set_level(logging.INFO)
+    init_time = real_datetime(2024, 6, 1, 12, tzinfo=dt.UTC)
+    with Outbox(tmp_path) as outbox:
+        enqueue_forecast(
+            outbox,
+            rows=[{"start_utc": init_time, "forecast_power_kw": 1.0, "horizon_minutes": 0}],
+            client_location_name="site",
+            model_tag="pv-site-production",
+            init_time_utc=init_time,
+            capacity_kw=2.0,
+            latitude=51.5,
+            longitude=-1.8,
+        )
+
+    service = FakeDataPlatformDataService()
+    monkeypatch.setattr(
+        "forecast_inference.scripts.drain_dp_outbox.get_dataplatform_client",
+        lambda: fake_dataplatform_client(service),
+    )
+
+    result = run_click_script(main, ["--outbox-dir", str(tmp_path)], catch_exceptions=False)
+
+    assert result.exit_code == 0
+    assert service.rpc_counts["create_forecast"] == 1
+    assert "pending_requests=0" in caplog.text
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import pathlib
 from datetime import datetime
@@ -7,6 +8,13 @@ from freezegun import freeze_time
 from pvsite_datamodel.sqlmodels import ForecastSQL, ForecastValueSQL
 
 from forecast_inference.app import main
+from forecast_inference.data.pv_data_sources import DbPvDataSource
+from forecast_inference.data_platform import Outbox, drain_outbox
+from forecast_inference.forecast_batch import ForecastBatch
+from forecast_inference.utils.fake_dataplatform import (
+    FakeDataPlatformDataService,
+    fake_dataplatform_client,
+)
 from forecast_inference.utils.testing import run_click_script
 
 CONFIG_FIXTURES = [
@@ -49,6 +57,174 @@ def test_app(config_file: pathlib.Path, write_to_db: bool, db_session, now):
             assert num_rows == num_rows_before[table_name]
 
 
+def _config_with(tmp_path: pathlib.Path, config_file: str, extra: str) -> pathlib.Path:
+    """Copy of a config fixture, with some more settings."""
+    path = tmp_path / pathlib.Path(config_file).name
+    path.write_text(pathlib.Path(config_file).read_text() + extra)
+    return path
+
+
+def test_app_with_nwp_in_memory(tmp_path, monkeypatch, now, caplog):
+    caplog.set_level(logging.INFO)
+    monkeypatch.setenv("NWP_ZARR_PATH", "tests/fixtures/nwp_fixture.zarr")
+    # The options of the local store are ignored when we don't write it, and the dask options are
+    # used to load the NWP data.
+    config_file = _config_with(
+        tmp_path,
+        "tests/fixtures/model_configs/psp.yaml",
+        """
+nwp_conversion:
+  in_memory: true
+  incremental: true
+  skip_unchanged: true
+  store_profile: site_read
+  retention: 2D
+  init_time_lookback: 12h
+  scheduler: synchronous
+  num_workers: 2
+  memory_limit: 4GB
+""",
+    )
+
+    cmd_args = ["--config", str(config_file), "--date", now.strftime("%Y-%m-%d-%H-%M")]
+    result = run_click_script(main, cmd_args)
+    assert result.exit_code == 0
+
+    assert "Keeping 2 of 27 NWP init_times" in caplog.text
+    assert "MB of NWP data in memory (synchronous, 2 workers)" in caplog.text
+
+
+def test_app_converts_nwp_to_local_path(tmp_path, monkeypatch, now, caplog):
+    caplog.set_level(logging.INFO)
+    monkeypatch.setenv("NWP_ZARR_PATH", "tests/fixtures/nwp_fixture.zarr")
+    local_path = tmp_path / "nwp.zarr"
+    config_file = _config_with(
+        tmp_path,
+        "tests/fixtures/model_configs/psp.yaml",
+        f"""
+nwp_conversion:
+  local_path: {local_path}
+""",
+    )
+    # The model reads the local store rather than the fixture.
+    config_file.write_text(
+        config_file.read_text().replace("tests/fixtures/nwp_fixture.zarr", str(local_path))
+    )
+
+    cmd_args = ["--config", str(config_file), "--date", now.strftime("%Y-%m-%d-%H-%M")]
+    result = run_click_script(main, cmd_args)
+    assert result.exit_code == 0
+
+    assert "NWP conversion | cache_hit=False" in caplog.text
+    assert (local_path / ".zmetadata").exists()
+
+
+def test_app_with_synthetic_model_and_nwp(tmp_path, monkeypatch, now, caplog):
+    caplog.set_level(logging.INFO)
+    monkeypatch.setenv("NWP_ZARR_PATH", "tests/fixtures/nwp_fixture.zarr")
+    config_file = _config_with(
+        tmp_path,
+        "tests/fixtures/model_configs/synthetic.yaml",
+        """
+nwp_preload_max_size: 1GB
+nwp_conversion:
+  in_memory: true
+  init_time_lookback: 12h
+""",
+    )
+
+    cmd_args = [
+        "--config",
+        str(config_file),
+        "--date",
+        now.strftime("%Y-%m-%d-%H-%M"),
+        "--raise-on-failure",
+    ]
+    result = run_click_script(main, cmd_args)
+    assert result.exit_code == 0
+
+    assert "MB of NWP data in memory" in caplog.text
+    assert "Errored on 0 PV sites" in caplog.text
+
+
+@pytest.fixture()
+def named_sites(monkeypatch):
+    """Give every site a client_location_name, which the Data Platform needs."""
+    get_site_metadata = DbPvDataSource.get_site_metadata
+
+    def _get_site_metadata(self):
+        return {
+            pv_id: meta | {"client_location_name": f"site {pv_id}"}
+            for pv_id, meta in get_site_metadata(self).items()
+        }
+
+    monkeypatch.setattr(DbPvDataSource, "get_site_metadata", _get_site_metadata)
+
+
+@pytest.mark.usefixtures("unfreeze_betterproto", "named_sites")
+def test_app_saves_to_data_platform(monkeypatch, now, caplog):
+    caplog.set_level(logging.INFO)
+    service = FakeDataPlatformDataService()
+    monkeypatch.setenv("SAVE_TO_DATA_PLATFORM", "true")
+    monkeypatch.setenv("DATA_PLATFORM_MAX_CONCURRENT_SAVES", "2")
+    monkeypatch.setattr(
+        "forecast_inference.app.get_dataplatform_client",
+        lambda: fake_dataplatform_client(service),
+    )
+
+    cmd_args = [
+        "--config",
+        "tests/fixtures/model_configs/cos.yaml",
+        "--date",
+        now.strftime("%Y-%m-%d-%H-%M"),
+        "--raise-on-failure",
+    ]
+    result = run_click_script(main, cmd_args)
+    assert result.exit_code == 0
+
+    # One forecast per site, all sent after resolving the forecaster once.
+    assert service.rpc_counts["create_forecast"] == len(service.locations) > 0
+    assert service.rpc_counts["list_forecasters"] == 1
+    assert "Errored on 0 PV sites" in caplog.text
+
+
+@pytest.mark.usefixtures("unfreeze_betterproto", "named_sites")
+def test_app_saves_to_outbox(tmp_path, monkeypatch, now):
+    monkeypatch.setenv("SAVE_TO_DATA_PLATFORM", "true")
+    monkeypatch.setenv("DATA_PLATFORM_OUTBOX_DIR", str(tmp_path))
+
+    def _no_client():
+        raise AssertionError("The forecasts should go to the outbox")
+
+    monkeypatch.setattr("forecast_inference.app.get_dataplatform_client", _no_client)
+
+    cmd_args = [
+        "--config",
+        "tests/fixtures/model_configs/cos.yaml",
+        "--date",
+        now.strftime("%Y-%m-%d-%H-%M"),
+        "--raise-on-failure",
+    ]
+    result = run_click_script(main, cmd_args)
+    assert result.exit_code == 0
+
+    outbox = Outbox(tmp_path)
+    num_forecasts = outbox.metrics().pending_requests
+    assert num_forecasts > 0
+
+    # The forecasts are sent when draining the outbox.
+    service = FakeDataPlatformDataService()
+
+    async def _drain():
+        async with fake_dataplatform_client(service) as client:
+            return await drain_outbox(outbox, client)
+
+    stats = asyncio.run(_drain())
+    assert stats.sent == num_forecasts
+    assert service.rpc_counts["create_forecast"] == len(service.locations) == num_forecasts
+    assert outbox.metrics().pending_requests == 0
+
+
 def test_app_can_not_use_both_date_and_round_to_minutes(now):
     cmd_args = [
         "--config",
@@ -116,3 +292,61 @@ def test_app_no_round_date(round_to, timestamp, expected_timestamp, caplog):
 
         # Check that we logged the right "now" timestamp.
         assert f"Making predictions with now={expected_timestamp}" in caplog.text
+
+
+def test_app_with_workers(db_session, now, caplog):
+    caplog.set_level(logging.INFO)
+    num_forecasts_before = db_session.query(ForecastSQL).count()
+
+    cmd_args = [
+        "--config",
+        # Reads the PV data in the worker processes.
+        "tests/fixtures/model_configs/synthetic.yaml",
+        "--date",
+        now.strftime("%Y-%m-%d-%H-%M"),
+        "--write-to-db",
+        "--workers",
+        "2",
+        "--raise-on-failure",
+    ]
+    result = run_click_script(main, cmd_args)
+    assert result.exit_code == 0
+
+    assert "Making the predictions in 2 processes" in caplog.text
+    assert "Errored on 0 PV sites" in caplog.text
+    assert db_session.query(ForecastSQL).count() > num_forecasts_before
+
+
+def test_app_with_workers_and_a_failing_site(monkeypatch, now, caplog):
+    caplog.set_level(logging.INFO)
+
+    # The forecast of the first site can't be made, after its prediction.
+    failing_pv_ids = []
+    list_pv_ids = DbPvDataSource.list_pv_ids
+    from_predictions = ForecastBatch.from_predictions
+
+    def _list_pv_ids(self):
+        pv_ids = list_pv_ids(self)
+        failing_pv_ids[:] = pv_ids[:1]
+        return pv_ids
+
+    def _from_predictions(timestamp, horizons, pv_ids, powers):
+        if pv_ids == failing_pv_ids:
+            raise ValueError("Invalid prediction")
+        return from_predictions(timestamp, horizons, pv_ids=pv_ids, powers=powers)
+
+    monkeypatch.setattr(DbPvDataSource, "list_pv_ids", _list_pv_ids)
+    monkeypatch.setattr(ForecastBatch, "from_predictions", _from_predictions)
+
+    cmd_args = [
+        "--config",
+        "tests/fixtures/model_configs/cos.yaml",
+        "--date",
+        now.strftime("%Y-%m-%d-%H-%M"),
+        "--workers",
+        "2",
+    ]
+    result = run_click_script(main, cmd_args)
+    assert result.exit_code == 0
+
+    assert "Errored on 1 PV sites" in caplog.text
@@ -0,0 +1,43 @@
+import datetime as dt
+
+import numpy as np
+
+from forecast_inference.forecast_batch import ForecastBatch
+
+
+def _batch():
+    return ForecastBatch.from_predictions(
+        dt.datetime(2024, 6, 1, 12, 5),
+        horizons=[(0, 15), (15, 30), (30, 45)],
+        pv_ids=["a", "b"],
+        powers=[np.array([1.23456, 2.0, 3.0]), np.array([4.0, 5.0, 6.00049])],
+    )
+
+
+def test_from_predictions():
+    batch = _batch()
+
+    assert batch.num_sites == 2
+    assert batch.num_horizons == 3
+    assert len(batch) == 6
+    np.testing.assert_array_equal(batch.horizon_start_minutes, [0, 15, 30])
+    np.testing.assert_array_equal(batch.powers_kw, [[1.235, 2, 3], [4, 5, 6]])
+
+
+def test_start_and_end_times():
+    batch = _batch()
+
+    assert batch.start_utc.tolist() == [
+        dt.datetime(2024, 6, 1, 12, 5),
+        dt.datetime(2024, 6, 1, 12, 20),
+        dt.datetime(2024, 6, 1, 12, 35),
+    ]
+    assert batch.end_utc.tolist()[-1] == dt.datetime(2024, 6, 1, 12, 50)
+
+
+def test_site():
+    site = _batch().site(1)
+
+    assert site.pv_ids == ["b"]
+    np.testing.assert_array_equal(site.powers_kw, [[4, 5, 6]])
+    np.testing.assert_array_equal(site.horizon_end_minutes, [15, 30, 45])
@@ -0,0 +1,106 @@
+"""Unit tests for the NWP data source shared by the sites of a pixel."""
+
+import datetime as dt
+
+import pyproj
+import pytest
+import xarray as xr
+import yaml
+from psp.data_sources.nwp import NwpDataSource
+
+from forecast_inference.data.cached_nwp_data_source import CachedNwpDataSource
+
+_NOW = dt.datetime(2020, 1, 10, 3)
+_TIMESTAMPS = [_NOW + dt.timedelta(minutes=15 * i) for i in range(0, 48 * 4, 7)]
+
+
+def _lat_lon(x: float, y: float) -> tuple[float, float]:
+    return pyproj.Transformer.from_crs(27700, 4326).transform(x, y)
+
+
+@pytest.fixture()
+def source():
+    with open("tests/fixtures/model_configs/psp.yaml") as f:
+        config = yaml.safe_load(f)
+    return NwpDataSource(*config["nwp"]["args"], **config["nwp"]["kwargs"])
+
+
+# The first two share a pixel.
+_SITES = [_lat_lon(190000, 300000), _lat_lon(195000, 305000), _lat_lon(380000, 100000)]
+
+
+def test_same_as_source(source):
+    cached_source = CachedNwpDataSource(source)
+
+    for now in [_NOW, _NOW + dt.timedelta(hours=1), _NOW + dt.timedelta(hours=12)]:
+        timestamps = [t + (now - _NOW) for t in _TIMESTAMPS]
+        for lat, lon in _SITES:
+            kwargs = dict(now=now, timestamps=timestamps, nearest_lat=lat, nearest_lon=lon)
+            xr.testing.assert_identical(cached_source.get(**kwargs), source.get(**kwargs))
+
+    assert (cached_source.hits, cached_source.misses) == (3, 6)
+    assert cached_source.list_variables() == source.list_variables()
+
+
+def test_hits_skip_the_source(source, monkeypatch):
+    cached_source = CachedNwpDataSource(source)
+    calls = []
+    get = source.get
+
+    def _get(**kwargs):
+        calls.append(kwargs)
+        return get(**kwargs)
+
+    monkeypatch.setattr(source, "get", _get)
+
+    # The same site twice, then a site of the same pixel.
+    for lat, lon in [_SITES[0], _SITES[0], _SITES[1]]:
+        cached_source.get(now=_NOW, timestamps=_TIMESTAMPS, nearest_lat=lat, nearest_lon=lon)
+
+    assert len(calls) == 1
+    assert (cached_source.hits, cached_source.misses) == (2, 1)
+
+
+def test_eviction(source):
+    cached_source = CachedNwpDataSource(source, max_entries=2)
+
+    def _get(site: int, timestamps=_TIMESTAMPS):
+        lat, lon = _SITES[site]
+        cached_source.get(now=_NOW, timestamps=timestamps, nearest_lat=lat, nearest_lon=lon)
+
+    _get(0)
+    _get(2)
+    # Same pixel as the first one, which is now the most recently used.
+    _get(1)
+    # Evicts the second one.
+    _get(0, _TIMESTAMPS[:3])
+    assert (cached_source.hits, cached_source.misses) == (1, 3)
+    _get(1)
+    _get(2)
+    assert (cached_source.hits, cached_source.misses) == (2, 4)
+
+
+def test_other_requests_use_the_source(source):
+    cached_source = CachedNwpDataSource(source)
+    lat, lon = _SITES[0]
+
+    for kwargs in [
+        # Too old for the tolerance.
+        dict(nearest_lat=lat, nearest_lon=lon, tolerance="1h"),
+        dict(min_lat=lat - 1, max_lat=lat + 1, min_lon=lon - 1, max_lon=lon + 1),
+        dict(nearest_lat=lat, nearest_lon=lon, load=False),
+    ]:
+        for _ in range(2):
+            got = cached_source.get(now=_NOW, timestamps=_TIMESTAMPS, **kwargs)
+            expected = source.get(now=_NOW, timestamps=_TIMESTAMPS, **kwargs)
+            if expected is None:
+                assert got is None
+            else:
+                xr.testing.assert_identical(got, expected)
+
+    assert (cached_source.hits, cached_source.misses) == (0, 0)
+
+    with pytest.raises(ValueError):
+        cached_source.get(
+            now=_NOW, timestamps=[_NOW - dt.timedelta(hours=1)], nearest_lat=lat, nearest_lon=lon
+        )
@@ -0,0 +1,115 @@
+"""Unit tests for the read-through cache of zarr stores, with a local directory as remote."""
+
+import pathlib
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from forecast_inference.data.cached_store import CachedStore
+
+
+@pytest.fixture()
+def remote(tmp_path):
+    path = tmp_path / "remote.zarr"
+    ds = xr.Dataset({"a": (("t", "x"), np.arange(40.0).reshape(4, 10))}).chunk({"t": 1})
+    ds.to_zarr(path)
+    return path
+
+
+def test_read_through(remote, tmp_path):
+    cache_dir = tmp_path / "cache"
+
+    store = CachedStore(str(remote), cache_dir)
+    expected = xr.open_zarr(remote).load()
+    xr.testing.assert_identical(xr.open_zarr(store).load(), expected)
+    assert (store.stats.hits, store.stats.misses) == (0, 4)
+    chunk_bytes = sum(f.stat().st_size for f in (remote / "a").glob("[0-9]*"))
+    metadata_bytes = store.stats.bytes_fetched - chunk_bytes
+
+    # The next run reads the chunks from the cache and only fetches the metadata.
+    store = CachedStore(str(remote), cache_dir)
+    xr.testing.assert_identical(xr.open_zarr(store).load(), expected)
+    assert (store.stats.hits, store.stats.misses) == (4, 0)
+    assert store.stats.hit_ratio == 1
+    assert store.stats.bytes_fetched == metadata_bytes
+    assert store.stats.bytes_from_cache == chunk_bytes
+
+
+def test_store_is_read_only(remote, tmp_path):
+    store = CachedStore(str(remote), tmp_path / "cache")
+    with pytest.raises(PermissionError):
+        store["a/0.0"] = b""
+    with pytest.raises(PermissionError):
+        del store["a/0.0"]
+    assert (remote / "a" / "0.0").exists()
+
+
+def test_changed_chunks_are_fetched_again(remote, tmp_path):
+    cache_dir = tmp_path / "cache"
+    xr.open_zarr(CachedStore(str(remote), cache_dir)).load()
+
+    new = xr.Dataset({"a": (("t", "x"), -np.ones((1, 10)))})
+    new.to_zarr(remote, region={"t": slice(2, 3)})
+
+    store = CachedStore(str(remote), cache_dir)
+    assert store.prefetch(list(store)) == 1
+    assert xr.open_zarr(store).a.values[2].tolist() == [-1] * 10
+    assert (store.stats.hits, store.stats.misses) == (3, 1)
+
+
+def test_lru_eviction(remote, tmp_path):
+    cache_dir = tmp_path / "cache"
+    chunk_size = (remote / "a" / "0.0").stat().st_size
+    store = CachedStore(str(remote), cache_dir, max_size=2 * chunk_size)
+
+    for key in ["a/0.0", "a/1.0", "a/0.0", "a/2.0"]:
+        store[key]
+
+    assert store.stats.evicted == 1
+    # "a/1.0" was the least recently used.
+    assert [store.is_cached(f"a/{i}.0") for i in range(4)] == [True, False, True, False]
+
+
+def test_only_the_read_arrays_are_listed(tmp_path, monkeypatch):
+    remote = tmp_path / "remote.zarr"
+    ds = xr.Dataset({name: (("t", "x"), np.zeros((4, 10))) for name in ["a", "b"]})
+    ds.chunk({"t": 1}).to_zarr(remote)
+
+    store = CachedStore(str(remote), tmp_path / "cache")
+    listed = []
+    ls = store._fs.ls
+
+    def _ls(path, **kwargs):
+        listed.append(pathlib.Path(path).relative_to(remote).as_posix())
+        return ls(path, **kwargs)
+
+    monkeypatch.setattr(store._fs, "ls", _ls)
+    store.prefetch(["a/0.0", "a/1.0"])
+    store["a/2.0"]
+    assert "b/0.0" in store
+    assert "a/4.0" not in store
+
+    assert listed == ["a", "b"]
+
+
+def test_lru_index_is_kept_in_memory(remote, tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    chunk_size = (remote / "a" / "0.0").stat().st_size
+    CachedStore(str(remote), cache_dir)["a/0.0"]
+    CachedStore(str(remote), cache_dir)["a/1.0"]
+
+    # The order of the previous runs comes from the cache directory...
+    store = CachedStore(str(remote), cache_dir, max_size=2 * chunk_size)
+
+    # ...which isn't read again when evicting.
+    def _iterdir(self):
+        raise AssertionError("The cache directory was listed")
+
+    monkeypatch.setattr(pathlib.Path, "iterdir", _iterdir)
+    store["a/2.0"]
+    store["a/1.0"]
+    store["a/3.0"]
+
+    assert store.stats.evicted == 2
+    assert [store.is_cached(f"a/{i}.0") for i in range(4)] == [False, True, False, True]
@@ -0,0 +1,350 @@
+"""Unit tests for the conversion of the NWP data to our local store."""
+
+import inspect
+import logging
+import pathlib
+
+import numpy as np
+import pandas as pd
+import pyproj
+import pytest
+import xarray as xr
+
+from forecast_inference.data import nwp_data_sources
+from forecast_inference.data.nwp_data_sources import (
+    LOCAL_STORE_OPTIONS,
+    STORE_PROFILES,
+    NwpConversionOptions,
+    NwpLoadOptions,
+    download_and_add_osgb_to_nwp_data_source,
+    load_nwp_data,
+    nwp_conversion_options,
+    nwp_load_options,
+)
+
+_FIXTURE = "tests/fixtures/nwp_fixture.zarr"
+_VARIABLES = ["dswrf", "lcc", "t"]
+
+
+@pytest.fixture()
+def make_source(tmp_path):
+    """Write a source store with a slice of the fixture's init_times."""
+
+    def _make_source(init_times: slice, name: str = "source.zarr") -> str:
+        path = str(tmp_path / name)
+        xr.open_zarr(_FIXTURE).isel(init_time=init_times).to_zarr(path, mode="w")
+        return path
+
+    return _make_source
+
+
+def _convert(source: str, dest: pathlib.Path, **kwargs) -> xr.Dataset:
+    download_and_add_osgb_to_nwp_data_source(
+        source, str(dest), variables_to_keep=_VARIABLES, **kwargs
+    )
+    return xr.open_zarr(dest).load()
+
+
+def test_incremental_matches_full_conversion(make_source, tmp_path, caplog):
+    caplog.set_level(logging.INFO)
+    dest = tmp_path / "nwp.zarr"
+    _convert(make_source(slice(0, 10)), dest, incremental=True)
+
+    source = make_source(slice(3, 14), "source2.zarr")
+    incremental = _convert(source, dest, incremental=True)
+    assert "Appending 4 init_time(s)" in caplog.text
+    assert "dropping 3 old one(s)" in caplog.text
+    full = _convert(source, tmp_path / "full.zarr")
+
+    xr.testing.assert_identical(incremental, full)
+    assert not (dest / ".update_in_progress").exists()
+
+
+def test_retention(make_source, tmp_path):
+    dest = tmp_path / "nwp.zarr"
+    _convert(make_source(slice(0, 10)), dest, incremental=True, retention="1D")
+    nwp = _convert(
+        make_source(slice(0, 14), "source2.zarr"), dest, incremental=True, retention="1D"
+    )
+
+    init_times = nwp.init_time.values
+    assert init_times[-1] - init_times[0] <= pd.Timedelta("1D")
+    assert init_times[-1] == xr.open_zarr(_FIXTURE).init_time.values[13]
+
+
+@pytest.mark.parametrize("interrupted", [True, False])
+def test_rewrite_when_not_incremental(make_source, tmp_path, interrupted):
+    dest = tmp_path / "nwp.zarr"
+    _convert(make_source(slice(0, 10)), dest)
+    if interrupted:
+        (dest / ".update_in_progress").touch()
+    else:
+        # Different variables: can't append.
+        download_and_add_osgb_to_nwp_data_source(
+            make_source(slice(0, 10)), str(dest), variables_to_keep=["t"]
+        )
+
+    source = make_source(slice(5, 12), "source2.zarr")
+    nwp = _convert(source, dest, incremental=True)
+
+    xr.testing.assert_identical(nwp, _convert(source, tmp_path / "full.zarr"))
+    assert not (dest / ".update_in_progress").exists()
+
+
+def _lat_lon(x: float, y: float) -> tuple[float, float]:
+    return pyproj.Transformer.from_crs(27700, 4326).transform(x, y)
+
+
+@pytest.mark.parametrize(
+    "tiles, expected_x, expected_y",
+    [
+        (False, [185000, 225000, 265000, 305000, 345000, 385000], [375000, 295000, 215000]),
+        (True, [185000, 225000, 345000, 385000], [375000, 295000, 215000]),
+    ],
+)
+def test_crop_to_coordinates(make_source, tmp_path, tiles, expected_x, expected_y):
+    sites = [_lat_lon(190000, 300000), _lat_lon(380000, 290000)]
+
+    nwp = _convert(
+        make_source(slice(0, 2)),
+        tmp_path / "nwp.zarr",
+        crop_to_coordinates=sites,
+        crop_margin_pixels=1,
+        crop_tiles=tiles,
+    )
+
+    assert nwp.x.values.tolist() == expected_x
+    assert nwp.y.values.tolist() == expected_y
+
+
+@pytest.mark.parametrize(
+    "timestamp, lookback, expected",
+    [
+        # Between the 5th and the 6th init_times.
+        (pd.Timestamp("2020-01-03 11:00"), "0h", [4]),
+        (pd.Timestamp("2020-01-03 11:00", tz="UTC"), "12h", [3, 4]),
+        # Before the first init_time: we keep everything.
+        (pd.Timestamp("2019-12-31"), "0h", list(range(10))),
+    ],
+)
+def test_init_times_for_timestamp(make_source, tmp_path, timestamp, lookback, expected):
+    init_times = xr.open_zarr(_FIXTURE).init_time.values
+    nwp = _convert(
+        make_source(slice(0, 10)),
+        tmp_path / "nwp.zarr",
+        timestamp=timestamp.to_pydatetime(),
+        init_time_lookback=lookback,
+    )
+
+    assert nwp.init_time.values.tolist() == init_times[expected].tolist()
+
+
+def test_um_ukv_grid_is_reused(tmp_path, monkeypatch):
+    # The fixture in the format of the new consumer, pretending its grid is in LAEA.
+    source = str(tmp_path / "source.zarr")
+    nwp = xr.open_zarr(_FIXTURE).isel(init_time=slice(0, 2)).rename(UKV="um-ukv")
+    nwp = nwp.rename(x="x_laea", y="y_laea").sel(variable=["dswrf"])
+    nwp = nwp.assign_coords(variable=["downward_shortwave_radiation_flux_gl"])
+    nwp.to_zarr(source, mode="w")
+    monkeypatch.setattr(nwp_data_sources, "_osgb_grids", {})
+
+    dest = tmp_path / "nwp.zarr"
+    download_and_add_osgb_to_nwp_data_source(source, str(dest))
+
+    # Same as transforming the whole grid.
+    xx, yy = np.meshgrid(nwp.x_laea.values, nwp.y_laea.values)
+    x_osgb, y_osgb = nwp_data_sources.laea_to_osgb(xx=xx, yy=yy)
+    converted = xr.open_zarr(dest)
+    x_osgb = x_osgb[0][x_osgb[0] >= 0]
+    np.testing.assert_allclose(converted.x.values, x_osgb)
+    np.testing.assert_allclose(converted.y.values, y_osgb[:, 0])
+    assert converted.variable.values.tolist() == ["dswrf"]
+    assert len(list((tmp_path / "nwp.zarr.grids").glob("*.npz"))) == 1
+
+    # In a new process, the grid is loaded from the file next to the local store.
+    monkeypatch.setattr(nwp_data_sources, "_osgb_grids", {})
+    monkeypatch.setattr(nwp_data_sources, "laea_to_osgb", None)
+    download_and_add_osgb_to_nwp_data_source(source, str(dest))
+    xr.testing.assert_identical(xr.open_zarr(dest).load(), converted.load())
+
+
+def test_skip_unchanged(make_source, tmp_path, caplog, monkeypatch):
+    caplog.set_level(logging.INFO)
+    source = make_source(slice(0, 4))
+    dest = tmp_path / "nwp.zarr"
+
+    def _download(**kwargs):
+        kwargs.setdefault("skip_unchanged", True)
+        return download_and_add_osgb_to_nwp_data_source(
+            source, str(dest), variables_to_keep=_VARIABLES, **kwargs
+        )
+
+    assert not _download().cache_hit
+    converted = xr.open_zarr(dest).load()
+
+    stats = _download()
+    assert stats.cache_hit
+    # The size of the local store, that we would have rewritten.
+    files = [f for f in dest.rglob("*") if f.is_file() and f.name != nwp_data_sources._MANIFEST]
+    assert stats.bytes_saved == sum(f.stat().st_size for f in files)
+    assert "didn't change, skipping" in caplog.text
+    xr.testing.assert_identical(xr.open_zarr(dest).load(), converted)
+
+    # An incremental update wouldn't have written anything.
+    stats = _download(incremental=True)
+    assert stats.cache_hit
+    assert stats.bytes_saved == 0
+
+    # The data of the source isn't fetched for an unchanged source.
+    def _prefetch(self, keys, num_workers):
+        raise AssertionError("The source was prefetched")
+
+    monkeypatch.setattr(nwp_data_sources.CachedStore, "prefetch", _prefetch)
+    assert _download(source_cache_dir=str(tmp_path / "cache")).cache_hit
+    monkeypatch.undo()
+
+    # Different options, or a different source.
+    assert not _download(retention="1D").cache_hit
+    assert not _download(skip_unchanged=False).cache_hit
+    xr.open_zarr(_FIXTURE).isel(init_time=slice(4, 5)).to_zarr(source, append_dim="init_time")
+    assert not _download().cache_hit
+    assert _download().cache_hit
+    assert xr.open_zarr(dest).sizes["init_time"] == 5
+
+
+@pytest.mark.parametrize("store_profile", ["site_read", "uncompressed", "float16"])
+def test_store_profiles(make_source, tmp_path, store_profile):
+    source = make_source(slice(0, 4))
+    default = _convert(source, tmp_path / "default.zarr")
+    dest = tmp_path / "nwp.zarr"
+    nwp = _convert(source, dest, store_profile=store_profile)
+
+    profile = STORE_PROFILES[store_profile]
+    encoding = xr.open_zarr(dest).UKV.encoding
+    assert encoding["chunks"] == tuple(
+        nwp.sizes[dim] if profile.chunks[dim] == -1 else min(profile.chunks[dim], nwp.sizes[dim])
+        for dim in nwp.UKV.dims
+    )
+    if profile.compressor is None:
+        assert encoding["compressor"] is None
+    if profile.dtype is None:
+        xr.testing.assert_equal(nwp, default)
+    else:
+        assert nwp.UKV.dtype == profile.dtype
+        xr.testing.assert_allclose(nwp.astype("float32"), default, rtol=1e-3)
+
+    # Appending keeps the profile, while changing the profile rewrites the store.
+    source = make_source(slice(0, 6), "source2.zarr")
+    nwp = _convert(source, dest, incremental=True, store_profile=store_profile)
+    assert nwp.attrs["store_profile"] == store_profile
+    assert nwp.UKV.dtype == default.UKV.dtype if profile.dtype is None else profile.dtype
+    nwp = _convert(source, dest, incremental=True)
+    assert nwp.attrs["store_profile"] == "default"
+    xr.testing.assert_identical(nwp, _convert(source, tmp_path / "full.zarr"))
+
+
+@pytest.mark.parametrize(
+    "scheduler, num_workers, memory_limit",
+    [("synchronous", None, None), ("threads", 4, "1kB"), ("processes", 2, None)],
+)
+def test_dask_options(make_source, tmp_path, caplog, scheduler, num_workers, memory_limit):
+    caplog.set_level(logging.INFO)
+    source = make_source(slice(0, 3))
+    dest = tmp_path / "nwp.zarr"
+
+    stats = download_and_add_osgb_to_nwp_data_source(
+        source,
+        str(dest),
+        variables_to_keep=_VARIABLES,
+        scheduler=scheduler,
+        num_workers=num_workers,
+        memory_limit=memory_limit,
+    )
+
+    # One chunk per variable and init_time.
+    assert stats.chunks_written == 3 * 3
+    assert stats.peak_memory_bytes > 0
+    assert "Wrote 9 NWP chunks in" in caplog.text
+    if memory_limit is not None:
+        assert f"Using 1 workers to stay under {memory_limit}" in caplog.text
+    xr.testing.assert_identical(xr.open_zarr(dest).load(), _convert(source, tmp_path / "ref.zarr"))
+
+
+@pytest.mark.parametrize(
+    "scheduler, num_workers, memory_limit",
+    [("synchronous", None, None), ("threads", 4, "1kB"), ("processes", 2, None)],
+)
+def test_load_nwp_data_dask_options(
+    make_source, tmp_path, caplog, scheduler, num_workers, memory_limit
+):
+    caplog.set_level(logging.INFO)
+    source = make_source(slice(0, 3))
+
+    nwp = load_nwp_data(
+        source,
+        variables_to_keep=_VARIABLES,
+        scheduler=scheduler,
+        num_workers=num_workers,
+        memory_limit=memory_limit,
+    )
+
+    expected_workers = 1 if memory_limit is not None else num_workers
+    if expected_workers is not None:
+        assert f"({scheduler}, {expected_workers} workers)" in caplog.text
+    # The local store also has the store profile in its attributes.
+    xr.testing.assert_equal(nwp, _convert(source, tmp_path / "ref.zarr"))
+
+
+def test_source_cache(tmp_path):
+    # A source chunked by variable and init_time.
+    source = str(tmp_path / "source.zarr")
+    nwp = xr.open_zarr(_FIXTURE).isel(init_time=slice(0, 4))
+    nwp.UKV.encoding.pop("chunks")
+    nwp.chunk({"variable": 1, "init_time": 1}).to_zarr(source)
+    cache_dir = str(tmp_path / "cache")
+
+    def _download(name, **kwargs):
+        stats = download_and_add_osgb_to_nwp_data_source(
+            source,
+            str(tmp_path / name),
+            variables_to_keep=_VARIABLES,
+            source_cache_dir=cache_dir,
+            **kwargs,
+        )
+        return stats.source_cache, xr.open_zarr(tmp_path / name).load()
+
+    # The chunks of the coordinates are read too.
+    num_coords = len([f for f in pathlib.Path(source).glob("*/[0-9]*") if f.parent.name != "UKV"])
+
+    cache, converted = _download("nwp.zarr", retention="12h")
+    # Only the chunks of our variables and init_times.
+    assert (cache.hits, cache.misses) == (0, num_coords + 3 * 2)
+    xr.testing.assert_identical(converted, _convert(source, tmp_path / "ref.zarr", retention="12h"))
+
+    cache, converted = _download("nwp2.zarr")
+    assert (cache.hits, cache.misses) == (num_coords + 3 * 2, 3 * 2)
+    xr.testing.assert_identical(converted, _convert(source, tmp_path / "ref2.zarr"))
+
+
+@pytest.mark.parametrize(
+    "options, func",
+    [
+        (NwpConversionOptions, download_and_add_osgb_to_nwp_data_source),
+        (NwpLoadOptions, load_nwp_data),
+    ],
+)
+def test_options_are_the_arguments(options, func):
+    # All the arguments after the paths and the variables.
+    arguments = list(inspect.signature(func).parameters)
+    assert options.__optional_keys__ == set(arguments[arguments.index("variables_to_keep") + 1 :])
+
+
+def test_nwp_conversion_options():
+    options = nwp_conversion_options({"incremental": True, "retention": "2D"})
+    assert nwp_load_options(options) == {"retention": "2D"}
+    assert set(NwpConversionOptions.__optional_keys__) - NwpLoadOptions.__optional_keys__ == set(
+        LOCAL_STORE_OPTIONS
+    )
+
+    with pytest.raises(ValueError, match="incremantal"):
+        nwp_conversion_options({"incremantal": True})
@@ -0,0 +1,71 @@
+"""Checks of the internals of `psp` that we use, against the installed version."""
+
+import datetime as dt
+
+import numpy as np
+import pyproj
+import pytest
+import yaml
+from psp.data_sources.nwp import NwpDataSource
+
+from forecast_inference.data.psp_internals import (
+    NwpSource,
+    model_nwp_data_sources,
+    nwp_data,
+    nwp_filters_on_step,
+    nwp_lag,
+    nwp_tolerance,
+    nwp_xy,
+    set_model_nwp_data_sources,
+    set_nwp_data,
+)
+from forecast_inference.models.psp import get_model
+
+_NOW = dt.datetime(2020, 1, 10, 3)
+
+
+@pytest.fixture()
+def config():
+    with open("tests/fixtures/model_configs/psp.yaml") as f:
+        return yaml.safe_load(f)
+
+
+def _source(config, **kwargs) -> NwpSource:
+    return NwpDataSource(*config["nwp"]["args"], **(config["nwp"]["kwargs"] | kwargs))
+
+
+def test_nwp_source(config):
+    source = _source(config, lag_minutes=90, tolerance="3h", filter_on_step=False)
+
+    assert nwp_lag(source) == dt.timedelta(minutes=90)
+    assert nwp_tolerance(source) == "3h"
+    assert not nwp_filters_on_step(source)
+    assert nwp_filters_on_step(_source(config))
+    assert nwp_tolerance(_source(config)) is None
+
+    # The nearest pixel is the one returned by the data source.
+    data = nwp_data(source)
+    x, y = data.x.values[3], data.y.values[5]
+    lat, lon = pyproj.Transformer.from_crs(27700, 4326).transform(x, y)
+    xs, ys = nwp_xy(source, [(lat, lon)])
+    np.testing.assert_allclose([xs[0], ys[0]], [x, y])
+    got = source.get(now=_NOW, timestamps=[_NOW], nearest_lat=lat, nearest_lon=lon)
+    assert (got.x.item(), got.y.item()) == (x, y)
+
+    # The data source uses the data that we set.
+    set_nwp_data(source, data.isel(time=slice(0, 1)).load())
+    assert nwp_data(source).sizes["time"] == 1
+    assert nwp_data(source).chunks == {}
+    got = source.get(now=_NOW, timestamps=[_NOW], nearest_lat=lat, nearest_lon=lon)
+    assert got.time.values == data.time.values[0]
+
+
+def test_model_nwp_data_sources(config):
+    model = get_model(config, None)
+    sources = model_nwp_data_sources(model)
+    assert list(sources) == ["ukv"]
+    assert isinstance(sources["ukv"], NwpDataSource)
+
+    other_source = _source(config)
+    set_model_nwp_data_sources(model, {"ukv": other_source})
+    assert model_nwp_data_sources(model)["ukv"] is other_source
@@ -0,0 +1,77 @@
+"""Unit tests for the NWP data source of the sites."""
+
+import datetime as dt
+
+import pyproj
+import pytest
+import yaml
+from psp.data_sources.nwp import NwpDataSource
+
+from forecast_inference.data.site_nwp_data_source import SiteNwpDataSource
+
+_NOW = dt.datetime(2020, 1, 10, 3)
+_TIMESTAMPS = [_NOW + dt.timedelta(minutes=15 * i) for i in range(0, 48 * 4, 7)]
+
+
+def _lat_lon(x: float, y: float) -> tuple[float, float]:
+    return pyproj.Transformer.from_crs(27700, 4326).transform(x, y)
+
+
+@pytest.fixture()
+def source():
+    with open("tests/fixtures/model_configs/psp.yaml") as f:
+        config = yaml.safe_load(f)
+    return NwpDataSource(*config["nwp"]["args"], **config["nwp"]["kwargs"])
+
+
+@pytest.fixture()
+def sites():
+    # Two of them share a pixel.
+    return [_lat_lon(190000, 300000), _lat_lon(195000, 305000), _lat_lon(380000, 100000)]
+
+
+def test_same_as_source(source, sites, monkeypatch):
+    expected = [
+        source.get(now=_NOW, timestamps=_TIMESTAMPS, nearest_lat=lat, nearest_lon=lon)
+        for lat, lon in sites
+    ]
+
+    site_source = SiteNwpDataSource(source, sites, _NOW)
+    assert len(site_source._values) == 2
+
+    def _fail(**kwargs):
+        raise AssertionError("Should not be called")
+
+    monkeypatch.setattr(source, "get", _fail)
+    for (lat, lon), da in zip(sites, expected):
+        got = site_source.get(now=_NOW, timestamps=_TIMESTAMPS, nearest_lat=lat, nearest_lon=lon)
+        assert got.dims == da.dims
+        assert (got.values == da.values).all()
+        assert got.variable.values.tolist() == da.variable.values.tolist()
+
+    assert site_source.list_variables() == source.list_variables()
+
+
+def test_other_requests_use_the_source(source, sites):
+    site_source = SiteNwpDataSource(source, sites[:1], _NOW)
+
+    for kwargs in [
+        # Another site.
+        dict(now=_NOW, nearest_lat=sites[2][0], nearest_lon=sites[2][1]),
+        # Another time.
+        dict(now=_NOW + dt.timedelta(hours=1), nearest_lat=sites[0][0], nearest_lon=sites[0][1]),
+    ]:
+        timestamps = [kwargs["now"] + dt.timedelta(hours=1)]
+        got = site_source.get(timestamps=timestamps, **kwargs)
+        expected = source.get(timestamps=timestamps, **kwargs)
+        assert (got.values == expected.values).all()
+
+
+def test_no_data_within_tolerance(source, sites):
+    # The latest init_time is 3 hours before.
+    source._tolerance = "1h"
+    site_source = SiteNwpDataSource(source, sites, _NOW)
+
+    kwargs = dict(now=_NOW, timestamps=[_NOW], nearest_lat=sites[0][0], nearest_lon=sites[0][1])
+    assert site_source.get(tolerance="1h", **kwargs) is None
+    assert source.get(tolerance="1h", **kwargs) is None
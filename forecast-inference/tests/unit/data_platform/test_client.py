@@ -0,0 +1,171 @@
+"""Unit tests for the pooled Data Platform client.
+
+No Docker or network access: channels and stubs are mocked.
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from grpclib.exceptions import StreamTerminatedError
+
+from forecast_inference.data_platform.client import (
+    LEAST_LOADED,
+    ROUND_ROBIN,
+    DataPlatformClientPool,
+    get_dataplatform_client,
+)
+
+
+@pytest.fixture()
+def stubs():
+    """Patch channels and stubs, collecting every stub created by the pool."""
+    created = []
+
+    def _make_channel(**kwargs):
+        channel = MagicMock()
+        channel.__connect__ = AsyncMock()
+        return channel
+
+    def _make_stub(channel):
+        stub = AsyncMock()
+        stub.channel = channel
+        created.append(stub)
+        return stub
+
+    with (
+        patch(
+            "forecast_inference.data_platform.client.Channel",
+            side_effect=_make_channel,
+        ),
+        patch(
+            "forecast_inference.data_platform.client.dp.DataPlatformDataServiceStub",
+            side_effect=_make_stub,
+        ),
+    ):
+        yield created
+
+
+def test_round_robin_cycles_over_channels(stubs):
+    pool = DataPlatformClientPool("localhost", 50051, num_channels=3, selection=ROUND_ROBIN)
+
+    async def _run():
+        for _ in range(6):
+            await pool.list_locations("request")
+
+    asyncio.run(_run())
+
+    assert [stub.list_locations.await_count for stub in stubs] == [2, 2, 2]
+
+
+def test_least_loaded_picks_channel_with_fewest_in_flight(stubs):
+    pool = DataPlatformClientPool("localhost", 50051, num_channels=3, selection=LEAST_LOADED)
+    pool._channels[0].in_flight = 5
+    pool._channels[1].in_flight = 1
+    pool._channels[2].in_flight = 3
+
+    asyncio.run(pool.create_forecast("request"))
+
+    assert stubs[1].create_forecast.await_count == 1
+    assert stubs[0].create_forecast.await_count == 0
+    assert stubs[2].create_forecast.await_count == 0
+    # The in-flight counter is released once the RPC is done.
+    assert pool._channels[1].in_flight == 1
+
+
+def test_failed_channel_is_reconnected_and_skipped(stubs):
+    pool = DataPlatformClientPool("localhost", 50051, num_channels=2, selection=ROUND_ROBIN)
+    stubs[0].list_locations.side_effect = StreamTerminatedError("connection lost")
+
+    async def _run():
+        with pytest.raises(StreamTerminatedError):
+            await pool.list_locations("request")
+        for _ in range(3):
+            await pool.list_locations("request")
+
+    asyncio.run(_run())
+
+    # A fresh channel and stub replaced the broken one...
+    assert len(stubs) == 3
+    stubs[0].channel.close.assert_called_once()
+    # ...and was skipped while backing off, so the healthy channel served the other calls.
+    assert stubs[1].list_locations.await_count == 3
+    assert stubs[2].list_locations.await_count == 0
+
+
+def test_concurrent_failures_reconnect_channel_once(stubs):
+    pool = DataPlatformClientPool("localhost", 50051, num_channels=1)
+
+    async def _run():
+        started = asyncio.Event()
+
+        async def _fail(request):
+            # All the RPCs are in flight on the same connection when it breaks.
+            await started.wait()
+            raise StreamTerminatedError("connection lost")
+
+        stubs[0].list_locations.side_effect = _fail
+        calls = [asyncio.create_task(pool.list_locations("request")) for _ in range(3)]
+        await asyncio.sleep(0)
+        started.set()
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        assert all(isinstance(r, StreamTerminatedError) for r in results)
+        # The fresh channel works.
+        await pool.list_locations("request")
+
+    asyncio.run(_run())
+
+    # Only the first failure replaced the channel, and the fresh one wasn't closed.
+    assert len(stubs) == 2
+    stubs[0].channel.close.assert_called_once()
+    stubs[1].channel.close.assert_not_called()
+    assert stubs[1].list_locations.await_count == 1
+
+
+def test_reconnected_channel_is_probed_before_reuse(stubs):
+    pool = DataPlatformClientPool(
+        "localhost", 50051, num_channels=2, selection=ROUND_ROBIN, reconnect_backoff_seconds=0
+    )
+    stubs[0].list_locations.side_effect = StreamTerminatedError("connection lost")
+
+    async def _run():
+        with pytest.raises(StreamTerminatedError):
+            await pool.list_locations("request")
+        # The server is still down when the fresh channel is due to be tried again.
+        pool._channels[0].channel.__connect__.side_effect = OSError("connection refused")
+        await pool.list_locations("request")
+        await pool.list_locations("request")
+        # It is back up by the next probe.
+        await pool.list_locations("request")
+
+    asyncio.run(_run())
+
+    # The channel that failed its probe got no RPC and was replaced...
+    assert len(stubs) == 4
+    stubs[2].list_locations.assert_not_awaited()
+    stubs[2].channel.close.assert_called_once()
+    assert stubs[1].list_locations.await_count == 2
+    # ...and the one that connected serves RPCs again, without being probed anymore.
+    assert stubs[3].list_locations.await_count == 1
+    assert not pool._channels[0].needs_probe
+
+
+def test_unknown_attributes_are_not_proxied(stubs):
+    pool = DataPlatformClientPool("localhost", 50051, num_channels=2)
+    with pytest.raises(AttributeError):
+        pool._not_an_rpc  # noqa: B018
+
+
+def test_get_dataplatform_client_uses_pool_when_configured(monkeypatch, stubs):
+    monkeypatch.setenv("DATA_PLATFORM_NUM_CHANNELS", "4")
+
+    async def _run():
+        async with get_dataplatform_client() as client:
+            return client
+
+    client = asyncio.run(_run())
+
+    assert isinstance(client, DataPlatformClientPool)
+    assert len(client) == 4
+    for stub in stubs:
+        stub.channel.close.assert_called_once()
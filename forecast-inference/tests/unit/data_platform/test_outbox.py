@@ -0,0 +1,200 @@
+"""Unit tests for the Data Platform outbox, drained to the in-process fake Data Platform."""
+
+import asyncio
+import datetime as dt
+
+import pytest
+from freezegun.api import real_datetime
+from grpclib.const import Status
+from grpclib.exceptions import GRPCError
+
+from forecast_inference.data_platform.outbox import (
+    Outbox,
+    drain_outbox,
+    enqueue_forecast,
+    report_outbox_metrics,
+)
+from forecast_inference.utils.fake_dataplatform import (
+    FakeDataPlatformDataService,
+    fake_dataplatform_client,
+)
+
+pytestmark = pytest.mark.usefixtures("unfreeze_betterproto")
+
+_INIT_TIME = real_datetime(2024, 6, 1, 12, tzinfo=dt.UTC)
+
+
+@pytest.fixture()
+def rows():
+    return [
+        {
+            "start_utc": _INIT_TIME + dt.timedelta(minutes=15 * i),
+            "end_utc": _INIT_TIME + dt.timedelta(minutes=15 * (i + 1)),
+            "forecast_power_kw": 1.0 * i,
+            "horizon_minutes": 15 * i,
+        }
+        for i in range(4)
+    ]
+
+
+def _enqueue(outbox, rows, name, capacity_kw=2.0):
+    enqueue_forecast(
+        outbox,
+        rows=rows,
+        client_location_name=name,
+        model_tag="pv-site-production",
+        init_time_utc=_INIT_TIME,
+        capacity_kw=capacity_kw,
+        latitude=51.5,
+        longitude=-1.8,
+    )
+
+
+def _drain(outbox, service, **kwargs):
+    async def _run():
+        async with fake_dataplatform_client(service) as client:
+            return await drain_outbox(outbox, client, backoff_seconds=0, **kwargs)
+
+    return asyncio.run(_run())
+
+
+def test_segments_and_abandoned_writer(tmp_path, rows):
+    with Outbox(tmp_path, max_segment_bytes=1) as outbox:
+        for i in range(3):
+            _enqueue(outbox, rows, f"site {i}")
+        # Our open segment is still being written.
+        assert outbox.recover_abandoned_segments() == 0
+    assert len(outbox.sealed_segments()) == 3
+
+    # A writer that died in the middle of a frame.
+    frame = next(tmp_path.glob("*.seg")).read_bytes()
+    (tmp_path / "000000000010.open").write_bytes(frame + frame[:10])
+
+    assert outbox.recover_abandoned_segments() == 1
+    metrics = outbox.metrics()
+    assert metrics.pending_requests == 4
+    assert metrics.pending_segments == 4
+
+
+def test_segments_are_synced_once(tmp_path, rows, monkeypatch):
+    synced = []
+    monkeypatch.setattr(
+        "forecast_inference.data_platform.outbox.os.fsync", lambda fd: synced.append(fd)
+    )
+
+    with Outbox(tmp_path) as outbox:
+        for i in range(3):
+            _enqueue(outbox, rows, f"site {i}")
+        assert synced == []
+    assert len(synced) == 1
+
+    with Outbox(tmp_path, fsync=False) as outbox:
+        _enqueue(outbox, rows, "site")
+    assert len(synced) == 1
+    assert outbox.metrics().pending_requests == 4
+
+
+def test_drain_creates_locations_and_rescales(tmp_path, rows):
+    service = FakeDataPlatformDataService()
+    # The Data Platform thinks this site is twice as big as we do.
+    existing = service.add_location("existing_site", 4000, latitude=51.5, longitude=-1.8)
+
+    with Outbox(tmp_path) as outbox:
+        _enqueue(outbox, rows, "Existing Site")
+        _enqueue(outbox, rows, "New Site")
+
+    stats = _drain(outbox, service, batch_size=1)
+
+    assert stats.sent == 2
+    assert service.rpc_counts["create_location"] == 1
+    assert service.rpc_counts["create_forecaster"] == 1
+    assert outbox.metrics().pending_requests == 0
+    assert outbox.sealed_segments() == []
+
+    sent = service.last_forecasts[existing.location_uuid]
+    assert [v.p50_fraction for v in sent.values] == pytest.approx([0, 0.25, 0.5, 0.75])
+    assert list(sent.metadata.fields) == ["app_version"]
+    new = service.last_forecasts[service.locations["new_site"].location_uuid]
+    # Clipped at the site's capacity.
+    assert [v.p50_fraction for v in new.values] == pytest.approx([0, 0.5, 1, 1])
+
+
+def test_transient_failures_are_requeued(tmp_path, rows, monkeypatch):
+    service = FakeDataPlatformDataService()
+    with Outbox(tmp_path) as outbox:
+        _enqueue(outbox, rows, "Site")
+
+    async def _unavailable(request):
+        raise GRPCError(Status.UNAVAILABLE, "down")
+
+    monkeypatch.setattr(service, "create_forecast", _unavailable)
+    stats = _drain(outbox, service, max_attempts=3)
+
+    assert stats.sent == 0
+    assert stats.retries == 2
+    assert stats.requeued == 1
+    assert outbox.metrics().pending_requests == 1
+
+    monkeypatch.undo()
+    stats = _drain(outbox, service)
+
+    assert stats.sent == 1
+    assert outbox.metrics().pending_requests == 0
+
+
+def test_rejected_requests_are_dead_lettered(tmp_path, rows, monkeypatch):
+    service = FakeDataPlatformDataService()
+    with Outbox(tmp_path) as outbox:
+        _enqueue(outbox, rows, "Site")
+
+    async def _invalid(request):
+        raise GRPCError(Status.INVALID_ARGUMENT, "invalid")
+
+    monkeypatch.setattr(service, "create_forecast", _invalid)
+    stats = _drain(outbox, service)
+
+    assert stats.dead_lettered == 1
+    assert stats.retries == 0
+    assert outbox.metrics().pending_requests == 0
+    assert Outbox(tmp_path / "dead_letter").metrics().pending_requests == 1
+
+
+def test_drain_resumes_from_cursor(tmp_path, rows):
+    service = FakeDataPlatformDataService()
+    with Outbox(tmp_path) as outbox:
+        _enqueue(outbox, rows, "Site A")
+    with Outbox(tmp_path) as outbox:
+        _enqueue(outbox, rows, "Site B")
+        _enqueue(outbox, rows, "Site C")
+
+    # As if a previous drain was interrupted after sending "Site B".
+    second_segment = outbox.sealed_segments()[1]
+    outbox._write_cursor(int(second_segment.stem), second_segment.stat().st_size // 2)
+    assert outbox.metrics().pending_requests == 2
+
+    stats = _drain(outbox, service)
+
+    assert stats.sent == 2
+    assert set(service.locations) == {"site_a", "site_c"}
+
+
+def test_report_outbox_metrics(tmp_path, rows, monkeypatch):
+    gauges = {}
+
+    def _gauge(key, value, unit="none"):
+        gauges[key] = (value, unit)
+
+    monkeypatch.setattr("forecast_inference.data_platform.outbox.sentry_sdk.metrics.gauge", _gauge)
+    with Outbox(tmp_path) as outbox:
+        _enqueue(outbox, rows, "Site A")
+        _enqueue(outbox, rows, "Site B")
+
+    report_outbox_metrics(outbox)
+    assert gauges["dp_outbox.pending_requests"] == (2, "none")
+    assert gauges["dp_outbox.pending_bytes"] == (outbox.sealed_segments()[0].stat().st_size, "byte")
+
+    stats = _drain(outbox, FakeDataPlatformDataService())
+    report_outbox_metrics(outbox, stats)
+    assert gauges["dp_outbox.pending_requests"] == (0, "none")
+    assert gauges["dp_outbox.sent"] == (2, "none")
+    assert gauges["dp_outbox.drain_rate"] == (stats.drain_rate, "none")
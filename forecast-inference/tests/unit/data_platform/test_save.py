@@ -1,14 +1,32 @@
 """Unit tests for the Data Platform save module.
 
-These tests require no Docker or network access — they test pure logic only.
+These tests require no Docker or network access — they test pure logic only, or run
+against the in-process fake Data Platform.
 """
 
+import asyncio
 import datetime as dt
 
 import pytest
+from freezegun.api import real_datetime
+from ocf import dp
 
-from forecast_inference.data_platform.client import _sanitize
-from forecast_inference.data_platform.save import prepare_forecast_values
+from forecast_inference.data_platform import save
+from forecast_inference.data_platform.client import _sanitize, fetch_dp_location_map
+from forecast_inference.data_platform.save import (
+    compute_forecast_arrays,
+    create_missing_locations,
+    get_forecaster,
+    prepare_forecast_values,
+    prepare_many_forecast_values,
+    save_forecast_to_dataplatform,
+)
+from forecast_inference.forecast_batch import ForecastBatch
+from forecast_inference.utils.fake_dataplatform import (
+    FakeDataPlatformConfig,
+    FakeDataPlatformDataService,
+    fake_dataplatform_client,
+)
 
 
 class TestSanitization:
@@ -81,6 +99,23 @@ class TestPrepareForecastValues:
         for v in values:
             assert v.p50_fraction >= 0.0
 
+    @pytest.mark.parametrize("clip", [True, False])
+    def test_nan_power_is_saved_as_zero(self, rows, init_time, clip, caplog):
+        # Rather than as the full capacity, which is what clipping NaN with min/max gave.
+        rows[3]["forecast_power_kw"] = float("nan")
+        batch = ForecastBatch.from_predictions(
+            init_time,
+            [(row["horizon_minutes"], row["horizon_minutes"] + 15) for row in rows],
+            pv_ids=["site"],
+            powers=[[row["forecast_power_kw"] for row in rows]],
+        )
+
+        for forecast in [rows, batch]:
+            _, fractions = compute_forecast_arrays(forecast, init_time, 4000, clip=clip)
+            assert fractions[3] == 0.0
+            assert fractions[4] == 1.0
+            assert "Saving 1 NaN forecast value(s) as 0" in caplog.text
+
     def test_horizon_derived_from_start_utc_when_missing(self):
         """When horizon_minutes is absent, horizon is derived from timestamps."""
         init = dt.datetime(2024, 1, 1, 12, 0, tzinfo=dt.UTC)
@@ -108,3 +143,219 @@ class TestPrepareForecastValues:
         ]
         values = self._prepare(rows, init, capacity_watts=4000)
         assert abs(values[0].p50_fraction - 0.5) < 1e-6
+
+    def test_mixed_and_naive_horizons(self):
+        """Given horizons are kept, missing ones are derived, naive timestamps are UTC."""
+        init = dt.datetime(2024, 1, 1, 12, 10, tzinfo=dt.UTC)
+        rows = [
+            {"start_utc": init, "forecast_power_kw": 1.0, "horizon_minutes": 999},
+            {"start_utc": dt.datetime(2024, 1, 1, 13), "forecast_power_kw": 1.0},
+            {
+                "start_utc": dt.datetime(2024, 1, 1, 12, 30, 30, tzinfo=dt.UTC),
+                "forecast_power_kw": 1.0,
+                "horizon_minutes": None,
+            },
+        ]
+        horizons, _ = compute_forecast_arrays(rows, init, capacity_watts=1000)
+        # The init time is floored to 12:00 and partial minutes are truncated.
+        assert horizons.tolist() == [999, 60, 30]
+
+    def test_forecast_batch_matches_rows(self, rows, init_time):
+        batch = ForecastBatch.from_predictions(
+            init_time,
+            [(row["horizon_minutes"], row["horizon_minutes"] + 15) for row in rows],
+            pv_ids=["site"],
+            powers=[[row["forecast_power_kw"] for row in rows]],
+        )
+        assert self._prepare(batch, init_time) == self._prepare(rows, init_time)
+
+    def test_many_forecasts(self, rows, init_time):
+        forecasts = [(rows, 4000), ([], 1000), (rows[:3], 1000)]
+        values = prepare_many_forecast_values(forecasts, init_time)
+
+        assert [len(v) for v in values] == [len(rows), 0, 3]
+        assert values[0] == self._prepare(rows, init_time, capacity_watts=4000)
+        assert values[2] == self._prepare(rows[:3], init_time, capacity_watts=1000)
+
+
+@pytest.mark.usefixtures("unfreeze_betterproto")
+class TestForecasterResolution:
+    """Verify the forecaster is resolved once per run rather than once per site."""
+
+    @pytest.fixture()
+    def service(self):
+        service = FakeDataPlatformDataService()
+        for i in range(5):
+            service.add_location(f"site_{i}", 4000, latitude=51.0, longitude=0.0)
+        return service
+
+    @pytest.fixture()
+    def rows(self):
+        init = real_datetime(2024, 1, 1, tzinfo=dt.UTC)
+        return [
+            {
+                "start_utc": init,
+                "end_utc": init + dt.timedelta(minutes=15),
+                "forecast_power_kw": 2.0,
+                "horizon_minutes": 0,
+            }
+        ]
+
+    def _save_all(self, service, rows, forecaster=None):
+        async def _run():
+            async with fake_dataplatform_client(service) as client:
+                location_map = await fetch_dp_location_map(client)
+                await asyncio.gather(
+                    *[
+                        save_forecast_to_dataplatform(
+                            rows=rows,
+                            client_location_name=name,
+                            model_tag="pv-site-production",
+                            init_time_utc=rows[0]["start_utc"],
+                            client=client,
+                            capacity_kw=4.0,
+                            latitude=51.0,
+                            longitude=0.0,
+                            location_map=location_map,
+                            forecaster=forecaster,
+                        )
+                        for name in location_map
+                    ]
+                )
+
+        asyncio.run(_run())
+
+    def test_concurrent_saves_resolve_the_forecaster_once(self, service, rows):
+        self._save_all(service, rows)
+
+        assert service.rpc_counts["list_forecasters"] == 1
+        assert service.rpc_counts["create_forecaster"] == 1
+        assert service.rpc_counts["create_forecast"] == 5
+
+    def test_passed_forecaster_makes_one_rpc_per_site(self, service, rows):
+        forecaster = dp.Forecaster(forecaster_name="pv_site_production", forecaster_version="1.4.0")
+        service.forecasters["pv_site_production"] = forecaster
+
+        self._save_all(service, rows, forecaster=forecaster)
+
+        assert service.rpc_counts["list_forecasters"] == 0
+        assert service.rpc_counts["create_forecast"] == 5
+        # Nothing else than the initial list_locations and the forecasts.
+        assert sum(service.rpc_counts.values()) == 1 + 5
+
+    def test_failed_forecaster_is_resolved_again(self, service, monkeypatch):
+        create_forecaster_if_not_exists = save.create_forecaster_if_not_exists
+        calls = []
+
+        async def _fail_once(client, model_tag):
+            calls.append(model_tag)
+            if len(calls) == 1:
+                raise RuntimeError("Unavailable")
+            return await create_forecaster_if_not_exists(client, model_tag)
+
+        monkeypatch.setattr(save, "create_forecaster_if_not_exists", _fail_once)
+
+        async def _run():
+            async with fake_dataplatform_client(service) as client:
+                with pytest.raises(RuntimeError, match="Unavailable"):
+                    await get_forecaster(client, "pv-site-production")
+                first = await get_forecaster(client, "pv-site-production")
+                again = await get_forecaster(client, "pv-site-production")
+            return first, again
+
+        first, again = asyncio.run(_run())
+
+        assert again is first
+        assert len(calls) == 2
+
+    def test_cached_forecaster_with_old_version_is_resolved_again(self, service, monkeypatch):
+        async def _run():
+            async with fake_dataplatform_client(service) as client:
+                first = await get_forecaster(client, "pv-site-production")
+                again = await get_forecaster(client, "pv-site-production")
+                monkeypatch.setattr(save, "dp_forecaster_version", "9.9.9")
+                bumped = await get_forecaster(client, "pv-site-production")
+                bumped_again = await get_forecaster(client, "pv-site-production")
+            return first, again, bumped, bumped_again
+
+        first, again, bumped, bumped_again = asyncio.run(_run())
+
+        assert again is first
+        assert bumped.forecaster_version == "9.9.9"
+        assert bumped_again is bumped
+        assert service.rpc_counts["update_forecaster"] == 1
+
+
+@pytest.mark.usefixtures("unfreeze_betterproto")
+class TestCreateMissingLocations:
+    """Verify the missing locations are created in one concurrent pre-pass."""
+
+    @pytest.fixture()
+    def sites(self):
+        return [
+            {
+                "client_location_name": name,
+                "capacity_kw": 3.0,
+                "latitude": 52.0,
+                "longitude": -1.0,
+            }
+            for name in ["Existing Site", "New Site", "new-site", "Other Site"]
+        ]
+
+    def _create(self, service, sites, location_map=None):
+        async def _run():
+            async with fake_dataplatform_client(service) as client:
+                loc_map = location_map
+                if loc_map is None:
+                    loc_map = await fetch_dp_location_map(client)
+                errors = await create_missing_locations(
+                    client,
+                    sites,
+                    loc_map,
+                    init_time_utc=dt.datetime(2024, 1, 1),
+                    max_concurrency=2,
+                )
+            return loc_map, errors
+
+        return asyncio.run(_run())
+
+    def test_creates_each_missing_location_once(self, sites):
+        service = FakeDataPlatformDataService()
+        service.add_location("existing_site", 3000, latitude=52.0, longitude=-1.0)
+
+        location_map, errors = self._create(service, sites)
+
+        assert errors == {}
+        # "New Site" and "new-site" are the same location once sanitized.
+        assert service.rpc_counts["create_location"] == 2
+        assert set(location_map) == {"existing_site", "new_site", "other_site"}
+        assert location_map["new_site"].location_uuid == service.locations["new_site"].location_uuid
+        assert location_map["new_site"].effective_capacity_watts == 3000
+
+    def test_failures_are_returned_and_left_out_of_the_map(self, sites):
+        service = FakeDataPlatformDataService(FakeDataPlatformConfig(error_rate=1.0))
+
+        location_map, errors = self._create(service, sites, location_map={})
+
+        assert set(errors) == {"existing_site", "new_site", "other_site"}
+        assert all(isinstance(e, RuntimeError) for e in errors.values())
+        assert location_map == {}
+
+    def test_init_time_is_floored_like_the_forecasts(self, sites, monkeypatch):
+        init_times = []
+        create_new_location = save.create_new_location
+
+        async def _create_new_location(client, name, capacity_kw, lat, lon, init_time_utc):
+            init_times.append(init_time_utc)
+            return await create_new_location(client, name, capacity_kw, lat, lon, init_time_utc)
+
+        monkeypatch.setattr(save, "create_new_location", _create_new_location)
+
+        async def _run():
+            async with fake_dataplatform_client(FakeDataPlatformDataService()) as client:
+                return await create_missing_locations(
+                    client, sites[:1], {}, init_time_utc=dt.datetime(2024, 1, 1, 12, 7, 30)
+                )
+
+        assert asyncio.run(_run()) == {}
+        assert init_times == [dt.datetime(2024, 1, 1, 12, 0, tzinfo=dt.timezone.utc)]
@@ -0,0 +1,66 @@
+import asyncio
+import os
+
+import pytest
+
+from forecast_inference.utils.concurrency import BoundedTaskGroup, fork_map
+
+
+def test_bounded_task_group_limits_concurrency_and_keeps_order():
+    running = 0
+    max_running = 0
+
+    async def _work(i: int) -> int:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        # Finish in the reverse order of submission.
+        for _ in range(10 - i):
+            await asyncio.sleep(0)
+        running -= 1
+        if i == 3:
+            raise ValueError("boom")
+        return i * 10
+
+    async def _run():
+        group = BoundedTaskGroup(limit=2)
+        for i in range(6):
+            await group.submit(f"key-{i}", _work(i))
+        return await group.wait()
+
+    results = asyncio.run(_run())
+
+    assert max_running == 2
+    assert list(results) == [f"key-{i}" for i in range(6)]
+    assert isinstance(results["key-3"], ValueError)
+    assert [results[f"key-{i}"] for i in [0, 1, 2, 4, 5]] == [0, 10, 20, 40, 50]
+
+
+def test_bounded_task_group_rejects_duplicate_keys():
+    async def _noop():
+        pass
+
+    async def _run():
+        group = BoundedTaskGroup(limit=2)
+        await group.submit("a", _noop())
+        with pytest.raises(KeyError):
+            await group.submit("a", _noop())
+        await group.wait()
+
+    asyncio.run(_run())
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 7])
+def test_fork_map(chunk_size):
+    # Not picklable, but inherited by the workers.
+    offset = {"value": 1000}
+    with fork_map(
+        lambda i: (i + offset["value"], os.getpid()),
+        range(50),
+        num_workers=3,
+        chunk_size=chunk_size,
+    ) as results_iter:
+        results = list(results_iter)
+
+    assert [r for r, _ in results] == list(range(1000, 1050))
+    assert os.getpid() not in {pid for _, pid in results}
@@ -0,0 +1,126 @@
+"""Unit tests for the in-process fake Data Platform.
+
+The fake is served through grpclib's in-memory channel: no Docker or network access.
+"""
+
+import asyncio
+import datetime as dt
+import subprocess
+import sys
+
+import pytest
+from freezegun import freeze_time
+from freezegun.api import real_datetime
+from grpclib.exceptions import GRPCError
+from ocf import dp
+from pvsite_datamodel.sqlmodels import LocationSQL
+
+from forecast_inference.data_platform.client import fetch_dp_location_map
+from forecast_inference.data_platform.load import get_generation_from_dp
+from forecast_inference.data_platform.save import save_forecast_to_dataplatform
+from forecast_inference.utils.fake_dataplatform import (
+    FakeDataPlatformConfig,
+    FakeDataPlatformDataService,
+    fake_dataplatform_client,
+)
+
+pytestmark = pytest.mark.usefixtures("unfreeze_betterproto")
+
+_INIT_TIME = real_datetime(2024, 6, 1, 12, tzinfo=dt.UTC)
+
+
+@pytest.fixture()
+def forecast_rows():
+    return [
+        {
+            "start_utc": _INIT_TIME + dt.timedelta(minutes=15 * i),
+            "end_utc": _INIT_TIME + dt.timedelta(minutes=15 * (i + 1)),
+            "forecast_power_kw": 1.0,
+            "horizon_minutes": 15 * i,
+        }
+        for i in range(8)
+    ]
+
+
+def test_save_forecast_creates_location_and_forecaster(forecast_rows):
+    service = FakeDataPlatformDataService()
+
+    async def _run():
+        async with fake_dataplatform_client(service) as client:
+            await save_forecast_to_dataplatform(
+                rows=forecast_rows,
+                client_location_name="New Site",
+                model_tag="pv-site-production",
+                init_time_utc=_INIT_TIME,
+                client=client,
+                capacity_kw=4.0,
+                latitude=51.5,
+                longitude=-1.8,
+            )
+            return await fetch_dp_location_map(client)
+
+    location_map = asyncio.run(_run())
+
+    summary = location_map["new_site"]
+    assert summary.effective_capacity_watts == 4000
+    assert summary.latlng.latitude == pytest.approx(51.5)
+    assert summary.latlng.longitude == pytest.approx(-1.8)
+    assert "pv_site_production" in service.forecasters
+    assert service.forecast_values[summary.location_uuid] == len(forecast_rows)
+    assert service.rpc_counts["create_location"] == 1
+    assert service.rpc_counts["create_forecast"] == 1
+
+
+def test_observations_cover_the_time_window():
+    service = FakeDataPlatformDataService(FakeDataPlatformConfig(observation_interval_minutes=15))
+    service.add_location("site_a", 2000, latitude=51.0, longitude=0.0)
+    site = LocationSQL(
+        location_uuid="00000000-0000-0000-0000-000000000001", client_location_name="site_a"
+    )
+
+    async def _run():
+        async with fake_dataplatform_client(service) as client:
+            loc_map = await fetch_dp_location_map(client)
+            return await get_generation_from_dp(
+                client, loc_map, [site], _INIT_TIME - dt.timedelta(hours=1), _INIT_TIME
+            )
+
+    df = asyncio.run(_run())
+
+    assert len(df) == 4
+    # Observations are half of the 2 kW capacity.
+    assert (df["power"] == 1.0).all()
+
+
+def test_injected_errors_and_stream_limit(now):
+    service = FakeDataPlatformDataService(
+        FakeDataPlatformConfig(
+            latency_seconds=0.01,
+            error_rate=1.0,
+            max_concurrent_streams=2,
+        )
+    )
+
+    async def _call(client):
+        with pytest.raises(GRPCError):
+            await client.list_forecasters(dp.ListForecastersRequest())
+
+    async def _run():
+        async with fake_dataplatform_client(service) as client:
+            await asyncio.gather(*[_call(client) for _ in range(6)])
+
+    # The simulated latency needs the clock to tick.
+    with freeze_time(now, tick=True):
+        asyncio.run(_run())
+
+    assert service.rpc_counts["list_forecasters"] == 6
+    assert service.error_counts["list_forecasters"] == 6
+    assert service.max_in_flight == 2
+
+
+def test_the_app_does_not_import_the_fake():
+    code = (
+        "import sys, forecast_inference.app;"
+        " assert 'forecast_inference.utils.fake_dataplatform' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)